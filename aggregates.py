@@ -0,0 +1,242 @@
+"""Pre-aggregated price cube behind the Analytics and Insight panels.
+
+The cube holds one cell per observed combination of CUBE_KEYS with the
+sum, count, min and max of ``price`` plus a histogram over global price
+bins. Every chart and statistic in the app is a roll-up of these cells, so
+its cost depends on the number of distinct combinations rather than the
+number of fare rows.
+
+Newly ingested fares are folded in with ``merge_delta``: matching cells
+have their statistics and histogram updated, new combinations are
+appended, and nothing is recomputed from the full data. The same merge
+builds the cube chunk by chunk when the data is too large to load at once.
+
+Next to the cube, ``duration_counts`` keeps the number of flights per
+itinerary profile and duration. It is just as mergeable and is what the
+configuration search and booking curves are derived from (medians are
+exact, read off the counts).
+"""
+import os
+
+import pandas as pd
+
+import joblib
+import numpy as np
+
+import encoders as feature_encoders
+import filter_index
+
+CUBE_KEYS = ['From', 'to', 'airline', 'departure_time', 'stops', 'Class', 'days_left']
+STAT_COLUMNS = ['sum', 'count', 'min', 'max']
+HIST_BINS = 30
+MAX_FIGURE_POINTS = 200
+HIST_DTYPE = np.int32
+CUBE_FILE = 'price_cube.pkl'
+CUBE_FORMAT_VERSION = 2
+PROFILE_KEYS = ['From', 'to', 'airline', 'departure_time', 'arrival_time', 'stops', 'Class']
+
+
+def price_bin_edges(prices, n_bins=HIST_BINS):
+    low, high = float(np.nanmin(prices)), float(np.nanmax(prices))
+    if high <= low:
+        high = low + 1.0
+    return np.linspace(low, high, n_bins + 1)
+
+
+def price_bins(prices, edges):
+    """Histogram bin of each price for the given edges (the last bin is closed)."""
+    return np.clip(np.searchsorted(edges, prices, side='right') - 1, 0, len(edges) - 2)
+
+
+def build_price_cube(df, n_bins=HIST_BINS, edges=None):
+    """Aggregate the flight frame into cube cells.
+
+    Returns ``{'cells': DataFrame, 'hist': (n_cells, n_bins) array, 'bin_edges': array}``
+    where ``cells`` has the CUBE_KEYS columns plus STAT_COLUMNS, together
+    with an ``index`` over the cells' key columns. Pass ``edges`` to bin
+    prices on a range known in advance (e.g. of the whole dataset).
+    """
+    prices = df['price'].to_numpy(dtype=np.float64)
+    if edges is None:
+        edges = price_bin_edges(prices, n_bins)
+    # Accumulate in float64 even when prices are stored as float32.
+    grouped = df[CUBE_KEYS].assign(price=prices).groupby(CUBE_KEYS, observed=True)
+    cells = grouped['price'].agg(STAT_COLUMNS).reset_index()
+
+    cell_ids = grouped.ngroup().to_numpy()
+    keep = cell_ids >= 0
+    flat = cell_ids[keep] * n_bins + price_bins(prices[keep], edges)
+    hist = np.bincount(flat, minlength=len(cells) * n_bins).reshape(len(cells), n_bins).astype(HIST_DTYPE)
+    return {
+        'format': CUBE_FORMAT_VERSION,
+        'cells': cells,
+        'hist': hist,
+        'bin_edges': edges,
+        'index': filter_index.build_index(cells, CUBE_KEYS),
+    }
+
+
+def _cell_keys(cells):
+    return list(zip(*(cells[col].tolist() for col in CUBE_KEYS)))
+
+
+def merge_delta(cube, df):
+    """A new cube that also covers the fare rows in ``df``; ``cube`` itself is left unchanged.
+
+    Prices outside the cube's histogram range fall into its first or last bin.
+    """
+    n_bins = cube['hist'].shape[1]
+    prices = df['price'].to_numpy(dtype=np.float64)
+    grouped = df[CUBE_KEYS].assign(price=prices).groupby(CUBE_KEYS, observed=True)
+    delta = grouped['price'].agg(STAT_COLUMNS).reset_index()
+    cell_ids = grouped.ngroup().to_numpy()
+    keep = cell_ids >= 0
+    delta_hist = np.bincount(cell_ids[keep] * n_bins + price_bins(prices[keep], cube['bin_edges']),
+                             minlength=len(delta) * n_bins).reshape(len(delta), n_bins)
+
+    positions = {key: pos for pos, key in enumerate(_cell_keys(cube['cells']))}
+    delta_pos = np.array([positions.get(key, -1) for key in _cell_keys(delta)], dtype=np.int64)
+    existing = delta_pos >= 0
+
+    cells = cube['cells'].copy()
+    hist = cube['hist'].copy()
+    target = delta_pos[existing]
+    cells.loc[target, 'sum'] += delta['sum'].to_numpy()[existing]
+    cells.loc[target, 'count'] += delta['count'].to_numpy()[existing]
+    cells.loc[target, 'min'] = np.minimum(cells.loc[target, 'min'].to_numpy(), delta['min'].to_numpy()[existing])
+    cells.loc[target, 'max'] = np.maximum(cells.loc[target, 'max'].to_numpy(), delta['max'].to_numpy()[existing])
+    hist[target] += delta_hist[existing]
+
+    new_cells = delta[~existing].reset_index(drop=True)
+    index = cube['index']
+    if len(new_cells):
+        for col in CUBE_KEYS:
+            if isinstance(cells[col].dtype, pd.CategoricalDtype):
+                values = new_cells[col].astype(str) if isinstance(new_cells[col].dtype, pd.CategoricalDtype) else new_cells[col]
+                missing = [value for value in pd.unique(values) if value not in cells[col].cat.categories]
+                cells[col] = cells[col].cat.add_categories(missing)
+                new_cells[col] = pd.Categorical(values, categories=cells[col].cat.categories)
+        index = filter_index.extend_index(index, new_cells)
+        cells = pd.concat([cells, new_cells], ignore_index=True)
+        hist = np.vstack([hist, delta_hist[~existing].astype(HIST_DTYPE)])
+    return dict(cube, cells=cells, hist=hist, index=index)
+
+
+def duration_counts(df):
+    """Number of flights per PROFILE_KEYS combination and duration in minutes (NaN if unknown)."""
+    durations = feature_encoders.duration_minutes(df['time_taken']).to_numpy()
+    counts = (df[PROFILE_KEYS].assign(duration=durations)
+                .groupby(PROFILE_KEYS + ['duration'], observed=True, dropna=False).size()
+                .reset_index(name='flights')
+                .dropna(subset=PROFILE_KEYS))
+    for col in PROFILE_KEYS:
+        counts[col] = counts[col].astype(str)
+    return counts.reset_index(drop=True)
+
+
+def merge_duration_counts(counts, other):
+    return (pd.concat([counts, other], ignore_index=True)
+              .groupby(PROFILE_KEYS + ['duration'], dropna=False)['flights'].sum()
+              .reset_index())
+
+
+def median_duration(counts, keys):
+    """Median known duration per ``keys`` group, as pandas' median over the individual flights would give."""
+    ordered = counts.dropna(subset=['duration']).sort_values(keys + ['duration'])
+    grouped = ordered.groupby(keys)['flights']
+    seen, total = grouped.cumsum(), grouped.transform('sum')
+    # The middle flight(s) of each group: positions (total - 1) // 2 and total // 2.
+    lower = ordered[seen > (total - 1) // 2].groupby(keys)['duration'].first()
+    upper = ordered[seen > total // 2].groupby(keys)['duration'].first()
+    return ((lower + upper) / 2).reset_index()
+
+
+def save_cube(cube, cache_dir):
+    if os.path.isdir(cache_dir):
+        path = os.path.join(cache_dir, CUBE_FILE)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        joblib.dump(cube, tmp_path)
+        os.replace(tmp_path, path)
+
+
+def load_cube(cache_dir, version, mmap_mode=None):
+    """The cube saved for this dataset version, or None (``mmap_mode='r'`` maps its arrays read-only)."""
+    path = os.path.join(cache_dir, CUBE_FILE)
+    if os.path.exists(path):
+        cube = joblib.load(path, mmap_mode=mmap_mode)
+        if cube.get('format') == CUBE_FORMAT_VERSION and cube.get('version') == version:
+            return cube
+    return None
+
+
+def key_values(cube, column):
+    """Sorted values of a key column that occur in the cube."""
+    return sorted(cube['cells'][column].unique().tolist())
+
+
+def select_cells(cube, filters=None):
+    """Positions of the cells matching every ``column: value`` in ``filters`` (None for all cells)."""
+    return filter_index.select_rows(cube['index'], filters)
+
+
+def filtered_cells(cube, filters=None):
+    return filter_index.take(cube['cells'], select_cells(cube, filters))
+
+
+def rollup(cube, by, filters=None):
+    """Roll the (filtered) cells up to the ``by`` columns with sum/count/min/max/mean of price."""
+    cells = filtered_cells(cube, filters)
+    out = cells.groupby(by, observed=True).agg(
+        sum=('sum', 'sum'), count=('count', 'sum'), min=('min', 'min'), max=('max', 'max')
+    ).reset_index()
+    out['mean'] = out['sum'] / out['count']
+    return out
+
+
+def totals(cube, filters=None):
+    """Overall sum/count/min/max/mean of price for the (filtered) cells."""
+    cells = filtered_cells(cube, filters)
+    count = int(cells['count'].sum())
+    total = float(cells['sum'].sum())
+    return {
+        'sum': total,
+        'count': count,
+        'min': float(cells['min'].min()) if count else np.nan,
+        'max': float(cells['max'].max()) if count else np.nan,
+        'mean': total / count if count else np.nan,
+    }
+
+
+def coarsen(rolled, column, max_points=MAX_FIGURE_POINTS):
+    """Merge a rollup over the numeric ``column`` into at most ``max_points`` equal-width ranges.
+
+    Statistics are re-aggregated from sum/count/min/max, so the means stay
+    exact; each range is placed at the count-weighted mean of its ``column``.
+    """
+    if len(rolled) <= max_points:
+        return rolled
+    values = rolled[column].to_numpy(dtype=np.float64)
+    bucket = price_bins(values, np.linspace(values.min(), values.max(), max_points + 1))
+    out = rolled.assign(_weighted=values * rolled['count'].to_numpy()).groupby(bucket).agg(
+        sum=('sum', 'sum'), count=('count', 'sum'), min=('min', 'min'), max=('max', 'max'), _weighted=('_weighted', 'sum')
+    ).reset_index(drop=True)
+    out.insert(0, column, out.pop('_weighted') / out['count'])
+    out['mean'] = out['sum'] / out['count']
+    return out
+
+
+def rebin(counts, edges, max_bins=MAX_FIGURE_POINTS):
+    """Merge adjacent histogram bins so there are at most ``max_bins``."""
+    factor = -(-len(counts) // max_bins)
+    if factor <= 1:
+        return counts, edges
+    padded = np.concatenate([counts, np.zeros(-len(counts) % factor, dtype=counts.dtype)])
+    merged_edges = np.append(edges[:-1][::factor], edges[-1])
+    return padded.reshape(-1, factor).sum(axis=1), merged_edges
+
+
+def histogram(cube, filters=None, max_bins=MAX_FIGURE_POINTS):
+    """Price histogram ``(counts, bin_edges)`` for the (filtered) cells, with at most ``max_bins`` bins."""
+    rows = select_cells(cube, filters)
+    hist = cube['hist'] if rows is None else cube['hist'][rows]
+    return rebin(hist.sum(axis=0), cube['bin_edges'], max_bins)
@@ -1,14 +1,39 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-import joblib
-import plotly.express as px
-import plotly.graph_objects as go
-from sklearn.preprocessing import LabelEncoder
+import datetime
+import functools
+
+import perf
 
 # Set page config for a professional look
 st.set_page_config(page_title="Flight Price Predictor", page_icon="✈️", layout="wide")
 
+# Timing spans for the performance panel (FPP_PERF=1); no-ops otherwise
+if perf.enabled():
+    perf.start_run()
+
+
+def perf_table(spans):
+    rows = [f"| {name} | {seconds * 1000:,.1f} |" for name, seconds in spans]
+    return "| Section | ms |\n|---|---:|\n" + "\n".join(rows) if rows else "No timed sections in this run."
+
+
+def timed_fragment(func):
+    """``st.fragment`` that shows the timings of its own reruns under it when FPP_PERF=1.
+
+    A fragment rerun skips the rest of the script, sidebar panel included,
+    so each fragment collects and reports its spans as a run of their own.
+    """
+    if not perf.enabled():
+        return st.fragment(func)
+
+    @functools.wraps(func)
+    def run(*args, **kwargs):
+        with perf.sub_run() as spans:
+            func(*args, **kwargs)
+        with st.expander("⏱️ Performance of this section", expanded=False):
+            st.markdown(perf_table(spans))
+    return st.fragment(run)
+
 # CSS for styling with new design
 st.markdown("""
     <style>
@@ -300,65 +325,159 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# Load data
-@st.cache_data
-def load_flight_data():
+# Heavy modules, data and the model are loaded by the pages that use them,
+# so opening the app (or the Home page) only pays for Streamlit itself.
+
+# Flight data shared by all sessions; follows the CSV and newly ingested fares.
+# Process-wide resources come from serving_state so app_server.py can warm them before the first session.
+def load_flight_store():
+    import serving_state
+    return serving_state.get_flight_store()
+
+# Dataset version (CSV hash plus ingested batches); picks up CSV changes and new fares on every rerun.
+# Only derived structures (cube, counts, row index) are kept in memory; large datasets are read out of core.
+def get_dataset_version():
+    import data_store
     try:
-        df = pd.read_csv('cleaned_flight_data.csv')
-        required_columns = ['airline', 'From', 'to', 'departure_time', 'arrival_time', 
-                        'stops', 'Class', 'price', 'days_left', 'time_taken']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        if missing_columns:
-            st.error(f"Missing columns in flight data: {missing_columns}")
-            st.stop()
-        return df
+        with perf.span('load: flight data'):
+            version = load_flight_store().refresh()
+            missing_columns = [col for col in data_store.REQUIRED_COLUMNS if col not in load_flight_store().columns()]
     except FileNotFoundError:
         st.error("Flight data file (cleaned_flight_data.csv) not found.")
         st.stop()
     except Exception as e:
         st.error(f"Error loading flight data: {str(e)}")
         st.stop()
-# Process data
-@st.cache_data
-def process_flight_data(df):
+    if missing_columns:
+        st.error(f"Missing columns in flight data: {missing_columns}")
+        st.stop()
+    return version
+
+# Model registry shared by all sessions: serves the active model bundle and hot-swaps in new versions
+def load_model_registry():
+    import serving_state
+    return serving_state.get_model_registry()
+
+# Active model with its encoders and version; taken once per run so a swap never mixes versions
+def get_active_model():
     try:
-        le = LabelEncoder()
-        df['airline_encoded'] = le.fit_transform(df['airline'])
-        df['From_encoded'] = le.fit_transform(df['From'])
-        df['to_encoded'] = le.fit_transform(df['to'])
-        df['departure_time_encoded'] = le.fit_transform(df['departure_time'])
-        df['arrival_time_encoded'] = le.fit_transform(df['arrival_time'])
-        stops_mapping = {'Zero': 0, 'One': 1, 'Two or more': 2}
-        df['stops_encoded'] = df['stops'].map(stops_mapping)
-        class_mapping = {'Economy': 0, 'Business': 1}
-        df['Class_encoded'] = df['Class'].map(class_mapping)
-        return df
+        with perf.span('load: model'):
+            return load_model_registry().current()
+    except FileNotFoundError as e:
+        st.error(str(e))
+        st.stop()
     except Exception as e:
-        st.error(f"Error processing flight data: {str(e)}")
+        st.error(f"Error loading model: {str(e)}")
         st.stop()
 
-# Load model
+# Background warmup of the data, aggregates, model and booking curves: already running under app_server.py,
+# otherwise started by the first session
+def start_warmup():
+    import serving_state
+    return serving_state.start_warmup()
+
+# Shared prediction cache for all sessions in this process
+@st.cache_resource
+def load_prediction_cache():
+    import prediction_cache
+    return prediction_cache.PredictionCache()
+
+# Load booking-window curves (regenerated only when the model changes)
 @st.cache_resource
-def load_model():
+def load_booking_curves(model_version, _active):
+    import booking_curves
     try:
-        import os
-        file_path = 'FPP_model.pkl'
-        if not os.path.exists(file_path):
-            st.error(f"Model file {file_path} not found in path: {os.getcwd()}")
-            st.stop()
-        return joblib.load(file_path)
+        get_dataset_version()
+        with perf.span('load: booking curves'):
+            return booking_curves.load_or_build_curves(_active.model, _active.encoders, load_flight_store(), _active.model_path)
     except Exception as e:
-        st.error(f"Error loading model: {str(e)}")
+        st.warning(f"Booking-window curves are unavailable: {str(e)}")
+        return None
+
+# Observed airline/time/stops/class configurations per route
+@st.cache_resource
+def load_configuration_table(version):
+    import config_search
+    try:
+        with perf.span('load: route configurations'):
+            return config_search.build_configuration_table(load_flight_store().duration_counts())
+    except Exception as e:
+        st.error(f"Error building route configurations: {str(e)}")
         st.stop()
 
-# Main data loading
-df_flights = load_flight_data()
-if df_flights is not None and not df_flights.empty:
-    processed_df_flights = process_flight_data(df_flights.copy()) # Use a copy for processing
-else:
-    processed_df_flights = pd.DataFrame() # Ensure it's a DataFrame even if loading fails
+# Price cube (built once per CSV, then merged with each ingested batch)
+def load_price_cube():
+    get_dataset_version()
+    try:
+        with perf.span('load: price cube'):
+            return load_flight_store().cube()
+    except Exception as e:
+        st.error(f"Error building price aggregates: {str(e)}")
+        st.stop()
 
-model = load_model()
+# Price quantile sketches per route, airline and class (built once per CSV, then merged with each ingested batch)
+def load_price_sketches():
+    get_dataset_version()
+    try:
+        with perf.span('load: price sketches'):
+            return load_flight_store().price_sketches()
+    except Exception as e:
+        st.error(f"Error building price percentiles: {str(e)}")
+        st.stop()
+
+# Flight rows for a filter combination (row index in memory, or a scan of the cached segments)
+def select_flights(filters):
+    get_dataset_version()
+    try:
+        with perf.span('load: flight rows'):
+            return load_flight_store().select(filters)
+    except Exception as e:
+        st.error(f"Error indexing flight data: {str(e)}")
+        st.stop()
+
+# General Insights figures (computed once per dataset version, not on every widget change)
+@st.cache_resource
+def load_general_insights(version):
+    import aggregates
+    price_cube = load_price_cube()
+    with perf.span('analytics: general insights'):
+        overall_stats = aggregates.totals(price_cube)
+        airline_stats = aggregates.rollup(price_cube, ['airline'])
+        insights = {'num_airlines': len(airline_stats), 'num_flights': overall_stats['count'], 'avg_price': overall_stats['mean'],
+                    'most_popular_route': "N/A", 'cheapest_airline': "N/A", 'most_expensive_airline': "N/A"}
+        route_stats = aggregates.rollup(price_cube, ['From', 'to'])
+        if not route_stats.empty:
+            most_popular_route = route_stats.loc[route_stats['count'].idxmax()]
+            insights['most_popular_route'] = f"{most_popular_route['From']} to {most_popular_route['to']}"
+        if not airline_stats.empty:
+            cheapest_airline = airline_stats.loc[airline_stats['mean'].idxmin()]
+            insights['cheapest_airline'] = f"{cheapest_airline['airline']} (₹{cheapest_airline['mean']:,.2f})"
+            most_expensive_airline = airline_stats.loc[airline_stats['mean'].idxmax()]
+            insights['most_expensive_airline'] = f"{most_expensive_airline['airline']} (₹{most_expensive_airline['mean']:,.2f})"
+        insights['num_cities'] = len(aggregates.rollup(price_cube, ['From']))
+    return insights
+
+# Values of the cube keys offered as filters and selections, per dataset version
+@st.cache_resource
+def load_key_values(version, column):
+    import aggregates
+    return aggregates.key_values(load_price_cube(), column)
+
+# Quick Stats for a route, per dataset version (number inputs on the Predict page don't recompute them)
+@st.cache_resource
+def load_route_stats(version, departure, arrival):
+    import aggregates
+    price_cube = load_price_cube()
+    route_filters = {'From': departure, 'to': arrival}
+    with perf.span('predict: quick stats'):
+        return aggregates.totals(price_cube, route_filters), aggregates.rollup(price_cube, ['airline'], route_filters)
+
+# Cheapest fare per city pair and days-left band for the connection search (per dataset and model version)
+@st.cache_resource
+def load_itinerary_edges(version, model_version, _curves):
+    import itinerary_search
+    with perf.span('load: itinerary edges'):
+        return itinerary_search.build_edges(load_price_cube(), _curves)
 
 # Sidebar
 st.sidebar.title("App Navigation") 
@@ -367,6 +486,11 @@ st.sidebar.markdown('<div class="icon-text"><i class="fas fa-compass"></i> Fligh
 page_options = ["Home", "Analytics for Business", "Predict Price for Business", "Traveler Corner"]
 page = st.sidebar.radio("Go to", page_options)
 
+# Warmup progress until every step has finished
+warmup_status = start_warmup().status()
+if not warmup_status['finished']:
+    st.sidebar.markdown(f'<div class="icon-text"><i class="fas fa-hourglass-half"></i> Warming up: {warmup_status["done"]} of {warmup_status["total"]} steps ready</div>', unsafe_allow_html=True)
+
 # Home page
 if page == "Home":
     st.markdown("""
@@ -413,164 +537,197 @@ if page == "Home":
 
 # Analytics page
 elif page == "Analytics for Business":
+    import numpy as np
+    import pandas as pd
+    import plotly.express as px
+    import aggregates
+
+    price_cube = load_price_cube()
     st.header("Flight Data Analytics")
     st.markdown('<div class="icon-text" style="color: #0A74DA;"><i class="fas fa-chart-pie"></i> Discover trends to book the best flights at the best prices.</div>', unsafe_allow_html=True)
     
-    if df_flights is None or df_flights.empty:
+    if aggregates.totals(price_cube)['count'] == 0:
         st.error("Flight data is not available. Cannot display analytics.")
     else:
         st.subheader("General Insights")
         st.markdown('<div class="insights-box">', unsafe_allow_html=True)
-        num_airlines = df_flights['airline'].nunique()
-        num_flights = len(df_flights)
-        avg_price = df_flights['price'].mean()
-        
-        most_popular_route_str = "N/A"
-        if not df_flights.empty:
-            most_popular_route_group = df_flights.groupby(['From', 'to']).size()
-            if not most_popular_route_group.empty:
-                most_popular_route = most_popular_route_group.idxmax()
-                most_popular_route_str = f"{most_popular_route[0]} to {most_popular_route[1]}"
-        
-        cheapest_airline_str = "N/A"
-        if not df_flights.empty:
-            cheapest_airline_group = df_flights.groupby('airline')['price'].mean()
-            if not cheapest_airline_group.empty:
-                cheapest_airline = cheapest_airline_group.idxmin()
-                cheapest_airline_price = cheapest_airline_group.min()
-                cheapest_airline_str = f"{cheapest_airline} (₹{cheapest_airline_price:,.2f})"
-
-        most_expensive_airline_str = "N/A"
-        if not df_flights.empty:
-            most_expensive_airline_group = df_flights.groupby('airline')['price'].mean()
-            if not most_expensive_airline_group.empty:
-                most_expensive_airline = most_expensive_airline_group.idxmax()
-                most_expensive_airline_price = most_expensive_airline_group.max()
-                most_expensive_airline_str = f"{most_expensive_airline} (₹{most_expensive_airline_price:,.2f})"
-            
-        num_cities = df_flights['From'].nunique()
+        insights = load_general_insights(get_dataset_version())
         st.markdown(f"""
-        - <div class="icon-text"><i class="fas fa-plane"></i> Number of Airlines: {num_airlines}</div>
-        - <div class="icon-text"><i class="fas fa-ticket-alt"></i> Total Number of Flights: {num_flights}</div>
-        - <div class="icon-text"><i class="fas fa-rupee-sign"></i> Average Flight Price: ₹{avg_price:,.2f}</div>
-        - <div class="icon-text"><i class="fas fa-route"></i> Most Popular Route: {most_popular_route_str}</div>
-        - <div class="icon-text"><i class="fas fa-star"></i> Cheapest Airline (on average): {cheapest_airline_str}</div>
-        - <div class="icon-text"><i class="fas fa-exclamation-circle"></i> Most Expensive Airline (on average): {most_expensive_airline_str}</div>
-        - <div class="icon-text"><i class="fas fa-city"></i> Number of Cities Covered: {num_cities}</div>
+        - <div class="icon-text"><i class="fas fa-plane"></i> Number of Airlines: {insights['num_airlines']}</div>
+        - <div class="icon-text"><i class="fas fa-ticket-alt"></i> Total Number of Flights: {insights['num_flights']}</div>
+        - <div class="icon-text"><i class="fas fa-rupee-sign"></i> Average Flight Price: ₹{insights['avg_price']:,.2f}</div>
+        - <div class="icon-text"><i class="fas fa-route"></i> Most Popular Route: {insights['most_popular_route']}</div>
+        - <div class="icon-text"><i class="fas fa-star"></i> Cheapest Airline (on average): {insights['cheapest_airline']}</div>
+        - <div class="icon-text"><i class="fas fa-exclamation-circle"></i> Most Expensive Airline (on average): {insights['most_expensive_airline']}</div>
+        - <div class="icon-text"><i class="fas fa-city"></i> Number of Cities Covered: {insights['num_cities']}</div>
         """, unsafe_allow_html=True)
         st.markdown('</div>', unsafe_allow_html=True)
         
         st.markdown("---")
         st.subheader("Detailed Analysis")
 
-        if 'filter_city' not in st.session_state: st.session_state.filter_city = "All"
-        if 'filter_airline' not in st.session_state: st.session_state.filter_airline = "All"
-        if 'filter_arrival' not in st.session_state: st.session_state.filter_arrival = "All"
-        if 'analysis_type' not in st.session_state: st.session_state.analysis_type = "Average Price by Airline"
-
-        def safe_index(options, value):
-            try: return options.index(value)
-            except ValueError: return 0
-
-        col1, col2, col3 = st.columns([1, 1, 1])
-        with col1:
-            city_options = ["All"] + sorted(df_flights['From'].unique().tolist())
-            st.session_state.filter_city = st.selectbox("Filter by Departure City", city_options, index=safe_index(city_options, st.session_state.filter_city))
-        with col2:
-            airline_options = ["All"] + sorted(df_flights['airline'].unique().tolist())
-            st.session_state.filter_airline = st.selectbox("Filter by Airline", airline_options, index=safe_index(airline_options, st.session_state.filter_airline))
-        with col3:
-            arrival_options = ["All"] + sorted(df_flights['to'].unique().tolist())
-            st.session_state.filter_arrival = st.selectbox("Filter by Arrival City", arrival_options, index=safe_index(arrival_options, st.session_state.filter_arrival))
-
-        filtered_df = df_flights.copy()
-        if st.session_state.filter_city != "All":
-            filtered_df = filtered_df[filtered_df['From'] == st.session_state.filter_city]
-        if st.session_state.filter_arrival != "All":
-            filtered_df = filtered_df[filtered_df['to'] == st.session_state.filter_arrival]
-        if st.session_state.filter_airline != "All":
-            filtered_df = filtered_df[filtered_df['airline'] == st.session_state.filter_airline]
-
-        analysis_options = [
-            "Average Price by Airline", "Price Trend by Days Left", "Average Price by Number of Stops",
-            "Average Price by Departure Time", "Price by City Pair", "Price by Class",
-            "Busiest Routes", "Price Distribution"
-        ]
-        st.session_state.analysis_type = st.selectbox("Select Analysis Type", analysis_options, index=safe_index(analysis_options, st.session_state.analysis_type))
-
-        if filtered_df.empty:
-            st.warning("No data available for the selected filters. Please adjust your selections.")
-        else:
-            primary_plot_color = '#0A74DA'
-            accent_plot_color = '#FF7F00'
-
-            if st.session_state.analysis_type == "Average Price by Airline":
-                df_airline = filtered_df.groupby('airline').agg({'price': 'mean'}).reset_index().sort_values('price')
-                fig = px.bar(df_airline, x='airline', y='price', title="Average Price by Airline", color='airline', labels={'price': 'Average Price (INR)'}, color_discrete_sequence=px.colors.qualitative.Plotly)
-                fig.update_layout(title_font_family="Montserrat", font_family="Inter")
-                st.plotly_chart(fig, use_container_width=True)
+        # Filters, analysis type and chart rerun on their own when one of their widgets changes
+        @timed_fragment
+        def detailed_analysis():
+            version = get_dataset_version()
+            price_cube = load_price_cube()
+
+            if 'filter_city' not in st.session_state: st.session_state.filter_city = "All"
+            if 'filter_airline' not in st.session_state: st.session_state.filter_airline = "All"
+            if 'filter_arrival' not in st.session_state: st.session_state.filter_arrival = "All"
+            if 'analysis_type' not in st.session_state: st.session_state.analysis_type = "Average Price by Airline"
+
+            def safe_index(options, value):
+                try: return options.index(value)
+                except ValueError: return 0
+
+            col1, col2, col3 = st.columns([1, 1, 1])
+            with col1:
+                city_options = ["All"] + load_key_values(version, 'From')
+                st.session_state.filter_city = st.selectbox("Filter by Departure City", city_options, index=safe_index(city_options, st.session_state.filter_city))
+            with col2:
+                airline_options = ["All"] + load_key_values(version, 'airline')
+                st.session_state.filter_airline = st.selectbox("Filter by Airline", airline_options, index=safe_index(airline_options, st.session_state.filter_airline))
+            with col3:
+                arrival_options = ["All"] + load_key_values(version, 'to')
+                st.session_state.filter_arrival = st.selectbox("Filter by Arrival City", arrival_options, index=safe_index(arrival_options, st.session_state.filter_arrival))
+
+            analytics_filters = {}
+            if st.session_state.filter_city != "All":
+                analytics_filters['From'] = st.session_state.filter_city
+            if st.session_state.filter_arrival != "All":
+                analytics_filters['to'] = st.session_state.filter_arrival
+            if st.session_state.filter_airline != "All":
+                analytics_filters['airline'] = st.session_state.filter_airline
+            filtered_stats = aggregates.totals(price_cube, analytics_filters)
+
+            analysis_options = [
+                "Average Price by Airline", "Price Trend by Days Left", "Average Price by Number of Stops",
+                "Average Price by Departure Time", "Price by City Pair", "Price by Class",
+                "Busiest Routes", "Price Distribution", "Price Bands by Airline"
+            ]
+            st.session_state.analysis_type = st.selectbox("Select Analysis Type", analysis_options, index=safe_index(analysis_options, st.session_state.analysis_type))
+
+            if filtered_stats['count'] == 0:
+                st.warning("No data available for the selected filters. Please adjust your selections.")
+            else:
+                primary_plot_color = '#0A74DA'
+                accent_plot_color = '#FF7F00'
+
+                if st.session_state.analysis_type == "Average Price by Airline":
+                    with perf.span('analytics: Average Price by Airline'):
+                        df_airline = aggregates.rollup(price_cube, ['airline'], analytics_filters).rename(columns={'mean': 'price'}).sort_values('price')
+                    with perf.span('figure: Average Price by Airline'):
+                        fig = px.bar(df_airline, x='airline', y='price', title="Average Price by Airline", color='airline', labels={'price': 'Average Price (INR)'}, color_discrete_sequence=px.colors.qualitative.Plotly)
+                        fig.update_layout(title_font_family="Montserrat", font_family="Inter")
+                        st.plotly_chart(fig, use_container_width=True)
             
-            elif st.session_state.analysis_type == "Price Trend by Days Left":
-                df_days = filtered_df.groupby('days_left').agg({'price': 'mean'}).reset_index()
-                fig = px.line(df_days, x='days_left', y='price', title="Price Trend by Days Left", labels={'price': 'Average Price (INR)'}, line_shape='spline', color_discrete_sequence=[primary_plot_color])
-                fig.update_layout(title_font_family="Montserrat", font_family="Inter")
-                st.plotly_chart(fig, use_container_width=True)
+                elif st.session_state.analysis_type == "Price Trend by Days Left":
+                    with perf.span('analytics: Price Trend by Days Left'):
+                        df_days = aggregates.coarsen(aggregates.rollup(price_cube, ['days_left'], analytics_filters), 'days_left').rename(columns={'mean': 'price'})
+                    with perf.span('figure: Price Trend by Days Left'):
+                        fig = px.line(df_days, x='days_left', y='price', title="Price Trend by Days Left", labels={'price': 'Average Price (INR)'}, line_shape='spline', color_discrete_sequence=[primary_plot_color])
+                        fig.update_layout(title_font_family="Montserrat", font_family="Inter")
+                        st.plotly_chart(fig, use_container_width=True)
             
-            elif st.session_state.analysis_type == "Average Price by Number of Stops":
-                df_stops = filtered_df.groupby('stops').agg({'price': 'mean'}).reset_index().sort_values('price')
-                fig = px.bar(df_stops, x='stops', y='price', title="Average Price by Number of Stops", color='stops', labels={'price': 'Average Price (INR)'}, color_discrete_sequence=px.colors.qualitative.Pastel)
-                fig.update_layout(title_font_family="Montserrat", font_family="Inter")
-                st.plotly_chart(fig, use_container_width=True)
+                elif st.session_state.analysis_type == "Average Price by Number of Stops":
+                    with perf.span('analytics: Average Price by Number of Stops'):
+                        df_stops = aggregates.rollup(price_cube, ['stops'], analytics_filters).rename(columns={'mean': 'price'}).sort_values('price')
+                    with perf.span('figure: Average Price by Number of Stops'):
+                        fig = px.bar(df_stops, x='stops', y='price', title="Average Price by Number of Stops", color='stops', labels={'price': 'Average Price (INR)'}, color_discrete_sequence=px.colors.qualitative.Pastel)
+                        fig.update_layout(title_font_family="Montserrat", font_family="Inter")
+                        st.plotly_chart(fig, use_container_width=True)
             
-            elif st.session_state.analysis_type == "Average Price by Departure Time":
-                df_time = filtered_df.groupby('departure_time').agg({'price': 'mean'}).reset_index().sort_values('price')
-                fig = px.bar(df_time, x='departure_time', y='price', title="Average Price by Departure Time", color='departure_time', labels={'price': 'Average Price (INR)'}, color_discrete_sequence=px.colors.qualitative.Safe)
-                fig.update_layout(title_font_family="Montserrat", font_family="Inter")
-                st.plotly_chart(fig, use_container_width=True)
+                elif st.session_state.analysis_type == "Average Price by Departure Time":
+                    with perf.span('analytics: Average Price by Departure Time'):
+                        df_time = aggregates.rollup(price_cube, ['departure_time'], analytics_filters).rename(columns={'mean': 'price'}).sort_values('price')
+                    with perf.span('figure: Average Price by Departure Time'):
+                        fig = px.bar(df_time, x='departure_time', y='price', title="Average Price by Departure Time", color='departure_time', labels={'price': 'Average Price (INR)'}, color_discrete_sequence=px.colors.qualitative.Safe)
+                        fig.update_layout(title_font_family="Montserrat", font_family="Inter")
+                        st.plotly_chart(fig, use_container_width=True)
             
-            elif st.session_state.analysis_type == "Price by City Pair":
-                filtered_df['route'] = filtered_df['From'] + ' to ' + filtered_df['to']
-                df_city = filtered_df.groupby('route').agg({'price': 'mean'}).reset_index().sort_values('price').head(10)
-                fig = px.bar(df_city, x='route', y='price', title="Top 10 Cheapest Routes", color='route', labels={'price': 'Average Price (INR)'}, color_discrete_sequence=px.colors.qualitative.Vivid)
-                fig.update_layout(title_font_family="Montserrat", font_family="Inter")
-                st.plotly_chart(fig, use_container_width=True)
+                elif st.session_state.analysis_type == "Price by City Pair":
+                    with perf.span('analytics: Price by City Pair'):
+                        df_city = aggregates.rollup(price_cube, ['From', 'to'], analytics_filters).rename(columns={'mean': 'price'})
+                        df_city['route'] = df_city['From'].astype(str) + ' to ' + df_city['to'].astype(str)
+                        df_city = df_city.sort_values('price').head(10)
+                    with perf.span('figure: Price by City Pair'):
+                        fig = px.bar(df_city, x='route', y='price', title="Top 10 Cheapest Routes", color='route', labels={'price': 'Average Price (INR)'}, color_discrete_sequence=px.colors.qualitative.Vivid)
+                        fig.update_layout(title_font_family="Montserrat", font_family="Inter")
+                        st.plotly_chart(fig, use_container_width=True)
             
-            elif st.session_state.analysis_type == "Price by Class":
-                df_class = filtered_df.groupby('Class').agg({'price': 'mean'}).reset_index()
-                fig = px.bar(df_class, x='Class', y='price', title="Average Price by Class", color='Class', labels={'price': 'Average Price (INR)'}, color_discrete_map={'Economy': primary_plot_color, 'Business': accent_plot_color})
-                fig.update_layout(title_font_family="Montserrat", font_family="Inter")
-                st.plotly_chart(fig, use_container_width=True)
+                elif st.session_state.analysis_type == "Price by Class":
+                    with perf.span('analytics: Price by Class'):
+                        df_class = aggregates.rollup(price_cube, ['Class'], analytics_filters).rename(columns={'mean': 'price'})
+                    with perf.span('figure: Price by Class'):
+                        fig = px.bar(df_class, x='Class', y='price', title="Average Price by Class", color='Class', labels={'price': 'Average Price (INR)'}, color_discrete_map={'Economy': primary_plot_color, 'Business': accent_plot_color})
+                        fig.update_layout(title_font_family="Montserrat", font_family="Inter")
+                        st.plotly_chart(fig, use_container_width=True)
             
-            elif st.session_state.analysis_type == "Busiest Routes":
-                filtered_df['route'] = filtered_df['From'] + ' to ' + filtered_df['to']
-                df_routes = filtered_df.groupby('route').agg({'price': 'count'}).reset_index().sort_values('price', ascending=False).head(10)
-                df_routes.columns = ['route', 'count']
-                fig = px.bar(df_routes, x='route', y='count', title="Top 10 Busiest Routes", color='route', labels={'count': 'Number of Flights'}, color_discrete_sequence=px.colors.qualitative.Bold)
-                fig.update_layout(title_font_family="Montserrat", font_family="Inter")
-                st.plotly_chart(fig, use_container_width=True)
+                elif st.session_state.analysis_type == "Busiest Routes":
+                    with perf.span('analytics: Busiest Routes'):
+                        df_routes = aggregates.rollup(price_cube, ['From', 'to'], analytics_filters)
+                        df_routes['route'] = df_routes['From'].astype(str) + ' to ' + df_routes['to'].astype(str)
+                        df_routes = df_routes[['route', 'count']].sort_values('count', ascending=False).head(10)
+                    with perf.span('figure: Busiest Routes'):
+                        fig = px.bar(df_routes, x='route', y='count', title="Top 10 Busiest Routes", color='route', labels={'count': 'Number of Flights'}, color_discrete_sequence=px.colors.qualitative.Bold)
+                        fig.update_layout(title_font_family="Montserrat", font_family="Inter")
+                        st.plotly_chart(fig, use_container_width=True)
             
-            elif st.session_state.analysis_type == "Price Distribution":
-                fig = px.histogram(filtered_df, x='price', nbins=30, title="Price Distribution", labels={'price': 'Price (INR)'}, color_discrete_sequence=[primary_plot_color])
-                fig.update_layout(bargap=0.1, title_font_family="Montserrat", font_family="Inter")
-                st.plotly_chart(fig, use_container_width=True)
+                elif st.session_state.analysis_type == "Price Distribution":
+                    with perf.span('analytics: Price Distribution'):
+                        hist_counts, hist_edges = aggregates.histogram(price_cube, analytics_filters)
+                        occupied = np.flatnonzero(hist_counts)
+                        hist_slice = slice(occupied[0], occupied[-1] + 1)
+                        df_hist = pd.DataFrame({'price': (hist_edges[:-1] + hist_edges[1:])[hist_slice] / 2, 'count': hist_counts[hist_slice]})
+                    with perf.span('figure: Price Distribution'):
+                        fig = px.bar(df_hist, x='price', y='count', title="Price Distribution", labels={'price': 'Price (INR)'}, color_discrete_sequence=[primary_plot_color])
+                        fig.update_layout(bargap=0.1, title_font_family="Montserrat", font_family="Inter")
+                        st.plotly_chart(fig, use_container_width=True)
+
+                elif st.session_state.analysis_type == "Price Bands by Airline":
+                    import quantile_sketch
+                    with perf.span('analytics: Price Bands by Airline'):
+                        df_bands = quantile_sketch.bands(load_price_sketches(), ['airline'], analytics_filters).sort_values('p50')
+                    with perf.span('figure: Price Bands by Airline'):
+                        fig = px.bar(df_bands, x='airline', y='p50', title="Price Bands by Airline (10th to 90th percentile)", color='airline',
+                                     error_y=df_bands['p90'] - df_bands['p50'], error_y_minus=df_bands['p50'] - df_bands['p10'],
+                                     labels={'p50': 'Median Price (INR)'}, hover_data=['p10', 'p90'], color_discrete_sequence=px.colors.qualitative.Plotly)
+                        fig.update_layout(title_font_family="Montserrat", font_family="Inter")
+                        st.plotly_chart(fig, use_container_width=True)
+
+        detailed_analysis()
+
 # Predict Price page
-elif page == "Predict Price for Business" and model is not None:
+elif page == "Predict Price for Business":
+    import numpy as np
+    import pandas as pd
+    import aggregates
+    import booking_curves
+    import config_search
+    import encoders as feature_encoders
+    import prediction as price_prediction
+    import quantile_sketch
+
+    active_model = get_active_model()
+    model, encoders = active_model.model, active_model.encoders
+    price_cube = load_price_cube()
     st.header("Flight Price Predictor")
     st.markdown('<div class="icon-text" style="color: #0A74DA;"><i class="fas fa-search-dollar"></i> Predict flight prices with ease and confidence.</div>', unsafe_allow_html=True)
     
-    if df_flights is None or df_flights.empty:
+    if aggregates.totals(price_cube)['count'] == 0:
         st.error("Flight data is not available. Cannot make predictions.")
     else:
         col1, col2 = st.columns(2)
         with col1:
-            airline = st.selectbox("Airline", sorted(df_flights['airline'].unique()))
-            departure = st.selectbox("Departure City", sorted(df_flights['From'].unique()))
-            dep_time = st.selectbox("Departure Time", sorted(df_flights['departure_time'].unique()))
+            airline = st.selectbox("Airline", feature_encoders.vocabulary(encoders, 'airline'))
+            departure = st.selectbox("Departure City", feature_encoders.vocabulary(encoders, 'From'))
+            dep_time = st.selectbox("Departure Time", feature_encoders.vocabulary(encoders, 'departure_time'))
             stops = st.selectbox("Stops", ['Zero', 'One', 'Two or more'])
         
         with col2:
-            arrival = st.selectbox("Arrival City", sorted(df_flights['to'].unique()))
-            arr_time = st.selectbox("Arrival Time", sorted(df_flights['arrival_time'].unique()))
+            arrival = st.selectbox("Arrival City", feature_encoders.vocabulary(encoders, 'to'))
+            arr_time = st.selectbox("Arrival Time", feature_encoders.vocabulary(encoders, 'arrival_time'))
             flight_class = st.selectbox("Class", ['Economy', 'Business'])
             days_left = st.number_input("Days Before Flight", min_value=1, step=1, value=30, format="%d")
             st.markdown("**Flight Duration**")
@@ -586,16 +743,14 @@ elif page == "Predict Price for Business" and model is not None:
         
         st.markdown("---")
         st.subheader("Quick Stats for Your Route")
-        route_df = df_flights[(df_flights['From'] == departure) & (df_flights['to'] == arrival)]
-        if not route_df.empty and departure != arrival:
-            avg_route_price = route_df['price'].mean()
-            num_flights_route = len(route_df)
+        route_stats, cheapest_airline_route_group = load_route_stats(get_dataset_version(), departure, arrival)
+        if route_stats['count'] > 0 and departure != arrival:
+            avg_route_price = route_stats['mean']
+            num_flights_route = route_stats['count']
             cheapest_airline_route_str = "N/A"
-            cheapest_airline_route_group = route_df.groupby('airline')['price'].mean()
             if not cheapest_airline_route_group.empty:
-                cheapest_airline_route = cheapest_airline_route_group.idxmin()
-                cheapest_airline_price_val = cheapest_airline_route_group.min()
-                cheapest_airline_route_str = f"{cheapest_airline_route} (₹{cheapest_airline_price_val:,.2f})"
+                cheapest_airline_route = cheapest_airline_route_group.loc[cheapest_airline_route_group['mean'].idxmin()]
+                cheapest_airline_route_str = f"{cheapest_airline_route['airline']} (₹{cheapest_airline_route['mean']:,.2f})"
 
             st.markdown(f"""
             - <div class="icon-text"><i class="fas fa-rupee-sign"></i> Average Price ({departure} to {arrival}): ₹{avg_route_price:,.2f}</div>
@@ -615,131 +770,236 @@ elif page == "Predict Price for Business" and model is not None:
                 st.markdown('<div class="stAlert"><i class="fas fa-exclamation-triangle"></i> Error: Flight duration must be at least 30 minutes. Please specify hours and/or minutes.</div>', unsafe_allow_html=True)
             else:
                 try:
-                    # Ensure processed_df_flights is used for fitting encoders if it's the one used for model training
-                    # If the original df_flights was used for training, then fit on that.
-                    # Assuming processed_df_flights is the correct one as it contains encoded columns.
-                    if processed_df_flights.empty:
-                         st.error("Processed flight data is not available for prediction encoding.")
-                         st.stop()
-
-                    le_airline = LabelEncoder().fit(processed_df_flights['airline'])
-                    le_from = LabelEncoder().fit(processed_df_flights['From'])
-                    le_to = LabelEncoder().fit(processed_df_flights['to'])
-                    le_dep_time = LabelEncoder().fit(processed_df_flights['departure_time'])
-                    le_arr_time = LabelEncoder().fit(processed_df_flights['arrival_time'])
-
-                    airline_enc = le_airline.transform([airline])[0]
-                    dep_enc = le_from.transform([departure])[0]
-                    arr_enc = le_to.transform([arrival])[0]
-                    dep_time_enc = le_dep_time.transform([dep_time])[0]
-                    arr_time_enc = le_arr_time.transform([arr_time])[0]
-                    
-                    stops_map = {'Zero': 0, 'One': 1, 'Two or more': 2}
-                    stops_enc = stops_map[stops]
-                    class_map = {'Economy': 0, 'Business': 1}
-                    class_enc = class_map[flight_class]
+                    with perf.span('predict: encode'):
+                        input_data = feature_encoders.encode_features(
+                            encoders, duration, days_left, airline,
+                            dep_time, departure, arr_time,
+                            arrival, flight_class, stops
+                        )
                     
-                    input_data = np.array([[
-                        duration, days_left, airline_enc, 
-                        dep_time_enc, dep_enc, arr_time_enc,
-                        arr_enc, class_enc, stops_enc
-                    ]])
-                    
-                    prediction = model.predict(input_data)[0]
+                    with perf.span('predict: model'):
+                        prediction = load_prediction_cache().predict(model, input_data, active_model.version)[0]
                     st.markdown(f'<div class="stSuccess"><i class="fas fa-check-circle"></i> Predicted Price: ₹{prediction:,.2f}</div>', unsafe_allow_html=True)
+                    st.markdown(f'<div class="icon-text"><i class="fas fa-code-branch"></i> Model version: {active_model.version}</div>', unsafe_allow_html=True)
+                    with perf.span('predict: price percentile'):
+                        route_percentile = quantile_sketch.percentile(load_price_sketches(), prediction, {'From': departure, 'to': arrival, 'Class': flight_class})
+                    if not np.isnan(route_percentile):
+                        st.markdown(f'<div class="icon-text"><i class="fas fa-percentage"></i> Price Percentile: the predicted fare is higher than {route_percentile:.0f}% of {flight_class} fares from {departure} to {arrival}.</div>', unsafe_allow_html=True)
+
+                    curves = load_booking_curves(active_model.version, active_model)
+                    advice = booking_curves.booking_advice(curves, departure, arrival, airline, flight_class, days_left) if curves else None
+                    if advice and advice['savings'] >= 1:
+                        st.markdown(f'<div class="icon-text"><i class="fas fa-calendar-check"></i> Booking Tip: book {advice["best_days_left"]} days ahead to save ₹{advice["savings"]:,.2f} (predicted ₹{advice["best_price"]:,.2f} vs ₹{advice["current_price"]:,.2f} if booked now).</div>', unsafe_allow_html=True)
+                    elif advice:
+                        st.markdown(f'<div class="icon-text"><i class="fas fa-calendar-check"></i> Booking Tip: booking now ({days_left} days ahead) is already the cheapest predicted option for this flight.</div>', unsafe_allow_html=True)
                     
                     st.markdown("---")
                     st.subheader("Contextual Insights")
-                    overall_avg = df_flights['price'].mean()
-                    st.markdown(f'<div class="icon-text"><i class="fas fa-globe-asia"></i> Overall Average Flight Price (All Routes): ₹{overall_avg:,.2f}</div>', unsafe_allow_html=True)
-                    airline_avg = df_flights[df_flights['airline'] == airline]['price'].mean()
-                    st.markdown(f'<div class="icon-text"><i class="fas fa-plane"></i> Average Price for {airline}: ₹{airline_avg:,.2f}</div>', unsafe_allow_html=True)
-                    class_avg = df_flights[df_flights['Class'] == flight_class]['price'].mean()
-                    st.markdown(f'<div class="icon-text"><i class="fas fa-chair"></i> Average Price for {flight_class} Class: ₹{class_avg:,.2f}</div>', unsafe_allow_html=True)
+                    with perf.span('predict: contextual insights'):
+                        overall_avg = aggregates.totals(price_cube)['mean']
+                        st.markdown(f'<div class="icon-text"><i class="fas fa-globe-asia"></i> Overall Average Flight Price (All Routes): ₹{overall_avg:,.2f}</div>', unsafe_allow_html=True)
+                        airline_avg = aggregates.totals(price_cube, {'airline': airline})['mean']
+                        st.markdown(f'<div class="icon-text"><i class="fas fa-plane"></i> Average Price for {airline}: ₹{airline_avg:,.2f}</div>', unsafe_allow_html=True)
+                        class_avg = aggregates.totals(price_cube, {'Class': flight_class})['mean']
+                        st.markdown(f'<div class="icon-text"><i class="fas fa-chair"></i> Average Price for {flight_class} Class: ₹{class_avg:,.2f}</div>', unsafe_allow_html=True)
                     
-                    stops_df_temp = df_flights[df_flights['stops'] == stops]
-                    stops_avg = stops_df_temp['price'].mean() if not stops_df_temp.empty else overall_avg
-                    st.markdown(f'<div class="icon-text"><i class="fas fa-map-signs"></i> Average Price for {stops} Stops: ₹{stops_avg:,.2f} (compare with overall)</div>', unsafe_allow_html=True)
-                    days_left_df_temp = df_flights[df_flights['days_left'] == days_left]
-                    days_left_avg = days_left_df_temp['price'].mean() if not days_left_df_temp.empty else overall_avg
-                    st.markdown(f'<div class="icon-text"><i class="fas fa-calendar-alt"></i> Average Price for Booking {days_left} Days Left: ₹{days_left_avg:,.2f} (compare with overall)</div>', unsafe_allow_html=True)
+                        stops_stats = aggregates.totals(price_cube, {'stops': stops})
+                        stops_avg = stops_stats['mean'] if stops_stats['count'] else overall_avg
+                        st.markdown(f'<div class="icon-text"><i class="fas fa-map-signs"></i> Average Price for {stops} Stops: ₹{stops_avg:,.2f} (compare with overall)</div>', unsafe_allow_html=True)
+                        days_left_stats = aggregates.totals(price_cube, {'days_left': days_left})
+                        days_left_avg = days_left_stats['mean'] if days_left_stats['count'] else overall_avg
+                        st.markdown(f'<div class="icon-text"><i class="fas fa-calendar-alt"></i> Average Price for Booking {days_left} Days Left: ₹{days_left_avg:,.2f} (compare with overall)</div>', unsafe_allow_html=True)
                 
                 except Exception as e:
                     st.markdown(f'<div class="stAlert"><i class="fas fa-exclamation-triangle"></i> Prediction failed: {str(e)}. Please check inputs or model.</div>', unsafe_allow_html=True)
 
+        st.markdown("---")
+        st.subheader("Cheapest Configuration Search")
+
+        # Search options and results rerun on their own; the route and model come from the form above
+        @timed_fragment
+        def configuration_search(departure, arrival, active_model):
+            st.markdown(f'<div class="icon-text"><i class="fas fa-search"></i> Find the cheapest predicted airline, timing, stops and class for {departure} to {arrival}.</div>', unsafe_allow_html=True)
+            col_search1, col_search2, col_search3 = st.columns(3)
+            with col_search1:
+                travel_date = st.date_input("Travel Date", value=datetime.date.today() + datetime.timedelta(days=30), min_value=datetime.date.today() + datetime.timedelta(days=1))
+            with col_search2:
+                search_class = st.selectbox("Class to Search", ['Any', 'Economy', 'Business'])
+            with col_search3:
+                top_k = st.number_input("Options to Show", min_value=1, max_value=20, step=1, value=5, format="%d")
+            if st.button("🔎 Find Cheapest Options"):
+                if departure == arrival:
+                    st.markdown('<div class="stAlert"><i class="fas fa-exclamation-triangle"></i> Error: Departure and arrival cities cannot be the same.</div>', unsafe_allow_html=True)
+                else:
+                    try:
+                        configuration_table = load_configuration_table(get_dataset_version())
+                        search_days_left = config_search.days_until(travel_date)
+                        with perf.span('predict: configuration search'):
+                            cheapest_df = config_search.cheapest_configurations(
+                                active_model.model, active_model.encoders, configuration_table, departure, arrival, search_days_left,
+                                top_k=top_k, Class=None if search_class == 'Any' else search_class
+                            )
+                        if cheapest_df.empty:
+                            st.markdown('<div class="icon-text"><i class="fas fa-info-circle"></i> No flights on this route in our dataset to search over.</div>', unsafe_allow_html=True)
+                        else:
+                            st.dataframe(cheapest_df[config_search.SEARCH_COLUMNS + ['duration', 'days_left', 'predicted_price']], use_container_width=True)
+                            st.markdown(f'<div class="icon-text"><i class="fas fa-code-branch"></i> Predicted with model version {active_model.version}</div>', unsafe_allow_html=True)
+                    except Exception as e:
+                        st.markdown(f'<div class="stAlert"><i class="fas fa-exclamation-triangle"></i> Search failed: {str(e)}.</div>', unsafe_allow_html=True)
+
+        configuration_search(departure, arrival, active_model)
+
+        st.markdown("---")
+        st.subheader("Batch Prediction")
+
+        @timed_fragment
+        def batch_prediction(active_model):
+            st.markdown(f'<div class="icon-text"><i class="fas fa-file-csv"></i> Upload a CSV with columns: {", ".join(price_prediction.BATCH_INPUT_COLUMNS)} (duration in minutes).</div>', unsafe_allow_html=True)
+            batch_file = st.file_uploader("Itineraries CSV", type="csv")
+            if batch_file is not None:
+                try:
+                    # Price each uploaded file once per model version, not on every rerun
+                    batch_key = (batch_file.file_id, active_model.version)
+                    if st.session_state.get('batch_prediction', (None, None))[0] != batch_key:
+                        batch_df = pd.read_csv(batch_file)
+                        with perf.span('predict: batch'):
+                            st.session_state.batch_prediction = (batch_key, price_prediction.predict_batch(active_model.model, active_model.encoders, batch_df))
+                    priced_df = st.session_state.batch_prediction[1]
+                    num_failed = int((priced_df['error'] != '').sum())
+                    st.markdown(f'<div class="stSuccess"><i class="fas fa-check-circle"></i> Priced {len(priced_df) - num_failed:,} of {len(priced_df):,} itineraries with model version {active_model.version}.</div>', unsafe_allow_html=True)
+                    if num_failed:
+                        st.markdown(f'<div class="stAlert"><i class="fas fa-exclamation-triangle"></i> {num_failed:,} rows could not be priced; see the error column.</div>', unsafe_allow_html=True)
+                    st.dataframe(priced_df.head(100), use_container_width=True)
+                    st.download_button("⬇️ Download Priced Itineraries", priced_df.to_csv(index=False), file_name="priced_itineraries.csv", mime="text/csv")
+                except Exception as e:
+                    st.markdown(f'<div class="stAlert"><i class="fas fa-exclamation-triangle"></i> Batch prediction failed: {str(e)}.</div>', unsafe_allow_html=True)
+
+        batch_prediction(active_model)
+
 # Travel Corner page
 elif page == "Traveler Corner":
+    import aggregates
+    import booking_curves
+    import itinerary_search
+
+    price_cube = load_price_cube()
     st.header("Traveler Corner")
     st.markdown('<div class="icon-text" style="color: #0A74DA;"><i class="fas fa-suitcase-rolling"></i> Get personalized travel tips for your  trips.</div>', unsafe_allow_html=True)
     
-    if df_flights is None or df_flights.empty:
+    if aggregates.totals(price_cube)['count'] == 0:
         st.error("Flight data is not available. Cannot provide travel tips.")
     else:
-        budget = st.number_input("Enter your budget (INR)", min_value=1000, step=100, value=5000, format="%d")
+        # Budget, route and tips rerun on their own when one of their widgets changes
+        @timed_fragment
+        def travel_tips():
+            budget = st.number_input("Enter your budget (INR)", min_value=1000, step=100, value=5000, format="%d")
         
-        departure_options_tc = sorted(df_flights['From'].dropna().unique().tolist())
-        departure_tc = st.selectbox("Select Departure City", departure_options_tc, key="tc_dep")
+            departure_options_tc = load_key_values(get_dataset_version(), 'From')
+            departure_tc = st.selectbox("Select Departure City", departure_options_tc, key="tc_dep")
         
-        arrival_options_tc = sorted(df_flights["to"].dropna().unique().tolist())
-        arrival_tc = st.selectbox("Select Arrival City", arrival_options_tc, key="tc_arr")
+            arrival_options_tc = load_key_values(get_dataset_version(), 'to')
+            arrival_tc = st.selectbox("Select Arrival City", arrival_options_tc, key="tc_arr")
+            days_left_tc = st.number_input("Days Before Flight", min_value=1, step=1, value=30, format="%d", key="tc_days")
         
-        if st.button("💡 Get Travel Tips"):
-            if departure_tc == arrival_tc:
-                st.markdown('<div class="stAlert"><i class="fas fa-exclamation-triangle"></i> Error: Departure and arrival cities cannot be the same.</div>', unsafe_allow_html=True)
-            else:
-                route_df_tc = df_flights[(df_flights['From'] == departure_tc) & (df_flights['to'] == arrival_tc)]
-                if route_df_tc.empty:
-                    st.markdown('<div class="icon-text"><i class="fas fa-info-circle"></i> No direct flight data available for this route. Cannot generate specific tips.</div>', unsafe_allow_html=True)
+            if st.button("💡 Get Travel Tips"):
+                if departure_tc == arrival_tc:
+                    st.markdown('<div class="stAlert"><i class="fas fa-exclamation-triangle"></i> Error: Departure and arrival cities cannot be the same.</div>', unsafe_allow_html=True)
                 else:
-                    st.subheader(f"Tips for {departure_tc} to {arrival_tc} within ₹{budget:,.0f} budget")
+                    route_df_tc = select_flights({'From': departure_tc, 'to': arrival_tc})
+                    if route_df_tc.empty:
+                        st.markdown('<div class="icon-text"><i class="fas fa-info-circle"></i> No direct flight data available for this route. See the connecting itineraries below.</div>', unsafe_allow_html=True)
+                    else:
+                        st.subheader(f"Tips for {departure_tc} to {arrival_tc} within ₹{budget:,.0f} budget")
                     
-                    budget_flights = route_df_tc[route_df_tc['price'] <= budget]
+                        with perf.span('traveler: budget filter'):
+                            budget_flights = route_df_tc[route_df_tc['price'] <= budget]
                     
-                    if budget_flights.empty:
-                        st.markdown(f'<div class="icon-text"><i class="fas fa-sad-tear"></i> No flights found within your budget of ₹{budget:,.0f} for this route. Consider increasing your budget or checking other routes.</div>', unsafe_allow_html=True)
-                        cheapest_overall_on_route = route_df_tc['price'].min()
-                        st.markdown(f'<div class="icon-text"><i class="fas fa-info-circle"></i> The cheapest flight on this route currently costs ₹{cheapest_overall_on_route:,.2f}.</div>', unsafe_allow_html=True)
-                    else:
-                        best_airline_budget_str = "N/A"
-                        best_airline_budget_group = budget_flights.groupby('airline')['price'].mean()
-                        if not best_airline_budget_group.empty:
-                            best_airline_budget = best_airline_budget_group.idxmin()
-                            avg_price_best_airline_budget = best_airline_budget_group.min()
-                            best_airline_budget_str = f"{best_airline_budget} (Average Price: ₹{avg_price_best_airline_budget:,.2f})"
-
-                        best_time_budget_str = "N/A"
-                        best_time_budget_group = budget_flights.groupby('departure_time')['price'].mean()
-                        if not best_time_budget_group.empty:
-                            best_time_budget = best_time_budget_group.idxmin()
-                            avg_price_best_time_budget = best_time_budget_group.min()
-                            best_time_budget_str = f"{best_time_budget} (Average Price: ₹{avg_price_best_time_budget:,.2f})"
+                        if budget_flights.empty:
+                            st.markdown(f'<div class="icon-text"><i class="fas fa-sad-tear"></i> No flights found within your budget of ₹{budget:,.0f} for this route. Consider increasing your budget or checking other routes.</div>', unsafe_allow_html=True)
+                            cheapest_overall_on_route = route_df_tc['price'].min()
+                            st.markdown(f'<div class="icon-text"><i class="fas fa-info-circle"></i> The cheapest flight on this route currently costs ₹{cheapest_overall_on_route:,.2f}.</div>', unsafe_allow_html=True)
+                        else:
+                            with perf.span('traveler: budget aggregations'):
+                                best_airline_budget_str = "N/A"
+                                best_airline_budget_group = budget_flights.groupby('airline', observed=True)['price'].mean()
+                                if not best_airline_budget_group.empty:
+                                    best_airline_budget = best_airline_budget_group.idxmin()
+                                    avg_price_best_airline_budget = best_airline_budget_group.min()
+                                    best_airline_budget_str = f"{best_airline_budget} (Average Price: ₹{avg_price_best_airline_budget:,.2f})"
+
+                                best_time_budget_str = "N/A"
+                                best_time_budget_group = budget_flights.groupby('departure_time', observed=True)['price'].mean()
+                                if not best_time_budget_group.empty:
+                                    best_time_budget = best_time_budget_group.idxmin()
+                                    avg_price_best_time_budget = best_time_budget_group.min()
+                                    best_time_budget_str = f"{best_time_budget} (Average Price: ₹{avg_price_best_time_budget:,.2f})"
                         
-                        optimal_days_budget_str = "N/A"
-                        optimal_days_budget_group = budget_flights.groupby('days_left')['price'].mean()
-                        if not optimal_days_budget_group.empty:
-                            optimal_days_budget = optimal_days_budget_group.idxmin()
-                            avg_price_optimal_days_budget = optimal_days_budget_group.min()
-                            optimal_days_budget_str = f"{optimal_days_budget} days in advance (Average Price: ₹{avg_price_optimal_days_budget:,.2f})"
-
-                        cheapest_flight_budget = budget_flights['price'].min()
+                                optimal_days_budget_str = "N/A"
+                                optimal_days_budget_group = budget_flights.groupby('days_left')['price'].mean()
+                                if not optimal_days_budget_group.empty:
+                                    optimal_days_budget = optimal_days_budget_group.idxmin()
+                                    avg_price_optimal_days_budget = optimal_days_budget_group.min()
+                                    optimal_days_budget_str = f"{optimal_days_budget} days in advance (Average Price: ₹{avg_price_optimal_days_budget:,.2f})"
+
+                                cheapest_flight_budget = budget_flights['price'].min()
                         
-                        st.markdown("### Smart Travel Recommendations:")
-                        st.markdown(f"""<div class="insights-box">
-                        - <div class="icon-text"><i class="fas fa-plane-departure"></i> **Best Airline (within budget):** {best_airline_budget_str}</div>
-                        - <div class="icon-text"><i class="fas fa-clock"></i> **Best Departure Time (within budget):** {best_time_budget_str}</div>
-                        - <div class="icon-text"><i class="fas fa-calendar-check"></i> **Optimal Days to Book (within budget):** {optimal_days_budget_str}</div>
-                        - <div class="icon-text"><i class="fas fa-tags"></i> **Cheapest Flight Found (within budget):** ₹{cheapest_flight_budget:,.2f}</div>
-                        </div>""", unsafe_allow_html=True)
-
-                        st.markdown("### General Savings Tips:")
-                        st.markdown("""<div class="insights-box">
-                        - <div class="icon-text"><i class="fas fa-user-friends"></i> Consider flying during off-peak hours or mid-week for potentially lower fares.</div>
-                        - <div class="icon-text"><i class="fas fa-briefcase"></i> If possible, travel light to avoid extra baggage fees, especially on budget airlines.</div>
-                        - <div class="icon-text"><i class="far fa-calendar-alt"></i> Booking further in advance often yields better prices, but also check for last-minute deals if your schedule is flexible.</div>
-                        </div>""", unsafe_allow_html=True)
-
-# Ensure model and df_flights are loaded before trying to access them
-if model is None or (df_flights is None or df_flights.empty):
-    st.error("Critical error: Model or flight data could not be loaded. Application cannot run fully.")
-    # st.stop() # Commenting out stop to allow other parts of UI to render if possible
-
+                            st.markdown("### Smart Travel Recommendations:")
+                            st.markdown(f"""<div class="insights-box">
+                            - <div class="icon-text"><i class="fas fa-plane-departure"></i> **Best Airline (within budget):** {best_airline_budget_str}</div>
+                            - <div class="icon-text"><i class="fas fa-clock"></i> **Best Departure Time (within budget):** {best_time_budget_str}</div>
+                            - <div class="icon-text"><i class="fas fa-calendar-check"></i> **Optimal Days to Book (within budget):** {optimal_days_budget_str}</div>
+                            - <div class="icon-text"><i class="fas fa-tags"></i> **Cheapest Flight Found (within budget):** ₹{cheapest_flight_budget:,.2f}</div>
+                            </div>""", unsafe_allow_html=True)
+
+                            st.markdown("### General Savings Tips:")
+                            st.markdown("""<div class="insights-box">
+                            - <div class="icon-text"><i class="fas fa-user-friends"></i> Consider flying during off-peak hours or mid-week for potentially lower fares.</div>
+                            - <div class="icon-text"><i class="fas fa-briefcase"></i> If possible, travel light to avoid extra baggage fees, especially on budget airlines.</div>
+                            - <div class="icon-text"><i class="far fa-calendar-alt"></i> Booking further in advance often yields better prices, but also check for last-minute deals if your schedule is flexible.</div>
+                            </div>""", unsafe_allow_html=True)
+
+                    active_model = get_active_model()
+                    curves = load_booking_curves(active_model.version, active_model)
+                    if curves:
+                        st.markdown("### Predicted Booking Window:")
+                        st.markdown(f'<div class="icon-text"><i class="fas fa-code-branch"></i> Predicted with model version {active_model.version}</div>', unsafe_allow_html=True)
+                        with perf.span('traveler: booking window'):
+                            booking_options = booking_curves.cheapest_options(curves, departure_tc, arrival_tc, budget)
+                        if booking_options.empty:
+                            route_curve = booking_curves.route_curves(curves, departure_tc, arrival_tc)
+                            if not route_curve.empty:
+                                st.markdown(f'<div class="icon-text"><i class="fas fa-info-circle"></i> No predicted fares within ₹{budget:,.0f}; the cheapest predicted fare on this route is ₹{route_curve["predicted_price"].min():,.2f}.</div>', unsafe_allow_html=True)
+                        else:
+                            last_minute = booking_curves.route_curves(curves, departure_tc, arrival_tc)
+                            last_minute = last_minute[last_minute['days_left'] == 1].set_index(['airline', 'Class'])['predicted_price']
+                            for _, option in booking_options.iterrows():
+                                savings = last_minute.get((option['airline'], option['Class']), option['predicted_price']) - option['predicted_price']
+                                st.markdown(f'<div class="icon-text"><i class="fas fa-calendar-check"></i> {option["airline"]} ({option["Class"]}): book {option["days_left"]} days ahead for ₹{option["predicted_price"]:,.2f}, saving ₹{savings:,.2f} over booking the day before.</div>', unsafe_allow_html=True)
+
+                    st.markdown("### Cheapest Itineraries with Connections:")
+                    edges = load_itinerary_edges(get_dataset_version(), active_model.version, curves)
+                    with perf.span('traveler: itinerary search'):
+                        itineraries = itinerary_search.cheapest_itineraries(edges, departure_tc, arrival_tc, days_left_tc, budget,
+                                                                           top_k=itinerary_search.MAX_CONNECTIONS + 1, one_per_connections=True)
+                    if not itineraries:
+                        st.markdown(f'<div class="icon-text"><i class="fas fa-info-circle"></i> No itinerary with up to {itinerary_search.MAX_CONNECTIONS} connections fits ₹{budget:,.0f} when booking {itinerary_search.band_label(itinerary_search.band_of(days_left_tc))} ahead.</div>', unsafe_allow_html=True)
+                    for itinerary in itineraries:
+                        legs_str = " + ".join(f"{leg['airline']} ₹{leg['price']:,.0f}" + (" (predicted)" if leg['source'] == 'predicted' else "") for leg in itinerary['legs'])
+                        connections_str = "direct" if itinerary['connections'] == 0 else f"{itinerary['connections']} connection{'s' if itinerary['connections'] > 1 else ''}"
+                        st.markdown(f'<div class="icon-text"><i class="fas fa-exchange-alt"></i> {itinerary["route"]} ({connections_str}): ₹{itinerary["total_price"]:,.2f} ({legs_str})</div>', unsafe_allow_html=True)
+
+        travel_tips()
+
+# Performance panel: spans of the last full run and process-wide totals, also written to perf_metrics.prom for scraping.
+# Sections that rerun on their own (fragments) show their latest timings under themselves instead.
+if perf.enabled():
+    with st.sidebar.expander("⏱️ Performance", expanded=False):
+        st.markdown("**Last full run**\n\n" + perf_table(perf.end_run()))
+        totals_rows = [f"| {name} | {stats['count']} | {stats['sum'] / stats['count'] * 1000:,.1f} |"
+                       for name, stats in sorted(perf.snapshot().items(), key=lambda item: -item[1]['sum'])]
+        if totals_rows:
+            st.markdown("**Since start**\n\n| Section | Calls | Mean ms |\n|---|---:|---:|\n" + "\n".join(totals_rows))
+    try:
+        perf.write_metrics()
+    except OSError:
+        pass
@@ -0,0 +1,31 @@
+"""Run the Streamlit app with its warmup started at process start.
+
+``streamlit run app.py`` only executes the script when a browser session
+connects, so a replica started that way would not load anything, or write
+a ready FPP_WARMUP_FILE, until a user had been routed to it. This launcher
+starts the warmup of the shared data and model first (see
+serving_state.py) and then runs the app in the same process, whose pages
+use the objects being warmed. Any arguments are passed on to
+``streamlit run``:
+
+    FPP_WARMUP_FILE=warmup_status.json python app_server.py --server.port 8501 --server.headless true
+    python warmup.py --check warmup_status.json       # readiness probe
+"""
+import os
+import sys
+
+import serving_state
+
+APP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+
+
+def main():
+    serving_state.start_warmup()
+    from streamlit.web import cli as streamlit_cli
+
+    sys.argv = ['streamlit', 'run', APP_SCRIPT] + sys.argv[1:]
+    sys.exit(streamlit_cli.main())
+
+
+if __name__ == '__main__':
+    main()
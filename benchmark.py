@@ -0,0 +1,328 @@
+"""Benchmarks for the data, analytics and prediction paths at several data sizes.
+
+``generate`` writes synthetic fare data with the schema and cardinalities of
+cleaned_flight_data.csv (6 airlines, 6 cities, 6 time buckets, 3 stop
+classes, 2 cabin classes, 1-49 days left), streamed in chunks so even 30M
+rows never have to fit in memory. ``run`` times every stage the app pages
+go through on each dataset, using the same module calls as the pages, and
+writes the timings to a JSON file; ``compare`` prints the ratio of two such
+files, e.g. from two commits.
+
+    python benchmark.py generate --rows 300000 3000000 30000000
+    python benchmark.py run --rows 300000 3000000 --json benchmark_results.json
+    python benchmark.py compare baseline.json benchmark_results.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import time
+
+import numpy as np
+import pandas as pd
+
+BENCH_DIR = 'bench_data'
+DEFAULT_ROWS = [300_000, 3_000_000, 30_000_000]
+GENERATE_CHUNK_ROWS = 1_000_000
+MODEL_SAMPLE_ROWS = 50_000
+
+AIRLINES = ['Vistara', 'Air_India', 'Indigo', 'GO_FIRST', 'AirAsia', 'SpiceJet']
+AIRLINE_SHARE = [0.43, 0.27, 0.14, 0.08, 0.05, 0.03]
+AIRLINE_FACTOR = [1.25, 1.15, 0.85, 0.9, 0.8, 0.85]
+FULL_SERVICE = ['Vistara', 'Air_India']  # the only airlines selling Business
+CITIES = ['Delhi', 'Mumbai', 'Bangalore', 'Kolkata', 'Hyderabad', 'Chennai']
+CITY_SHARE = [0.2, 0.2, 0.17, 0.16, 0.14, 0.13]
+TIMES = ['Early_Morning', 'Morning', 'Afternoon', 'Evening', 'Night', 'Late_Night']
+TIME_SHARE = [0.22, 0.24, 0.16, 0.22, 0.16, 0.004]
+STOPS = ['Zero', 'One', 'Two or more']
+STOPS_SHARE = [0.12, 0.84, 0.04]
+MAX_DAYS_LEFT = 49
+
+ANALYSIS_FILTERS = {'From': 'Delhi', 'airline': 'Vistara'}
+
+
+def generate_flights(n_rows, rng):
+    """``n_rows`` synthetic fares with the cleaned_flight_data.csv columns."""
+    airline_idx = rng.choice(len(AIRLINES), n_rows, p=AIRLINE_SHARE)
+    airline = np.array(AIRLINES)[airline_idx]
+    city_share = np.array(CITY_SHARE)
+    source = rng.choice(len(CITIES), n_rows, p=city_share)
+    dest = (source + rng.integers(1, len(CITIES), n_rows)) % len(CITIES)
+    stops_idx = rng.choice(len(STOPS), n_rows, p=STOPS_SHARE)
+    business = np.isin(airline, FULL_SERVICE) & (rng.random(n_rows) < 0.45)
+    days_left = rng.integers(1, MAX_DAYS_LEFT + 1, n_rows)
+    hours = np.round(np.where(stops_idx == 0, rng.uniform(0.83, 3.5, n_rows),
+                              rng.uniform(2.5, 30, n_rows) + 4 * stops_idx), 2)
+
+    distance = 1 + np.abs(source - dest)
+    booking_curve = 1 + 1.6 * np.exp(-days_left / 6.0)
+    price = (2500 + 900 * distance) * np.array(AIRLINE_FACTOR)[airline_idx] * booking_curve
+    price *= np.where(business, 7.5, 1.0) * (1 + 0.15 * stops_idx)
+    price *= rng.lognormal(0, 0.18, n_rows)
+    return pd.DataFrame({
+        'airline': airline,
+        'From': np.array(CITIES)[source],
+        'to': np.array(CITIES)[dest],
+        'departure_time': rng.choice(TIMES, n_rows, p=np.array(TIME_SHARE) / sum(TIME_SHARE)),
+        'arrival_time': rng.choice(TIMES, n_rows, p=np.array(TIME_SHARE) / sum(TIME_SHARE)),
+        'stops': np.array(STOPS)[stops_idx],
+        'Class': np.where(business, 'Business', 'Economy'),
+        'days_left': days_left,
+        'time_taken': hours,
+        'price': np.round(price),
+    })
+
+
+def scale_dir(n_rows, bench_dir=BENCH_DIR):
+    return os.path.join(bench_dir, str(n_rows))
+
+
+def write_dataset(path, n_rows, seed=0, chunk_rows=GENERATE_CHUNK_ROWS):
+    rng = np.random.default_rng(seed)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    for start in range(0, n_rows, chunk_rows):
+        chunk = generate_flights(min(chunk_rows, n_rows - start), rng)
+        chunk.to_csv(tmp_path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+    os.replace(tmp_path, path)
+
+
+def train_model(csv_path, model_path, sample_rows=MODEL_SAMPLE_ROWS, seed=0):
+    """Fit a small random forest on a sample of the synthetic data and save it with its encoders."""
+    import joblib
+    from sklearn.ensemble import RandomForestRegressor
+
+    import encoders as feature_encoders
+    import prediction
+
+    df = pd.read_csv(csv_path, nrows=sample_rows)
+    encoders = feature_encoders.fit_encoders(df)
+    features, _ = prediction.encode_batch(encoders, df.assign(duration=feature_encoders.duration_minutes(df['time_taken'])))
+    model = RandomForestRegressor(n_estimators=30, max_depth=14, n_jobs=-1, random_state=seed).fit(features, df['price'])
+    joblib.dump(model, model_path)
+    feature_encoders.save_encoders(encoders, feature_encoders.encoder_path(model_path))
+
+
+def ensure_dataset(n_rows, bench_dir=BENCH_DIR):
+    """Paths of the CSV and model for ``n_rows``, generating them if missing."""
+    directory = scale_dir(n_rows, bench_dir)
+    os.makedirs(directory, exist_ok=True)
+    csv_path = os.path.join(directory, 'cleaned_flight_data.csv')
+    model_path = os.path.join(directory, 'FPP_model.pkl')
+    if not os.path.exists(csv_path):
+        write_dataset(csv_path, n_rows)
+    if not os.path.exists(model_path):
+        train_model(csv_path, model_path)
+    return csv_path, model_path
+
+
+def timed(func, repeat):
+    """Run ``func`` ``repeat`` times; returns (last result, timing summary in seconds)."""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        durations.append(time.perf_counter() - start)
+    return result, {'runs': repeat, 'min_s': min(durations), 'median_s': statistics.median(durations),
+                    'max_s': max(durations)}
+
+
+def analyses(cube, filters):
+    """The eight Analytics page computations, as the page runs them."""
+    import aggregates
+
+    def city_pairs():
+        df_city = aggregates.rollup(cube, ['From', 'to'], filters).rename(columns={'mean': 'price'})
+        df_city['route'] = df_city['From'].astype(str) + ' to ' + df_city['to'].astype(str)
+        return df_city.sort_values('price').head(10)
+
+    def busiest_routes():
+        df_routes = aggregates.rollup(cube, ['From', 'to'], filters)
+        df_routes['route'] = df_routes['From'].astype(str) + ' to ' + df_routes['to'].astype(str)
+        return df_routes[['route', 'count']].sort_values('count', ascending=False).head(10)
+
+    def distribution():
+        counts, edges = aggregates.histogram(cube, filters)
+        occupied = np.flatnonzero(counts)
+        hist_slice = slice(occupied[0], occupied[-1] + 1)
+        return pd.DataFrame({'price': (edges[:-1] + edges[1:])[hist_slice] / 2, 'count': counts[hist_slice]})
+
+    return {
+        'Average Price by Airline': lambda: aggregates.rollup(cube, ['airline'], filters).sort_values('mean'),
+        'Price Trend by Days Left': lambda: aggregates.coarsen(aggregates.rollup(cube, ['days_left'], filters), 'days_left'),
+        'Average Price by Number of Stops': lambda: aggregates.rollup(cube, ['stops'], filters).sort_values('mean'),
+        'Average Price by Departure Time': lambda: aggregates.rollup(cube, ['departure_time'], filters).sort_values('mean'),
+        'Price by City Pair': city_pairs,
+        'Price by Class': lambda: aggregates.rollup(cube, ['Class'], filters),
+        'Busiest Routes': busiest_routes,
+        'Price Distribution': distribution,
+    }
+
+
+def general_insights(cube):
+    import aggregates
+    return (aggregates.totals(cube), aggregates.rollup(cube, ['airline']), aggregates.rollup(cube, ['From', 'to']),
+            aggregates.rollup(cube, ['From']))
+
+
+def quick_stats(cube, From, to):
+    import aggregates
+    route_filters = {'From': From, 'to': to}
+    return aggregates.totals(cube, route_filters), aggregates.rollup(cube, ['airline'], route_filters)
+
+
+def contextual_insights(cube, airline, Class, stops, days_left):
+    import aggregates
+    return [aggregates.totals(cube), aggregates.totals(cube, {'airline': airline}),
+            aggregates.totals(cube, {'Class': Class}), aggregates.totals(cube, {'stops': stops}),
+            aggregates.totals(cube, {'days_left': days_left})]
+
+
+def traveler_tips(store, curves, From, to, budget):
+    import booking_curves
+    route_df = store.select({'From': From, 'to': to})
+    budget_flights = route_df[route_df['price'] <= budget]
+    tips = [budget_flights.groupby(col, observed=True)['price'].mean() for col in ['airline', 'departure_time', 'days_left']]
+    return tips, budget_flights['price'].min(), booking_curves.cheapest_options(curves, From, to, budget)
+
+
+def run_scale(n_rows, repeat, bench_dir=BENCH_DIR):
+    import aggregates
+    import booking_curves
+    import config_search
+    import encoders as feature_encoders
+    import filter_index
+    import flight_store
+    import prediction
+    import quantile_sketch
+
+    csv_path, model_path = ensure_dataset(n_rows, bench_dir)
+    cache_dir = os.path.join(scale_dir(n_rows, bench_dir), '.flight_cache')
+    results = {}
+
+    def record(name, func, runs=repeat):
+        value, results[name] = timed(func, runs)
+        return value
+
+    def cold_load():
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        store = flight_store.FlightStore(csv_path, cache_dir)
+        store.refresh()
+        return store
+
+    def warm_load():
+        store = flight_store.FlightStore(csv_path, cache_dir)
+        store.refresh()
+        return store
+
+    record('load_flight_data: cache build (cold)', cold_load, 1)
+    store = record('load_flight_data: open cache (warm)', warm_load)
+    cube = record('process_flight_data: price cube build', store.build_cube, 1)
+    # Save the cube once, then time every run the way a fresh process gets it: mapped back from disk.
+    store.cube()
+
+    def cube_load():
+        loaded = aggregates.load_cube(cache_dir, store.version, mmap_mode='r')
+        if loaded is None:
+            raise RuntimeError(f"No saved price cube for dataset version {store.version} in {cache_dir}")
+        return loaded
+
+    record('process_flight_data: price cube load', cube_load)
+    counts = record('process_flight_data: duration counts', store.duration_counts, 1)
+    sketches = record('process_flight_data: price sketches', store.price_sketches, 1)
+    if not store.out_of_core:
+        record('process_flight_data: row index', lambda: filter_index.build_index(store.frame(), store.index_columns), 1)
+
+    record('analytics: general insights', lambda: general_insights(cube))
+    for name, func in analyses(cube, {}).items():
+        record(f'analytics: {name}', func)
+    for name, func in analyses(cube, ANALYSIS_FILTERS).items():
+        record(f'analytics (filtered): {name}', func)
+    record('analytics: Price Bands by Airline', lambda: quantile_sketch.bands(sketches, ['airline']))
+    record('analytics (filtered): Price Bands by Airline', lambda: quantile_sketch.bands(sketches, ['airline'], ANALYSIS_FILTERS))
+
+    record('predict: quick stats', lambda: quick_stats(cube, 'Delhi', 'Mumbai'))
+    model = prediction.load_predictor(model_path)
+    encoders = feature_encoders.load_encoders(feature_encoders.encoder_path(model_path))
+    features = feature_encoders.encode_features(encoders, 130, 10, 'Vistara', 'Morning', 'Delhi', 'Evening',
+                                                'Mumbai', 'Economy', 'One')
+    record('predict: single prediction', lambda: model.predict(features))
+    record('predict: price percentile',
+           lambda: quantile_sketch.percentile(sketches, 6000, {'From': 'Delhi', 'to': 'Mumbai', 'Class': 'Economy'}))
+    record('predict: contextual insights', lambda: contextual_insights(cube, 'Vistara', 'Economy', 'One', 10))
+    record('predict: configuration table', lambda: config_search.build_configuration_table(counts), 1)
+
+    curves = record('traveler: booking curves build',
+                    lambda: {'table': booking_curves.build_curves(model, encoders, counts, store.max_days_left())}, 1)
+    record('traveler: tips', lambda: traveler_tips(store, curves, 'Delhi', 'Mumbai', 8000))
+    return {'rows': n_rows, 'out_of_core': store.out_of_core, 'stages': results}
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'commit': commit, 'python': platform.python_version(), 'platform': platform.platform(),
+            'cpus': os.cpu_count(), 'timestamp': datetime.datetime.now().isoformat(timespec='seconds')}
+
+
+def compare(baseline, current):
+    """``(scale, stage, baseline_s, current_s, ratio)`` for every stage timed in both reports."""
+    rows = []
+    for scale, result in current['scales'].items():
+        base = baseline['scales'].get(scale)
+        if base is None:
+            continue
+        for stage, timing in result['stages'].items():
+            if stage in base['stages']:
+                before, after = base['stages'][stage]['median_s'], timing['median_s']
+                rows.append((scale, stage, before, after, after / before if before else float('inf')))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the app's data, analytics and prediction paths")
+    parser.add_argument('--bench-dir', default=BENCH_DIR)
+    commands = parser.add_subparsers(dest='command', required=True)
+    generate = commands.add_parser('generate', help="write synthetic datasets and benchmark models")
+    generate.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS)
+    run = commands.add_parser('run', help="time every stage and write a JSON report")
+    run.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS[:1])
+    run.add_argument('--repeat', type=int, default=5)
+    run.add_argument('--json', default='benchmark_results.json')
+    diff = commands.add_parser('compare', help="compare two JSON reports")
+    diff.add_argument('baseline')
+    diff.add_argument('current')
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        for n_rows in args.rows:
+            csv_path, _ = ensure_dataset(n_rows, args.bench_dir)
+            print(f"{n_rows:>12,} rows -> {csv_path}")
+    elif args.command == 'run':
+        report = {'environment': environment(), 'scales': {}}
+        for n_rows in args.rows:
+            result = run_scale(n_rows, args.repeat, args.bench_dir)
+            report['scales'][str(n_rows)] = result
+            print(f"{n_rows:,} rows ({'out of core' if result['out_of_core'] else 'in memory'})")
+            for stage, timing in result['stages'].items():
+                print(f"  {stage:<58} {timing['median_s'] * 1000:10.2f} ms")
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.json}")
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        for scale, stage, before, after, ratio in compare(baseline, current):
+            print(f"{int(scale):>12,} {stage:<58} {before * 1000:10.2f} ms -> {after * 1000:10.2f} ms  x{ratio:.2f}")
+
+
+if __name__ == '__main__':
+    main()
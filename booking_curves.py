@@ -0,0 +1,152 @@
+"""Precomputed booking-window price curves.
+
+For every route x airline x class the table holds the model's predicted
+price at each ``days_left`` from 1 to the largest value seen in the data,
+so booking advice is a lookup instead of a model call. Departure/arrival
+time, stops and duration are fixed to the most common configuration of the
+group (falling back to the airline x class configuration for combinations
+never observed on the route). The table is generated with one batched
+model call per route and stored next to the model together with the model
+version it was computed from:
+
+    python booking_curves.py
+"""
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+
+import aggregates
+import data_store
+import encoders as feature_encoders
+import flight_store
+import prediction
+
+CURVES_FILE = 'booking_curves.pkl'
+CURVE_KEYS = ['From', 'to', 'airline', 'Class']
+PROFILE_COLUMNS = ['departure_time', 'arrival_time', 'stops', 'duration']
+
+
+def curves_path(model_path=prediction.MODEL_FILE):
+    return os.path.join(os.path.dirname(model_path), CURVES_FILE)
+
+
+def model_version(model_path=prediction.MODEL_FILE):
+    """Content hash of the model and encoder artifacts the curves are computed from."""
+    parts = [data_store.file_sha256(model_path)]
+    encoder_file = feature_encoders.encoder_path(model_path)
+    if os.path.exists(encoder_file):
+        parts.append(data_store.file_sha256(encoder_file))
+    return ':'.join(parts)
+
+
+def _profiles(counts, keys):
+    """Most common departure/arrival time and stops per ``keys`` group, with the median duration."""
+    combos = counts.groupby(keys + ['departure_time', 'arrival_time', 'stops'])['flights'].sum().reset_index(name='n')
+    profiles = combos.sort_values('n', kind='stable').drop_duplicates(keys, keep='last').drop(columns='n')
+    return profiles.merge(aggregates.median_duration(counts, keys), on=keys, how='left')
+
+
+def build_curves(model, encoders, counts, max_days_left):
+    """Predict a price curve over days_left for every route x airline x class.
+
+    ``counts`` is the per-duration flight count table from ``aggregates.duration_counts``.
+    """
+    days = np.arange(1, int(max_days_left) + 1)
+    route_profiles = _profiles(counts, CURVE_KEYS)
+    fallback_profiles = _profiles(counts, ['airline', 'Class'])
+
+    cities = feature_encoders.vocabulary(encoders, 'From')
+    grid = pd.MultiIndex.from_product(
+        [cities, feature_encoders.vocabulary(encoders, 'to'),
+         feature_encoders.vocabulary(encoders, 'airline'), feature_encoders.vocabulary(encoders, 'Class')],
+        names=CURVE_KEYS).to_frame(index=False)
+    grid = grid[grid['From'] != grid['to']]
+    groups = grid.merge(route_profiles, on=CURVE_KEYS, how='left')
+    fallback = groups[['airline', 'Class']].merge(fallback_profiles, on=['airline', 'Class'], how='left')
+    groups['observed'] = groups['duration'].notna()
+    for col in PROFILE_COLUMNS:
+        groups[col] = groups[col].fillna(fallback[col])
+    groups = groups.dropna(subset=PROFILE_COLUMNS)
+
+    tables = []
+    for _, route_groups in groups.groupby(['From', 'to'], sort=True):
+        rows = route_groups.loc[route_groups.index.repeat(len(days))].reset_index(drop=True)
+        rows['days_left'] = np.tile(days, len(route_groups))
+        features, errors = prediction.encode_batch(encoders, rows)
+        valid = (errors == '').to_numpy()
+        tables.append(rows[valid].assign(predicted_price=model.predict(features[valid])))
+    return pd.concat(tables, ignore_index=True) if tables else pd.DataFrame()
+
+
+def load_curves(path=CURVES_FILE):
+    return joblib.load(path) if os.path.exists(path) else None
+
+
+def save_curves(curves, path=CURVES_FILE):
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    joblib.dump(curves, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_or_build_curves(model, encoders, store, model_path=prediction.MODEL_FILE):
+    """Load the saved curves, regenerating them only if the model version changed.
+
+    ``store`` is the FlightStore to read the flight profiles from; it is only used when regenerating.
+    """
+    version = model_version(model_path)
+    path = curves_path(model_path)
+    curves = load_curves(path)
+    if curves is None or curves['model_version'] != version:
+        curves = {'model_version': version, 'table': build_curves(model, encoders, store.duration_counts(), store.max_days_left())}
+        save_curves(curves, path)
+    return curves
+
+
+def route_curves(curves, From, to, airline=None, Class=None):
+    table = curves['table']
+    mask = (table['From'] == From) & (table['to'] == to)
+    if airline is not None:
+        mask &= table['airline'] == airline
+    if Class is not None:
+        mask &= table['Class'] == Class
+    return table[mask]
+
+
+def booking_advice(curves, From, to, airline, Class, days_left):
+    """Cheapest day to book among the days still available (1..days_left) for one itinerary.
+
+    Returns ``{'best_days_left', 'best_price', 'current_price', 'savings'}`` or None
+    when the table has no curve for the itinerary.
+    """
+    curve = route_curves(curves, From, to, airline, Class)
+    if curve.empty:
+        return None
+    days_left = min(int(days_left), int(curve['days_left'].max()))
+    current = curve[curve['days_left'] == days_left]
+    available = curve[curve['days_left'] <= days_left]
+    best = available.loc[available['predicted_price'].idxmin()]
+    current_price = float(current['predicted_price'].iloc[0])
+    return {
+        'best_days_left': int(best['days_left']),
+        'best_price': float(best['predicted_price']),
+        'current_price': current_price,
+        'savings': current_price - float(best['predicted_price']),
+    }
+
+
+def cheapest_options(curves, From, to, budget=None, top_k=3):
+    """Cheapest (airline, Class, days_left) points on a route's curves, optionally under a budget."""
+    curve = route_curves(curves, From, to)
+    if budget is not None:
+        curve = curve[curve['predicted_price'] <= budget]
+    best_per_group = curve.sort_values('predicted_price').drop_duplicates(['airline', 'Class'])
+    return best_per_group.head(top_k)
+
+
+if __name__ == '__main__':
+    model = prediction.load_model_file()
+    encoders = feature_encoders.load_encoders(feature_encoders.encoder_path(prediction.MODEL_FILE))
+    curves = load_or_build_curves(model, encoders, flight_store.FlightStore())
+    print(f"{len(curves['table'])} curve points for model version {curves['model_version'][:12]} in {curves_path()}")
@@ -0,0 +1,191 @@
+"""Flat NumPy evaluator for the scikit-learn tree ensemble in FPP_model.pkl.
+
+``export_model`` flattens every tree of a DecisionTree / RandomForest /
+ExtraTrees / GradientBoosting regressor into shared node arrays (feature,
+threshold, left/right child, leaf value) plus one root per tree and saves
+them as one ``.npy`` per array in a directory next to the model, so
+``CompiledTreeModel.load(path, mmap_mode='r')`` maps them read-only and
+every process serving the same model shares one copy. ``CompiledTreeModel``
+walks all trees for all rows at once, one tree level per NumPy step,
+without sklearn's validation and per-estimator dispatch, so single-row
+predictions cost a few dozen small array operations.
+
+    python compiled_model.py            # export FPP_model.pkl -> FPP_model_compiled/
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+
+import data_store
+
+COMPILED_SUFFIX = '_compiled'
+COMPILED_FORMAT_VERSION = 2
+ARRAYS = ['feature', 'threshold', 'left', 'right', 'value', 'roots']
+META_FILE = 'meta.json'
+CHECK_ROWS = 2000
+RTOL = 1e-9
+ATOL = 1e-6
+
+
+def compiled_path(model_path):
+    return os.path.splitext(model_path)[0] + COMPILED_SUFFIX
+
+
+class CompiledTreeModel:
+    """Array-backed drop-in for ``model.predict`` on tree ensembles."""
+
+    def __init__(self, feature, threshold, left, right, value, roots, scale, offset, source_sha256=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.scale = float(scale)
+        self.offset = float(offset)
+        self.source_sha256 = source_sha256
+
+    def predict(self, X):
+        # sklearn compares float32 features against float64 thresholds
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        n_rows = X.shape[0]
+        rows = np.arange(n_rows)[:, None]
+        nodes = np.broadcast_to(self.roots, (n_rows, len(self.roots))).copy()
+        while True:
+            next_nodes = np.where(X[rows, self.feature[nodes]] <= self.threshold[nodes],
+                                  self.left[nodes], self.right[nodes])
+            if np.array_equal(next_nodes, nodes):
+                break
+            nodes = next_nodes
+        return self.offset + self.scale * self.value[nodes].sum(axis=1)
+
+    def save(self, path):
+        tmp_dir = f"{path}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for name in ARRAYS:
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(tmp_dir, META_FILE), 'w') as f:
+            json.dump({'format': COMPILED_FORMAT_VERSION, 'scale': self.scale, 'offset': self.offset,
+                       'source_sha256': self.source_sha256}, f)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_dir, path)
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        if meta.get('format') != COMPILED_FORMAT_VERSION:
+            raise ValueError(f"Unsupported compiled model format in {path}")
+        arrays = [np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in ARRAYS]
+        return cls(*arrays, meta['scale'], meta['offset'], meta['source_sha256'])
+
+
+def _estimator_trees(model):
+    """Fitted ``tree_`` objects plus the (scale, offset) combining their leaf values."""
+    from sklearn.ensemble import (ExtraTreesRegressor, GradientBoostingRegressor,
+                                  RandomForestRegressor)
+    from sklearn.tree import DecisionTreeRegressor, ExtraTreeRegressor
+
+    if isinstance(model, (DecisionTreeRegressor, ExtraTreeRegressor)):
+        return [model.tree_], 1.0, 0.0
+    if isinstance(model, (RandomForestRegressor, ExtraTreesRegressor)):
+        return [est.tree_ for est in model.estimators_], 1.0 / len(model.estimators_), 0.0
+    if isinstance(model, GradientBoostingRegressor):
+        if model.init_ == 'zero':
+            offset = 0.0
+        elif hasattr(model.init_, 'constant_'):
+            offset = float(np.ravel(model.init_.constant_)[0])
+        else:
+            raise TypeError("GradientBoostingRegressor with a non-constant init estimator cannot be compiled")
+        return [est.tree_ for est in model.estimators_[:, 0]], model.learning_rate, offset
+    raise TypeError(f"Cannot compile model of type {type(model).__name__}")
+
+
+def compile_model(model, source_sha256=None):
+    trees, scale, offset = _estimator_trees(model)
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    base = 0
+    for tree in trees:
+        node_ids = np.arange(tree.node_count, dtype=np.int64)
+        is_leaf = tree.children_left == -1
+        # Leaves point at themselves so the level-by-level walk settles on them.
+        features.append(np.where(is_leaf, 0, tree.feature).astype(np.int64))
+        thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+        lefts.append(np.where(is_leaf, node_ids, tree.children_left) + base)
+        rights.append(np.where(is_leaf, node_ids, tree.children_right) + base)
+        values.append(tree.value.reshape(tree.node_count, -1)[:, 0])
+        roots.append(base)
+        base += tree.node_count
+    return CompiledTreeModel(np.concatenate(features), np.concatenate(thresholds), np.concatenate(lefts),
+                             np.concatenate(rights), np.concatenate(values), np.array(roots, dtype=np.int64),
+                             scale, offset, source_sha256)
+
+
+def check_rows(compiled, n_features, n_rows=CHECK_ROWS, seed=0):
+    """Random feature rows spanning every split threshold of the ensemble."""
+    rng = np.random.default_rng(seed)
+    X = np.empty((n_rows, n_features))
+    for f in range(n_features):
+        splits = compiled.threshold[(compiled.feature == f) & (compiled.left != np.arange(len(compiled.left)))]
+        low, high = (splits.min() - 1.0, splits.max() + 1.0) if len(splits) else (0.0, 1.0)
+        X[:, f] = rng.uniform(low, high, n_rows)
+    return X
+
+
+def export_model(model_path, out_path=None, X_check=None):
+    """Compile the pickled model, verify it against sklearn and save it; returns the compiled model."""
+    import prediction
+
+    model = prediction.load_model_file(model_path)
+    compiled = compile_model(model, data_store.file_sha256(model_path))
+    if X_check is None:
+        X_check = check_rows(compiled, model.n_features_in_)
+    expected = model.predict(X_check)
+    actual = compiled.predict(X_check)
+    if not np.allclose(actual, expected, rtol=RTOL, atol=ATOL):
+        worst = float(np.max(np.abs(actual - expected)))
+        raise ValueError(f"Compiled model disagrees with {model_path} (max abs error {worst})")
+    compiled.save(out_path or compiled_path(model_path))
+    return compiled
+
+
+def load_or_export(model_path):
+    """Load the compiled model for ``model_path``, re-exporting it if missing or stale."""
+    path = compiled_path(model_path)
+    source_sha256 = data_store.file_sha256(model_path)
+    if os.path.isdir(path):
+        try:
+            compiled = CompiledTreeModel.load(path, mmap_mode='r')
+        except (OSError, ValueError):
+            compiled = None
+        if compiled is not None and compiled.source_sha256 == source_sha256:
+            return compiled
+    export_model(model_path, path)
+    return CompiledTreeModel.load(path, mmap_mode='r')
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    import prediction
+
+    parser = argparse.ArgumentParser(description="Export FPP_model.pkl to a flat NumPy evaluator")
+    parser.add_argument('--model', default=prediction.MODEL_FILE)
+    args = parser.parse_args()
+
+    compiled = export_model(args.model)
+    model = prediction.load_model_file(args.model)
+    row = check_rows(compiled, model.n_features_in_, n_rows=1)
+    for name, predictor in [('sklearn', model), ('compiled', compiled)]:
+        timings = []
+        for _ in range(200):
+            start = time.perf_counter()
+            predictor.predict(row)
+            timings.append(time.perf_counter() - start)
+        print(f"{name:>8}: single-row p50 {np.percentile(timings, 50) * 1e3:.3f} ms, "
+              f"p99 {np.percentile(timings, 99) * 1e3:.3f} ms")
+    print(f"Saved {len(compiled.roots)} trees / {len(compiled.feature)} nodes to {compiled_path(args.model)}")
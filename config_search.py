@@ -0,0 +1,49 @@
+"""Cheapest-configuration search for a route and travel date.
+
+The candidate grid for a route is every airline x departure_time x
+arrival_time x stops x Class combination that actually occurs on that route
+in the data; combinations never flown are pruned up front. Each candidate
+carries the median observed duration of its flights, and the whole grid is
+scored with a single batched model call.
+"""
+import datetime
+
+import numpy as np
+
+import aggregates
+import prediction
+
+SEARCH_COLUMNS = ['airline', 'departure_time', 'arrival_time', 'stops', 'Class']
+
+
+def build_configuration_table(counts):
+    """Observed configurations per route with their flight count and median duration in minutes.
+
+    ``counts`` is the per-duration flight count table from ``aggregates.duration_counts``.
+    """
+    keys = ['From', 'to'] + SEARCH_COLUMNS
+    table = (counts.groupby(keys)['flights'].sum().reset_index()
+                   .merge(aggregates.median_duration(counts, keys), on=keys, how='left'))
+    return table.dropna(subset=['duration']).reset_index(drop=True)
+
+
+def route_configurations(table, From, to, Class=None):
+    configurations = table[(table['From'] == From) & (table['to'] == to)]
+    if Class is not None:
+        configurations = configurations[configurations['Class'] == Class]
+    return configurations
+
+
+def days_until(travel_date, today=None):
+    return (travel_date - (today or datetime.date.today())).days
+
+
+def cheapest_configurations(model, encoders, table, From, to, days_left, top_k=5, Class=None):
+    """Score every observed configuration of the route for ``days_left`` and return the ``top_k`` cheapest."""
+    candidates = route_configurations(table, From, to, Class).assign(days_left=days_left)
+    if candidates.empty:
+        return candidates.assign(predicted_price=np.array([], dtype=np.float64))
+    features, errors = prediction.encode_batch(encoders, candidates)
+    valid = (errors == '').to_numpy()
+    scored = candidates[valid].assign(predicted_price=prediction.predict_matrix(model, features[valid]))
+    return scored.nsmallest(top_k, 'predicted_price').reset_index(drop=True)
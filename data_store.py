@@ -0,0 +1,333 @@
+"""Columnar on-disk cache for the cleaned flight data.
+
+The CSV is parsed once and written to CACHE_DIR as one ``.npy`` file per
+column. String columns are stored as integer category codes plus their
+vocabulary, so a cold process only has to read a few binary arrays and the
+frame comes back with ``category`` dtypes. The cache is rebuilt whenever
+the source CSV's mtime/size changes and its content hash no longer matches.
+A cache belongs to the CSV path it was built from: ``ensure_cache`` refuses
+to rebuild it from another file, so a different dataset (e.g. one used for
+training) needs its own cache directory.
+
+The CSV is streamed in CHUNK_ROWS pieces, so building the cache never
+holds more than one chunk in memory: every chunk is written as its own
+segment under ``chunks/`` and the segments are then copied, column by
+column, into one full-length array per column. Readers can load a subset
+of columns or rows and memory-map the arrays instead of reading them, so
+every process that maps the cache read-only shares the same pages of the
+OS page cache. Set FPP_CACHE_DIR to put the cache somewhere all workers
+of a node can reach (e.g. /dev/shm); a build lock next to the directory
+makes sure only one of them builds it while the others wait.
+
+Columns are stored compactly: category codes use the smallest integer type
+for their vocabulary, whole-number columns (``days_left``) are downcast to
+the smallest integer type that holds them and ``price`` is float32. The
+arrays of a loaded segment are read-only and shared by the frame instead
+of being copied into it.
+
+New fare observations can be appended without touching the CSV or the base
+arrays: ``append_delta`` writes each batch as its own segment under
+``deltas/`` and only ever appends to the category vocabularies, so codes
+already on disk stay valid. Appends take the same build lock as a
+rebuild, so a batch never lands in a directory that is being replaced. A
+rebuild from a changed CSV starts over without deltas: ingested batches
+that should survive it must be added to the CSV first.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+CSV_PATH = 'cleaned_flight_data.csv'
+CACHE_DIR = os.environ.get('FPP_CACHE_DIR', '.flight_cache')
+CACHE_FORMAT_VERSION = 6
+META_FILE = 'meta.json'
+CHUNK_DIR = 'chunks'
+DELTA_DIR = 'deltas'
+CHUNK_ROWS = 1_000_000
+BUILD_LOCK_SUFFIX = '.build.lock'
+
+REQUIRED_COLUMNS = ['airline', 'From', 'to', 'departure_time', 'arrival_time',
+                    'stops', 'Class', 'price', 'days_left', 'time_taken']
+
+CATEGORICAL_COLUMNS = ['airline', 'From', 'to', 'departure_time', 'arrival_time', 'stops', 'Class']
+FLOAT32_COLUMNS = ['price']
+
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_meta(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, META_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(cache_dir, meta):
+    tmp_path = os.path.join(cache_dir, META_FILE + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, os.path.join(cache_dir, META_FILE))
+
+
+def _source_stat(csv_path):
+    stat = os.stat(csv_path)
+    return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+
+def fresh_meta(csv_path=CSV_PATH, cache_dir=CACHE_DIR, update_source=True):
+    """The cache metadata if the cache was built from this CSV and still matches it, else None.
+
+    With ``update_source`` the stored mtime is refreshed when only that
+    changed, so the next check does not hash the file again.
+    """
+    meta = _read_meta(cache_dir)
+    if meta is None or meta.get('format') != CACHE_FORMAT_VERSION:
+        return None
+    if meta['source']['path'] != os.path.abspath(csv_path):
+        return None
+    source = _source_stat(csv_path)
+    if meta['source']['mtime_ns'] == source['mtime_ns'] and meta['source']['size'] == source['size']:
+        return meta
+    # The file was touched or copied: only rebuild if the content really changed.
+    if meta['source']['size'] != source['size'] or meta['source']['sha256'] != file_sha256(csv_path):
+        return None
+    if update_source:
+        meta['source'].update(source)
+        _write_meta(cache_dir, meta)
+    return meta
+
+
+def cache_is_fresh(csv_path=CSV_PATH, cache_dir=CACHE_DIR):
+    """Return True if the cache matches the CSV, refreshing the stored mtime when only that changed."""
+    return fresh_meta(csv_path, cache_dir) is not None
+
+
+def compact_numeric(name, values):
+    """Column values in their stored dtype: float32 for FLOAT32_COLUMNS, the smallest integer type for whole numbers."""
+    values = pd.to_numeric(values, errors='coerce')
+    if name in FLOAT32_COLUMNS:
+        return values.to_numpy(dtype=np.float32)
+    if pd.api.types.is_integer_dtype(values):
+        return pd.to_numeric(values, downcast='integer').to_numpy()
+    return values.to_numpy()
+
+
+def _write_segment(df, columns, segment_dir):
+    """Write ``df`` as one .npy per cached column.
+
+    Values missing from a category vocabulary in ``columns`` are appended
+    to it (sorted within the batch), so codes already written stay valid.
+    """
+    os.makedirs(segment_dir, exist_ok=True)
+    for col in columns:
+        path = os.path.join(segment_dir, f"{col['name']}.npy")
+        values = df[col['name']] if col['name'] in df.columns else pd.Series(np.nan, index=df.index)
+        if col['kind'] == 'category':
+            col['categories'] += pd.Index(values.dropna().unique()).difference(col['categories']).sort_values().tolist()
+            np.save(path, pd.Categorical(values, categories=col['categories']).codes)
+        else:
+            np.save(path, compact_numeric(col['name'], values))
+
+
+def _consolidate(tmp_dir, columns, chunks):
+    """Copy the chunk segments into one full-length .npy per column, then drop them."""
+    segments = [os.path.join(tmp_dir, CHUNK_DIR, chunk['name']) for chunk in chunks]
+    total = sum(chunk['rows'] for chunk in chunks)
+    for col in columns:
+        parts = [np.load(os.path.join(segment, f"{col['name']}.npy"), mmap_mode='r') for segment in segments]
+        dtype = np.result_type(*parts)
+        out = np.lib.format.open_memmap(os.path.join(tmp_dir, f"{col['name']}.npy"), mode='w+', dtype=dtype,
+                                        shape=(total,))
+        start = 0
+        for part in parts:
+            out[start:start + len(part)] = part
+            start += len(part)
+        out.flush()
+        del out, parts
+    shutil.rmtree(os.path.join(tmp_dir, CHUNK_DIR))
+
+
+def build_cache(csv_path=CSV_PATH, cache_dir=CACHE_DIR, chunk_rows=CHUNK_ROWS):
+    """Stream the CSV into one .npy array per column; returns the cache metadata."""
+    source = _source_stat(csv_path)
+    source['sha256'] = file_sha256(csv_path)
+    source['path'] = os.path.abspath(csv_path)
+
+    tmp_dir = f"{cache_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    columns, chunks = None, []
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_rows):
+        if columns is None:
+            columns = [{'name': col, 'kind': 'category', 'categories': []}
+                       if col in CATEGORICAL_COLUMNS or chunk[col].dtype == object else {'name': col, 'kind': 'numeric'}
+                       for col in chunk.columns]
+        name = f"{len(chunks):06d}"
+        _write_segment(chunk, columns, os.path.join(tmp_dir, CHUNK_DIR, name))
+        chunks.append({'name': name, 'rows': len(chunk)})
+    if columns is None:
+        raise ValueError(f"{csv_path} has no columns")
+    _consolidate(tmp_dir, columns, chunks)
+    meta = {'format': CACHE_FORMAT_VERSION, 'source': source, 'rows': sum(chunk['rows'] for chunk in chunks),
+            'columns': columns, 'deltas': []}
+    _write_meta(tmp_dir, meta)
+
+    # Processes still mapping the old arrays keep reading them until they refresh.
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.replace(tmp_dir, cache_dir)
+    return meta
+
+
+@contextmanager
+def build_lock(cache_dir=CACHE_DIR):
+    """Hold the cross-process lock that serialises building the cache and its derived files."""
+    os.makedirs(os.path.dirname(os.path.abspath(cache_dir)), exist_ok=True)
+    with open(cache_dir.rstrip(os.sep) + BUILD_LOCK_SUFFIX, 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def read_meta(cache_dir=CACHE_DIR):
+    return _read_meta(cache_dir)
+
+
+def column_names(meta):
+    return [col['name'] for col in meta['columns']]
+
+
+def vocabularies(meta):
+    """Category vocabulary of every categorical column."""
+    return {col['name']: col['categories'] for col in meta['columns'] if col['kind'] == 'category'}
+
+
+def delta_segment_dir(delta):
+    return os.path.join(DELTA_DIR, delta['name'])
+
+
+def segment_dirs(meta):
+    """Directories (relative to the cache) of the base arrays and the deltas, in row order."""
+    return [''] + [delta_segment_dir(delta) for delta in meta['deltas']]
+
+
+def segment_slices(meta, chunk_rows=CHUNK_ROWS):
+    """``(segment_dir, slice)`` pieces of at most ``chunk_rows`` rows covering the cache in row order."""
+    base_rows = meta['rows'] - sum(delta['rows'] for delta in meta['deltas'])
+    for segment_dir, rows in zip(segment_dirs(meta), [base_rows] + [delta['rows'] for delta in meta['deltas']]):
+        for start in range(0, rows, chunk_rows):
+            yield segment_dir, slice(start, min(start + chunk_rows, rows))
+
+
+def read_segment(cache_dir, meta, segment_dir='', columns=None, rows=None, mmap_mode=None):
+    """One segment as a frame using ``meta``'s vocabularies.
+
+    ``columns`` and ``rows`` restrict what is materialised; with
+    ``mmap_mode='r'`` only the selected values are read from disk.
+    """
+    data = {}
+    for col in meta['columns']:
+        if columns is not None and col['name'] not in columns:
+            continue
+        values = np.load(os.path.join(cache_dir, segment_dir, f"{col['name']}.npy"), mmap_mode=mmap_mode)
+        if rows is not None:
+            values = values[rows]
+        values.flags.writeable = False
+        if col['kind'] == 'category':
+            values = pd.Categorical.from_codes(values, categories=col['categories'])
+        data[col['name']] = values
+    return pd.DataFrame(data, copy=False)
+
+
+def read_cache(cache_dir=CACHE_DIR, meta=None, mmap_mode=None):
+    """All segments (base data, appended deltas) as one frame.
+
+    With ``mmap_mode='r'`` and no deltas the frame is backed directly by the
+    memory-mapped arrays; deltas are concatenated into a private copy.
+    """
+    meta = meta or _read_meta(cache_dir)
+    frames = [read_segment(cache_dir, meta, segment_dir, mmap_mode=mmap_mode) for segment_dir in segment_dirs(meta)]
+    return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+
+def validate_fares(df):
+    """Problems that keep a batch of fare rows from being stored (empty list if none)."""
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing_columns:
+        return [f"Missing columns: {missing_columns}"]
+    problems = []
+    for col in REQUIRED_COLUMNS:
+        if df[col].isna().any():
+            problems.append(f"{col} has {int(df[col].isna().sum())} missing values")
+    for col in ['price', 'days_left']:
+        if pd.to_numeric(df[col], errors='coerce').isna().any():
+            problems.append(f"{col} must be numeric")
+    return problems
+
+
+def append_delta(df, cache_dir=CACHE_DIR):
+    """Store a validated batch of fare rows as a new delta segment; returns the updated metadata."""
+    problems = validate_fares(df)
+    if problems:
+        raise ValueError("; ".join(problems))
+    with build_lock(cache_dir):
+        meta = _read_meta(cache_dir)
+        if meta is None:
+            raise FileNotFoundError(f"No data cache in {cache_dir}")
+        name = f"{len(meta['deltas']):06d}"
+        segment_dir = os.path.join(cache_dir, DELTA_DIR, name)
+        tmp_dir = f"{segment_dir}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        _write_segment(df, meta['columns'], tmp_dir)
+        os.replace(tmp_dir, segment_dir)
+        meta['deltas'].append({'name': name, 'rows': len(df)})
+        meta['rows'] += len(df)
+        _write_meta(cache_dir, meta)
+        return meta
+
+
+def ensure_cache(csv_path=CSV_PATH, cache_dir=CACHE_DIR):
+    """Make sure the cache matches the CSV, rebuilding it if needed; returns the cache metadata."""
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(csv_path)
+    # The metadata returned is the one that was checked, never a second read a rebuild may have replaced.
+    meta = fresh_meta(csv_path, cache_dir)
+    if meta is not None:
+        return meta
+    with build_lock(cache_dir):
+        # Another worker may have built it while we waited for the lock.
+        meta = fresh_meta(csv_path, cache_dir)
+        if meta is not None:
+            return meta
+        # Never rebuild (and so drop) a cache another dataset's processes are serving from.
+        existing = _read_meta(cache_dir)
+        owner = existing['source']['path'] if existing and existing.get('format') == CACHE_FORMAT_VERSION else None
+        if owner is not None and owner != os.path.abspath(csv_path):
+            raise ValueError(f"{cache_dir} caches {owner}, not {os.path.abspath(csv_path)}; "
+                             f"use a separate cache directory (or delete {cache_dir} if the CSV has moved)")
+        return build_cache(csv_path, cache_dir)
+
+
+def dataset_version(meta):
+    """Content hash of the CSV the cache was built from, plus the number of appended deltas."""
+    if meta['deltas']:
+        return f"{meta['source']['sha256']}+{len(meta['deltas'])}"
+    return meta['source']['sha256']
+
+
+if __name__ == '__main__':
+    meta = build_cache()
+    print(f"Cached {meta['rows']} rows from {CSV_PATH} into {CACHE_DIR}/")
@@ -0,0 +1,119 @@
+"""Versioned feature-encoder artifact shared by training and serving.
+
+The artifact stores, for every categorical model feature, the exact
+value -> code mapping used when the model was trained (label-encoded
+columns use LabelEncoder's sorted order). Serving encodes with plain dict
+lookups instead of refitting encoders over the whole dataset.
+"""
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+
+ENCODER_FILE = 'FPP_encoders.pkl'
+ENCODER_FORMAT_VERSION = 1
+
+# Column order expected by FPP_model.pkl
+FEATURE_ORDER = ['duration', 'days_left', 'airline', 'departure_time', 'From',
+                 'arrival_time', 'to', 'Class', 'stops']
+LABEL_ENCODED_COLUMNS = ['airline', 'From', 'to', 'departure_time', 'arrival_time']
+STOPS_MAPPING = {'Zero': 0, 'One': 1, 'Two or more': 2}
+CLASS_MAPPING = {'Economy': 0, 'Business': 1}
+
+
+def duration_minutes(time_taken):
+    """Convert the dataset's ``time_taken`` column to the model's duration in minutes.
+
+    Accepts ``"02h 10m"`` style strings as well as numeric hours.
+    """
+    series = pd.Series(time_taken)
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(np.float64) * 60.0
+    parts = series.astype(str).str.extract(r'(?:(\d+(?:\.\d+)?)\s*h)?\s*(?:(\d+)\s*m)?')
+    hours = pd.to_numeric(parts[0], errors='coerce')
+    minutes = pd.to_numeric(parts[1], errors='coerce')
+    numeric = pd.to_numeric(series, errors='coerce') * 60.0
+    return (hours.fillna(0) * 60.0 + minutes.fillna(0)).where(hours.notna() | minutes.notna(), numeric)
+
+
+def encoder_path(model_path='FPP_model.pkl'):
+    """The encoder artifact lives next to the model file."""
+    return os.path.join(os.path.dirname(model_path), ENCODER_FILE)
+
+
+def fit_encoders(df):
+    """Fit the label mappings from the flight frame, or from a ``column: values`` mapping such as the cached vocabularies."""
+    mappings = {}
+    for col in LABEL_ENCODED_COLUMNS:
+        values = sorted(pd.Series(df[col]).dropna().astype(str).unique())
+        mappings[col] = {value: code for code, value in enumerate(values)}
+    mappings['stops'] = dict(STOPS_MAPPING)
+    mappings['Class'] = dict(CLASS_MAPPING)
+    return {'format': ENCODER_FORMAT_VERSION, 'feature_order': list(FEATURE_ORDER), 'mappings': mappings}
+
+
+def save_encoders(encoders, path=ENCODER_FILE):
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    joblib.dump(encoders, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_encoders(path=ENCODER_FILE):
+    encoders = joblib.load(path)
+    if encoders.get('format') != ENCODER_FORMAT_VERSION:
+        raise ValueError(f"Unsupported encoder artifact format {encoders.get('format')!r} in {path}")
+    return encoders
+
+
+def load_or_fit_encoders(df, path=ENCODER_FILE):
+    """Load the saved artifact, or fit one from ``df`` and save it if none exists yet."""
+    if os.path.exists(path):
+        return load_encoders(path)
+    encoders = fit_encoders(df)
+    save_encoders(encoders, path)
+    return encoders
+
+
+def vocabulary(encoders, column):
+    """Values of ``column`` in code order."""
+    mapping = encoders['mappings'][column]
+    return sorted(mapping, key=mapping.get)
+
+
+def encode_value(encoders, column, value):
+    try:
+        return encoders['mappings'][column][value]
+    except KeyError:
+        raise ValueError(f"Unknown {column} value: {value!r}") from None
+
+
+def encode_column(encoders, column, values):
+    """Vectorized encoding of a column; values missing from the vocabulary become -1."""
+    mapping = encoders['mappings'][column]
+    cat = pd.Categorical(values)
+    lookup = np.array([mapping.get(str(c), -1) for c in cat.categories] + [-1], dtype=np.int64)
+    return lookup[cat.codes]
+
+
+def encode_features(encoders, duration, days_left, airline, departure_time, From,
+                    arrival_time, to, Class, stops):
+    """Encode one itinerary into a (1, 9) array in FEATURE_ORDER."""
+    return np.array([[
+        duration, days_left,
+        encode_value(encoders, 'airline', airline),
+        encode_value(encoders, 'departure_time', departure_time),
+        encode_value(encoders, 'From', From),
+        encode_value(encoders, 'arrival_time', arrival_time),
+        encode_value(encoders, 'to', to),
+        encode_value(encoders, 'Class', Class),
+        encode_value(encoders, 'stops', stops),
+    ]])
+
+
+if __name__ == '__main__':
+    import data_store
+
+    encoders = fit_encoders(data_store.vocabularies(data_store.ensure_cache()))
+    save_encoders(encoders, encoder_path('FPP_model.pkl'))
+    print(f"Saved feature encoders to {encoder_path('FPP_model.pkl')}")
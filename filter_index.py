@@ -0,0 +1,93 @@
+"""Inverted index from column values to row positions.
+
+For each indexed column the row positions are stored grouped by value
+(CSR layout: one ``positions`` array plus per-value ``offsets``), each
+group in ascending order. A filter combination resolves by intersecting
+the position lists of the selected values, smallest first, and the frame
+is then read with a single ``take`` instead of copy-and-mask scans.
+
+Rows appended later (``extend_index``) are kept as per-value lists of
+position arrays next to the CSR block, so an append costs time
+proportional to the new rows only.
+"""
+import numpy as np
+import pandas as pd
+
+
+def position_dtype(n_rows):
+    """int32 row positions unless the frame is too long for them."""
+    return np.int32 if n_rows < np.iinfo(np.int32).max else np.int64
+
+
+def build_column_index(values):
+    cat = pd.Categorical(values)
+    codes = cat.codes.astype(np.int64)
+    positions = np.argsort(codes, kind='stable').astype(position_dtype(len(codes)))
+    counts = np.bincount(codes + 1, minlength=len(cat.categories) + 1)
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    # offsets[0:2] bracket the rows with missing values (code -1); value i starts at offsets[i + 1].
+    return {
+        'lookup': {value: code for code, value in enumerate(cat.categories)},
+        'positions': positions,
+        'offsets': offsets,
+        'appended': {},
+    }
+
+
+def build_index(df, columns):
+    return {'n_rows': len(df), 'columns': {col: build_column_index(df[col]) for col in columns}}
+
+
+def rows_for(index, column, value):
+    """Ascending row positions where ``column == value``."""
+    col_index = index['columns'][column]
+    code = col_index['lookup'].get(value)
+    if code is None:
+        return np.empty(0, dtype=np.int64)
+    offsets = col_index['offsets']
+    base = col_index['positions'][offsets[code + 1]:offsets[code + 2]] if code + 2 < len(offsets) else None
+    appended = col_index['appended'].get(code)
+    if not appended:
+        return base if base is not None else np.empty(0, dtype=np.int64)
+    return np.concatenate(([base] if base is not None else []) + appended)
+
+
+def extend_index(index, new_rows):
+    """A copy of ``index`` that also covers ``new_rows`` as the positions after the rows already indexed.
+
+    The CSR arrays are shared with ``index``, which is left unchanged so
+    readers holding it keep a consistent view.
+    """
+    start = index['n_rows']
+    columns = {}
+    for col, col_index in index['columns'].items():
+        lookup = dict(col_index['lookup'])
+        appended = {code: list(groups) for code, groups in col_index['appended'].items()}
+        cat = pd.Categorical(new_rows[col])
+        codes = cat.codes.astype(np.int64)
+        order = np.argsort(codes, kind='stable')
+        for group in np.split(order, np.flatnonzero(np.diff(codes[order])) + 1):
+            if len(group) == 0 or codes[group[0]] < 0:
+                continue
+            code = lookup.setdefault(cat.categories[codes[group[0]]], len(lookup))
+            appended.setdefault(code, []).append((group + start).astype(position_dtype(start + len(new_rows))))
+        columns[col] = dict(col_index, lookup=lookup, appended=appended)
+    return {'n_rows': start + len(new_rows), 'columns': columns}
+
+
+def select_rows(index, filters=None):
+    """Row positions matching every ``column: value`` in ``filters``, or None when unfiltered."""
+    if not filters:
+        return None
+    row_lists = sorted((rows_for(index, col, value) for col, value in filters.items()), key=len)
+    rows = row_lists[0]
+    for other in row_lists[1:]:
+        if len(rows) == 0:
+            break
+        rows = np.intersect1d(rows, other, assume_unique=True)
+    return rows
+
+
+def take(df, rows):
+    """The frame restricted to ``rows`` (as returned by select_rows)."""
+    return df if rows is None else df.take(rows)
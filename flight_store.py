@@ -0,0 +1,301 @@
+"""Process-wide flight data that follows newly ingested fares.
+
+A FlightStore owns the structures derived from the columnar cache: the
+price cube, the per-duration flight counts, the price quantile sketches
+and, for lookups of individual
+flights, the frame with its row index. Each is built on first use.
+``refresh`` compares the cache metadata with what is loaded: a changed
+CSV drops everything, while new delta segments are read on their own and
+folded into whatever is already resident (frame appended, cube, counts
+and sketches merged, index extended), so the cost of an ingest is proportional to the
+rows it added.
+
+Datasets above MAX_RESIDENT_ROWS (or with FPP_OUT_OF_CORE=1) are served
+out of core: the cube, counts and sketches are built segment by segment from
+memory-mapped arrays, only those compact structures stay in memory, and
+flight lookups scan the segments' filter columns and read just the
+matching rows.
+
+Several processes (Streamlit workers, serve.py instances) can share one
+cache: the resident frame is backed by the memory-mapped column arrays, and
+the cube, counts, sketches and row index are saved next to them and loaded
+memory-mapped too, so they are built once under the cache's build lock
+and every further process maps the same pages instead of rebuilding and
+holding a private copy.
+
+A read-only store (``read_only=True``, used by the startup profiler) loads
+the same cache and saved structures but never builds the cache, takes the
+build lock or saves anything; structures missing on disk are built in
+memory only.
+"""
+import os
+import threading
+
+import joblib
+import numpy as np
+import pandas as pd
+
+import aggregates
+import data_store
+import filter_index
+import quantile_sketch
+
+INDEX_COLUMNS = ['From', 'to', 'airline', 'departure_time', 'stops', 'Class']
+MAX_RESIDENT_ROWS = int(os.environ.get('FPP_MAX_RESIDENT_ROWS', 5_000_000))
+COUNTS_FILE = 'duration_counts.pkl'
+INDEX_FILE = 'row_index.pkl'
+SKETCHES_FILE = 'price_sketches.pkl'
+
+
+class FlightStore:
+    def __init__(self, csv_path=data_store.CSV_PATH, cache_dir=data_store.CACHE_DIR, index_columns=INDEX_COLUMNS,
+                 out_of_core=None, read_only=False):
+        self.csv_path = csv_path
+        self.cache_dir = cache_dir
+        self.index_columns = index_columns
+        if out_of_core is None and os.environ.get('FPP_OUT_OF_CORE'):
+            out_of_core = os.environ['FPP_OUT_OF_CORE'] == '1'
+        self._out_of_core = out_of_core
+        self.read_only = read_only
+        self._lock = threading.RLock()
+        self._meta = None
+        self._frame = None
+        self._cube = None
+        self._counts = None
+        self._sketches = None
+        self._index = None
+
+    @property
+    def version(self):
+        with self._lock:
+            return data_store.dataset_version(self._meta) if self._meta else None
+
+    @property
+    def out_of_core(self):
+        """True when the data is only read segment by segment instead of being held in memory."""
+        with self._lock:
+            self._ensure_meta()
+            if self._out_of_core is not None:
+                return self._out_of_core
+            return self._meta['rows'] > MAX_RESIDENT_ROWS
+
+    def refresh(self):
+        """Bring the store up to date with the cache on disk; returns the dataset version."""
+        with self._lock:
+            meta = self._current_meta()
+            if self._meta is None or meta['source']['sha256'] != self._meta['source']['sha256']:
+                self._meta, self._frame, self._cube, self._counts, self._sketches, self._index = meta, None, None, None, None, None
+            else:
+                new_deltas = meta['deltas'][len(self._meta['deltas']):]
+                for delta in new_deltas:
+                    self._apply_delta(meta, delta)
+                self._meta = meta
+                if new_deltas:
+                    self._save_derived()
+            return data_store.dataset_version(meta)
+
+    def _current_meta(self):
+        if not self.read_only:
+            return data_store.ensure_cache(self.csv_path, self.cache_dir)
+        if not os.path.exists(self.csv_path):
+            raise FileNotFoundError(self.csv_path)
+        meta = data_store.fresh_meta(self.csv_path, self.cache_dir, update_source=False)
+        if meta is None:
+            raise RuntimeError(f"No up-to-date data cache for {self.csv_path} in {self.cache_dir}")
+        return meta
+
+    def _save_derived(self):
+        if self.read_only:
+            return
+        version = self.version
+        if self._cube is not None:
+            self._cube['version'] = version
+            aggregates.save_cube(self._cube, self.cache_dir)
+        if self._counts is not None:
+            self._dump(COUNTS_FILE, self._counts)
+        if self._sketches is not None:
+            self._dump(SKETCHES_FILE, self._sketches)
+        if self._index is not None:
+            self._dump(INDEX_FILE, self._index)
+
+    def _dump(self, filename, value):
+        if not self.read_only and os.path.isdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, filename)
+            tmp_path = f"{path}.tmp-{os.getpid()}"
+            joblib.dump({'version': self.version, 'columns': self.index_columns, 'value': value}, tmp_path)
+            os.replace(tmp_path, path)
+
+    def _load(self, filename):
+        """A structure saved for this dataset version, memory-mapped, or None."""
+        path = os.path.join(self.cache_dir, filename)
+        if os.path.exists(path):
+            saved = joblib.load(path, mmap_mode='r')
+            if saved.get('version') == self.version and saved.get('columns') == self.index_columns:
+                return saved['value']
+        return None
+
+    def _load_or_build(self, filename, build):
+        value = self._load(filename)
+        if value is None and self.read_only:
+            value = build()
+        elif value is None:
+            with data_store.build_lock(self.cache_dir):
+                value = self._load(filename)
+                if value is None:
+                    value = build()
+                    self._dump(filename, value)
+        return value
+
+    def _ensure_meta(self):
+        if self._meta is None:
+            self.refresh()
+
+    def _apply_delta(self, meta, delta):
+        segment = data_store.read_segment(self.cache_dir, meta, data_store.delta_segment_dir(delta))
+        if self._frame is not None:
+            frame = self._frame
+            for col in meta['columns']:
+                # Vocabularies only grow, so existing codes keep their meaning.
+                if col['kind'] == 'category' and len(frame[col['name']].cat.categories) != len(col['categories']):
+                    frame = frame.assign(**{col['name']: frame[col['name']].cat.set_categories(col['categories'])})
+            self._frame = pd.concat([frame, segment], ignore_index=True)
+        if self._index is not None:
+            self._index = filter_index.extend_index(self._index, segment)
+        if self._cube is not None:
+            self._cube = aggregates.merge_delta(self._cube, segment)
+        if self._counts is not None:
+            self._counts = aggregates.merge_duration_counts(self._counts, aggregates.duration_counts(segment))
+        if self._sketches is not None:
+            self._sketches = quantile_sketch.merge_delta(self._sketches, segment)
+
+    def segments(self, columns=None):
+        """The cached data in memory-mapped pieces of at most CHUNK_ROWS rows, restricted to ``columns``."""
+        with self._lock:
+            self._ensure_meta()
+            meta = self._meta
+        for segment_dir, rows in data_store.segment_slices(meta):
+            yield data_store.read_segment(self.cache_dir, meta, segment_dir, columns=columns, rows=rows, mmap_mode='r')
+
+    def columns(self):
+        with self._lock:
+            self._ensure_meta()
+            return data_store.column_names(self._meta)
+
+    def vocabularies(self):
+        with self._lock:
+            self._ensure_meta()
+            return data_store.vocabularies(self._meta)
+
+    def frame(self):
+        """The whole dataset as one frame over the memory-mapped cache (deltas are copied in)."""
+        with self._lock:
+            self._ensure_meta()
+            if self._frame is None:
+                self._frame = data_store.read_cache(self.cache_dir, self._meta, mmap_mode='r')
+            return self._frame
+
+    def resident_structures(self):
+        """The derived structures currently held in memory, by name."""
+        with self._lock:
+            structures = {'flight frame': self._frame, 'row index': self._index, 'price cube': self._cube,
+                          'duration counts': self._counts, 'price sketches': self._sketches}
+        return {name: value for name, value in structures.items() if value is not None}
+
+    def build_cube(self):
+        """Build the price cube from the cached data (without using or replacing the stored one)."""
+        if not self.out_of_core:
+            return aggregates.build_price_cube(self.frame())
+        bounds = [(np.nanmin(segment['price']), np.nanmax(segment['price']))
+                  for segment in self.segments(['price']) if len(segment)]
+        edges = aggregates.price_bin_edges(np.array(bounds, dtype=np.float64))
+        cube = None
+        for segment in self.segments(aggregates.CUBE_KEYS + ['price']):
+            cube = aggregates.build_price_cube(segment, edges=edges) if cube is None else aggregates.merge_delta(cube, segment)
+        return cube
+
+    def cube(self):
+        with self._lock:
+            self._ensure_meta()
+            if self._cube is None:
+                self._cube = aggregates.load_cube(self.cache_dir, self.version, mmap_mode='r')
+            if self._cube is None and self.read_only:
+                self._cube = self.build_cube()
+                self._cube['version'] = self.version
+            elif self._cube is None:
+                with data_store.build_lock(self.cache_dir):
+                    self._cube = aggregates.load_cube(self.cache_dir, self.version, mmap_mode='r')
+                    if self._cube is None:
+                        self._cube = self.build_cube()
+                        self._cube['version'] = self.version
+                        aggregates.save_cube(self._cube, self.cache_dir)
+            return self._cube
+
+    def max_days_left(self):
+        return int(max(aggregates.key_values(self.cube(), 'days_left')))
+
+    def duration_counts(self):
+        """Flights per itinerary profile and duration (see ``aggregates.duration_counts``)."""
+        with self._lock:
+            self._ensure_meta()
+            if self._counts is None:
+                self._counts = self._load_or_build(COUNTS_FILE, self._build_duration_counts)
+            return self._counts
+
+    def _build_duration_counts(self):
+        if not self.out_of_core:
+            return aggregates.duration_counts(self.frame())
+        counts = None
+        for segment in self.segments(aggregates.PROFILE_KEYS + ['time_taken']):
+            segment_counts = aggregates.duration_counts(segment)
+            counts = segment_counts if counts is None else aggregates.merge_duration_counts(counts, segment_counts)
+        return counts
+
+    def price_sketches(self):
+        """Quantile sketches of price per route, airline and class (see ``quantile_sketch``)."""
+        with self._lock:
+            self._ensure_meta()
+            if self._sketches is None:
+                self._sketches = self._load_or_build(SKETCHES_FILE, self._build_price_sketches)
+            return self._sketches
+
+    def _build_price_sketches(self):
+        if not self.out_of_core:
+            return quantile_sketch.build_sketches(self.frame())
+        sketches = None
+        for segment in self.segments(quantile_sketch.SKETCH_KEYS + ['price']):
+            sketches = (quantile_sketch.build_sketches(segment) if sketches is None
+                        else quantile_sketch.merge_delta(sketches, segment))
+        return sketches
+
+    def index(self):
+        with self._lock:
+            self._ensure_meta()
+            if self._index is None:
+                self._index = self._load_or_build(INDEX_FILE,
+                                                  lambda: filter_index.build_index(self.frame(), self.index_columns))
+            return self._index
+
+    def _scan(self, filters):
+        with self._lock:
+            meta = self._meta
+        frames = []
+        for segment_dir, piece in data_store.segment_slices(meta):
+            keys = data_store.read_segment(self.cache_dir, meta, segment_dir, columns=list(filters), rows=piece,
+                                           mmap_mode='r')
+            mask = np.ones(len(keys), dtype=bool)
+            for col, value in filters.items():
+                mask &= (keys[col] == value).to_numpy()
+            rows = np.flatnonzero(mask) + piece.start
+            if len(rows):
+                frames.append(data_store.read_segment(self.cache_dir, meta, segment_dir, rows=rows, mmap_mode='r'))
+        if not frames:
+            return data_store.read_segment(self.cache_dir, meta, rows=np.empty(0, dtype=np.int64), mmap_mode='r')
+        return pd.concat(frames, ignore_index=True)
+
+    def select(self, filters=None):
+        """Flight rows matching every ``column: value`` in ``filters``."""
+        if filters and self.out_of_core:
+            return self._scan(filters)
+        with self._lock:
+            frame, index = self.frame(), self.index()
+        return filter_index.take(frame, filter_index.select_rows(index, filters))
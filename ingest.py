@@ -0,0 +1,51 @@
+"""Append new fare observations to the flight data cache.
+
+The rows are validated and written as a delta segment next to the cached
+base data; running app processes pick them up on their next rerun and
+fold them into the price cube and row index without a full reload.
+Ingested batches are kept until the source CSV changes: a rebuild from a
+changed CSV discards them, and ``ingest.py`` says so when that happens.
+
+    python ingest.py new_fares.csv
+"""
+import argparse
+
+import pandas as pd
+
+import data_store
+
+
+def ingest_batch(df, csv_path=data_store.CSV_PATH, cache_dir=data_store.CACHE_DIR):
+    """Validate and append ``df``.
+
+    Returns the new metadata and the earlier deltas that a rebuild from a
+    changed CSV discarded on the way (empty unless that happened).
+    """
+    before = data_store.read_meta(cache_dir)
+    meta = data_store.ensure_cache(csv_path, cache_dir)
+    rebuilt = before is not None and (before.get('format') != meta['format']
+                                      or before['source']['sha256'] != meta['source']['sha256'])
+    return data_store.append_delta(df, cache_dir), before.get('deltas', []) if rebuilt else []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Append new fare observations without rebuilding the cache")
+    parser.add_argument('input', help="CSV with the same columns as the cleaned flight data")
+    parser.add_argument('--csv', default=data_store.CSV_PATH, help="source CSV the cache was built from")
+    parser.add_argument('--cache-dir', default=data_store.CACHE_DIR)
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.input)
+    try:
+        meta, discarded = ingest_batch(df, args.csv, args.cache_dir)
+    except ValueError as e:
+        parser.exit(1, f"Rejected {args.input}: {e}\n")
+    if discarded:
+        print(f"Warning: {args.csv} changed and the cache was rebuilt from it, discarding {len(discarded)} earlier "
+              f"ingested batches ({sum(delta['rows'] for delta in discarded):,} rows); ingest them again if they are not in the CSV")
+    print(f"Appended {len(df):,} rows; dataset version is now {data_store.dataset_version(meta)}")
+    print(f"Note: ingested rows are kept until {args.csv} changes; replacing it rebuilds the cache without them")
+
+
+if __name__ == '__main__':
+    main()
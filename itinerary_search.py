@@ -0,0 +1,116 @@
+"""Cheapest multi-leg itineraries over the city graph.
+
+Cities are nodes; an edge From -> to carries the cheapest fare per
+(From, to, Class, days_left band). Observed fares come from the price
+cube's per-cell minimum. Only where no fare was observed for a (From, to,
+Class, band) is the edge filled from the booking curves, with the
+cheapest predicted fare of an airline known to fly that route in that
+class. ``build_edges`` turns this into per-(band, class) adjacency lists
+once per dataset/model version, so a query never touches flight rows.
+
+``cheapest_itineraries`` is a best-first search over partial itineraries
+ordered by total fare: with positive fares the first itinerary reaching
+the destination is the cheapest, later ones come in increasing price, and
+any partial itinerary already over the budget is dropped, so the search
+only explores what the traveller can afford.
+"""
+import heapq
+import itertools
+
+import numpy as np
+import pandas as pd
+
+import aggregates
+
+# First days_left of each band; the last band is open-ended.
+DAYS_LEFT_BANDS = [1, 4, 8, 15, 31]
+MAX_CONNECTIONS = 2
+EDGE_KEYS = ['From', 'to', 'Class', 'band']
+
+
+def band_of(days_left):
+    """Index of the DAYS_LEFT_BANDS band ``days_left`` falls in (scalar or array)."""
+    return np.maximum(np.searchsorted(DAYS_LEFT_BANDS, days_left, side='right') - 1, 0)
+
+
+def band_label(band):
+    start = DAYS_LEFT_BANDS[band]
+    if band + 1 < len(DAYS_LEFT_BANDS):
+        return f"{start}-{DAYS_LEFT_BANDS[band + 1] - 1} days"
+    return f"{start}+ days"
+
+
+def _cheapest(fares):
+    """Cheapest row per EDGE_KEYS group."""
+    fares = fares.sort_values('price', kind='stable')
+    return fares.drop_duplicates(EDGE_KEYS).reset_index(drop=True)
+
+
+def build_edges(cube, curves=None):
+    """Cheapest fare per (From, to, Class, days_left band), plus adjacency lists for the search.
+
+    Each edge is the cheapest observed fare over all airlines; a predicted
+    fare from ``curves`` is added only for a (From, to, Class, band) with
+    no observed fare at all, never to undercut an observed one.
+    """
+    observed = aggregates.rollup(cube, ['From', 'to', 'Class', 'airline', 'days_left'])
+    observed = observed.assign(band=band_of(observed['days_left'].to_numpy()), price=observed['min'], source='observed')
+    table = _cheapest(observed[EDGE_KEYS + ['airline', 'price', 'source']])
+    for col in ['From', 'to', 'Class', 'airline']:
+        table[col] = table[col].astype(str)
+
+    if curves is not None and len(curves['table']):
+        predicted = curves['table'][curves['table']['observed']]
+        predicted = predicted.assign(band=band_of(predicted['days_left'].to_numpy()), price=predicted['predicted_price'],
+                                     source='predicted')
+        predicted = _cheapest(predicted[EDGE_KEYS + ['airline', 'price', 'source']])
+        for col in ['From', 'to', 'Class', 'airline']:
+            predicted[col] = predicted[col].astype(str)
+        known = pd.MultiIndex.from_frame(table[EDGE_KEYS])
+        missing = ~pd.MultiIndex.from_frame(predicted[EDGE_KEYS]).isin(known)
+        table = pd.concat([table, predicted[missing]], ignore_index=True)
+
+    adjacency = {}
+    for cls, fares in [(None, table)] + list(table.groupby('Class')):
+        # Any class: the cheaper of the classes on each edge.
+        fares = fares.sort_values('price', kind='stable').drop_duplicates(['From', 'to', 'band'])
+        for row in fares.itertuples(index=False):
+            leg = (float(row.price), row.to, row.airline, row.Class, row.source)
+            adjacency.setdefault((int(row.band), cls), {}).setdefault(row.From, []).append(leg)
+    return {'table': table, 'adjacency': adjacency}
+
+
+def cheapest_itineraries(edges, origin, destination, days_left, budget=None, Class=None,
+                         max_connections=MAX_CONNECTIONS, top_k=3, one_per_connections=False):
+    """Up to ``top_k`` cheapest itineraries within ``budget``, with at most ``max_connections`` stops, best first.
+
+    With ``one_per_connections`` only the cheapest itinerary for each number
+    of connections (direct, one, two, ...) is returned. Each itinerary is a
+    dict with ``route``, ``connections``, ``total_price`` and ``legs``
+    (From, to, airline, Class, price, source per flight).
+    """
+    graph = edges['adjacency'].get((int(band_of(days_left)), Class), {})
+    tie = itertools.count()
+    heap = [(0.0, next(tie), (origin,), ())]
+    itineraries = []
+    while heap and len(itineraries) < top_k:
+        cost, _, cities, legs = heapq.heappop(heap)
+        city = cities[-1]
+        if city == destination:
+            if one_per_connections and any(found['connections'] == len(legs) - 1 for found in itineraries):
+                continue
+            itineraries.append({
+                'route': ' → '.join(cities),
+                'connections': len(legs) - 1,
+                'total_price': cost,
+                'legs': [dict(zip(['From', 'to', 'airline', 'Class', 'price', 'source'], leg)) for leg in legs],
+            })
+            continue
+        if len(legs) > max_connections:
+            continue
+        for price, to, airline, cls, source in graph.get(city, []):
+            total = cost + price
+            if to in cities or (budget is not None and total > budget):
+                continue
+            heapq.heappush(heap, (total, next(tie), cities + (to,), legs + ((city, to, airline, cls, price, source),)))
+    return itineraries
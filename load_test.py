@@ -0,0 +1,362 @@
+"""Concurrent-session load test of the Streamlit app.
+
+``run`` starts ``streamlit run app.py`` headless (or targets a running
+server with ``--url``) and drives it with simulated users over the same
+websocket protocol the browser uses. Each user opens a session and
+replays an interaction script for one page: the Analytics filters and
+analysis types, the Predict form and the Predict button, or Traveler
+Corner tips. It waits a think time between steps and starts a new session
+when the script ends. Widget values are picked from the options the app
+sends, and widgets inside fragments rerun just their fragment, as in the
+browser.
+
+Every step is one rerun, timed from sending it to the server's
+script-finished message. For each concurrency level the report has p50,
+p95 and p99 rerun latency per step and overall, reruns per second, the
+reruns that showed an exception or st.error, and the server's peak RSS.
+``compare`` lines up two reports, e.g. from two commits:
+
+    python load_test.py run --users 10 50 200 --duration 60 --json load_test_results.json
+    python load_test.py run --url http://localhost:8501 --pid 12345 --users 50
+    python load_test.py compare baseline.json load_test_results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+import urllib.request
+
+import numpy as np
+
+DEFAULT_USERS = [10, 50]
+DEFAULT_DURATION_S = 60.0
+DEFAULT_THINK_S = 1.0
+DEFAULT_PORT = 8599
+STARTUP_TIMEOUT_S = 120.0
+RERUN_TIMEOUT_S = 300.0
+SCRIPT_WEIGHTS = {'analytics': 0.4, 'predict': 0.4, 'traveler': 0.2}
+PERCENTILES = [50, 95, 99]
+
+
+class Session:
+    """One browser session: its websocket, the widgets of the last run and the values set on them."""
+
+    def __init__(self, url, rng, think_s, records):
+        self.url = url.rstrip('/')
+        self.rng = rng
+        self.think_s = think_s
+        self.records = records
+        self.widgets = {}
+        self.values = {}
+        self._ws = None
+
+    async def open(self, step):
+        import websockets
+
+        self._ws = await websockets.connect(self.url.replace('http', 'ws', 1) + '/_stcore/stream', origin=self.url,
+                                            max_size=None, ping_interval=None)
+        await self.rerun(step)
+
+    async def close(self):
+        if self._ws is not None:
+            await self._ws.close()
+
+    async def rerun(self, step, fragment_id='', trigger=None):
+        """Send a rerun with the values of the widgets on screen (plus ``trigger``) and wait for it to finish."""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        on_screen = {widget['id'] for widget in self.widgets.values()}
+        message = BackMsg()
+        message.rerun_script.fragment_id = fragment_id
+        message.rerun_script.widget_states.widgets.extend(
+            [state for widget_id, state in self.values.items() if widget_id in on_screen] + ([trigger] if trigger else []))
+        if not fragment_id:
+            self.widgets = {}
+        errors = 0
+        start = time.perf_counter()
+        await self._ws.send(message.SerializeToString())
+        while True:
+            reply = ForwardMsg()
+            reply.ParseFromString(await asyncio.wait_for(self._ws.recv(), RERUN_TIMEOUT_S))
+            kind = reply.WhichOneof('type')
+            if kind == 'delta' and reply.delta.WhichOneof('type') == 'new_element':
+                errors += self._observe(reply.delta.new_element, reply.delta.fragment_id)
+            elif kind == 'script_finished':
+                break
+        self.records.append((step, time.perf_counter() - start, errors))
+
+    def _observe(self, element, fragment_id):
+        """Remember a widget by its label; returns 1 for an exception or an st.error alert."""
+        kind = element.WhichOneof('type')
+        proto = getattr(element, kind)
+        if kind == 'exception' or (kind == 'alert' and proto.format == proto.ERROR):
+            return 1
+        if kind in ('button', 'number_input', 'radio', 'selectbox'):
+            self.widgets[proto.label] = {'id': proto.id, 'kind': kind, 'proto': proto, 'fragment_id': fragment_id}
+        return 0
+
+    async def think(self):
+        if self.think_s:
+            await asyncio.sleep(self.rng.expovariate(1.0 / self.think_s))
+
+    async def set(self, step, label, value):
+        """Set a selectbox or radio option, or a number input, and rerun (just its fragment if it is in one)."""
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        await self.think()
+        widget = self.widgets[label]
+        state = WidgetState(id=widget['id'])
+        if widget['kind'] == 'number_input' and widget['proto'].data_type == widget['proto'].INT:
+            state.int_value = int(value)
+        elif widget['kind'] == 'number_input':
+            state.double_value = float(value)
+        else:
+            state.string_value = str(value)
+        self.values[widget['id']] = state
+        await self.rerun(step, widget['fragment_id'])
+
+    async def choose(self, step, label, exclude=()):
+        """Select a random option of a selectbox or radio; returns it."""
+        choice = self.rng.choice([option for option in self.widgets[label]['proto'].options if option not in exclude])
+        await self.set(step, label, choice)
+        return choice
+
+    async def click(self, step, label):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        await self.think()
+        widget = self.widgets[label]
+        await self.rerun(step, widget['fragment_id'], WidgetState(id=widget['id'], trigger_value=True))
+
+
+async def analytics_script(session):
+    await session.open('analytics: open app')
+    await session.set('analytics: open page', 'Go to', 'Analytics for Business')
+    await session.choose('analytics: departure filter', 'Filter by Departure City')
+    await session.choose('analytics: analysis type', 'Select Analysis Type')
+    await session.choose('analytics: airline filter', 'Filter by Airline')
+    await session.choose('analytics: analysis type', 'Select Analysis Type')
+
+
+async def predict_script(session):
+    await session.open('predict: open app')
+    await session.set('predict: open page', 'Go to', 'Predict Price for Business')
+    await session.choose('predict: form', 'Airline')
+    departure = await session.choose('predict: form', 'Departure City')
+    await session.choose('predict: form', 'Arrival City', exclude=[departure])
+    await session.choose('predict: form', 'Class')
+    await session.set('predict: form', 'Hours', session.rng.randint(1, 12))
+    await session.click('predict: predict price', '🔮 Predict Price')
+
+
+async def traveler_script(session):
+    await session.open('traveler: open app')
+    await session.set('traveler: open page', 'Go to', 'Traveler Corner')
+    await session.set('traveler: form', 'Enter your budget (INR)', session.rng.choice([3000, 5000, 8000, 15000]))
+    departure = await session.choose('traveler: form', 'Select Departure City')
+    await session.choose('traveler: form', 'Select Arrival City', exclude=[departure])
+    await session.click('traveler: travel tips', '💡 Get Travel Tips')
+
+
+SCRIPTS = {'analytics': analytics_script, 'predict': predict_script, 'traveler': traveler_script}
+
+
+async def _visit(url, script, rng, think_s, records):
+    session = Session(url, rng, think_s, records)
+    try:
+        await SCRIPTS[script](session)
+    except Exception as e:
+        records.append((f'{script}: failed visit ({type(e).__name__})', float('nan'), 1))
+    finally:
+        await session.close()
+
+
+async def _user(url, rng, think_s, start_delay, deadline, records):
+    await asyncio.sleep(start_delay)
+    names, weights = list(SCRIPT_WEIGHTS), list(SCRIPT_WEIGHTS.values())
+    while time.perf_counter() < deadline:
+        await _visit(url, rng.choices(names, weights)[0], rng, think_s, records)
+
+
+async def run_level(url, users, duration_s, think_s, ramp_s, seed):
+    """Records ``(step, seconds, errors)`` of ``users`` concurrent users for ``duration_s``, and the elapsed time."""
+    records = []
+    start = time.perf_counter()
+    deadline = start + ramp_s + duration_s
+    await asyncio.gather(*(_user(url, random.Random(seed + user), think_s, ramp_s * user / users, deadline, records)
+                           for user in range(users)))
+    return records, time.perf_counter() - start
+
+
+async def warm_up(url, seed):
+    """One visit per script, not measured: builds the app's shared caches before the timed runs."""
+    records = []
+    for script in SCRIPTS:
+        await _visit(url, script, random.Random(seed), 0, records)
+    return records
+
+
+def latency_summary(seconds):
+    seconds = np.asarray([s for s in seconds if s == s])
+    if not len(seconds):
+        return {'count': 0}
+    summary = {'count': int(len(seconds)), 'max_s': float(seconds.max())}
+    summary.update({f'p{p}_s': float(np.percentile(seconds, p)) for p in PERCENTILES})
+    return summary
+
+
+def summarize(records, users, elapsed_s, peak_rss):
+    steps = {}
+    for step, seconds, _ in records:
+        steps.setdefault(step, []).append(seconds)
+    finished = [seconds for _, seconds, _ in records if seconds == seconds]
+    return {
+        'users': users,
+        'elapsed_s': elapsed_s,
+        'reruns': len(finished),
+        'errors': sum(errors for _, _, errors in records),
+        'throughput_rps': len(finished) / elapsed_s if elapsed_s else 0.0,
+        'latency': latency_summary(finished),
+        'steps': {step: latency_summary(seconds) for step, seconds in sorted(steps.items())},
+        'peak_rss_bytes': peak_rss,
+    }
+
+
+def peak_rss(pid):
+    """Peak resident set size of process ``pid`` in bytes (Linux), or None."""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def children_peak_rss():
+    """Peak RSS of the largest finished child process in bytes."""
+    maxrss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def start_server(app_path, port, cwd, log_path):
+    command = [sys.executable, '-m', 'streamlit', 'run', os.path.abspath(app_path), '--server.headless', 'true',
+               '--server.port', str(port), '--browser.gatherUsageStats', 'false']
+    with open(log_path, 'w') as log:
+        return subprocess.Popen(command, cwd=cwd, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_until_healthy(url, process=None, timeout_s=STARTUP_TIMEOUT_S):
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Streamlit exited with code {process.returncode} before becoming healthy")
+        try:
+            with urllib.request.urlopen(f"{url.rstrip('/')}/_stcore/health", timeout=5) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"{url} did not become healthy within {timeout_s:.0f} s")
+
+
+def compare(baseline, current):
+    """``(users, metric, baseline, current, ratio)`` for the throughput and every step's p95 in both reports."""
+    rows = []
+    for users, level in current['levels'].items():
+        base = baseline['levels'].get(users)
+        if base is None:
+            continue
+        pairs = [('throughput (rps)', base['throughput_rps'], level['throughput_rps']),
+                 ('p95 rerun (ms)', base['latency'].get('p95_s', 0) * 1000, level['latency'].get('p95_s', 0) * 1000)]
+        pairs += [(f'p95 {step} (ms)', base['steps'][step]['p95_s'] * 1000, timing['p95_s'] * 1000)
+                  for step, timing in level['steps'].items() if 'p95_s' in timing and 'p95_s' in base['steps'].get(step, {})]
+        rows += [(users, name, before, after, after / before if before else float('inf')) for name, before, after in pairs]
+    return rows
+
+
+def print_level(level):
+    peak = level['peak_rss_bytes']
+    print(f"{level['users']} users: {level['reruns']} reruns in {level['elapsed_s']:.1f} s "
+          f"({level['throughput_rps']:.1f}/s), {level['errors']} errors, "
+          f"peak RSS {f'{peak / 2**20:.0f} MB' if peak else 'n/a'}")
+    for name, timing in [('all reruns', level['latency'])] + list(level['steps'].items()):
+        if timing['count']:
+            print(f"  {name:<40} {timing['count']:>6}  "
+                  + '  '.join(f"p{p} {timing[f'p{p}_s'] * 1000:8.1f} ms" for p in PERCENTILES))
+        else:
+            print(f"  {name:<40} {'failed':>6}")
+
+
+def run(args):
+    from benchmark import environment
+
+    server, url = None, args.url
+    if url is None:
+        url = f'http://localhost:{args.port}'
+        server = start_server(args.app, args.port, args.cwd, args.server_log)
+    pid = server.pid if server is not None else args.pid
+    report = {'environment': environment(), 'url': url, 'think_s': args.think, 'duration_s': args.duration,
+              'levels': {}}
+    try:
+        wait_until_healthy(url, server)
+        warmup_errors = sum(errors for _, _, errors in asyncio.run(warm_up(url, args.seed)))
+        if warmup_errors:
+            print(f"Warning: {warmup_errors} errors during the warmup visits")
+        for users in args.users:
+            records, elapsed_s = asyncio.run(run_level(url, users, args.duration, args.think, args.ramp, args.seed))
+            level = summarize(records, users, elapsed_s, peak_rss(pid) if pid else None)
+            report['levels'][str(users)] = level
+            print_level(level)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+            report['server_peak_rss_bytes'] = children_peak_rss()
+    with open(args.json, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.json}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the Streamlit app with concurrent simulated sessions")
+    commands = parser.add_subparsers(dest='command', required=True)
+    load = commands.add_parser('run', help="replay page interactions at each concurrency level and write a JSON report")
+    load.add_argument('--users', type=int, nargs='+', default=DEFAULT_USERS, help="concurrency levels, run in turn")
+    load.add_argument('--duration', type=float, default=DEFAULT_DURATION_S, help="seconds per level after the ramp-up")
+    load.add_argument('--ramp', type=float, default=5.0, help="seconds over which the users of a level start")
+    load.add_argument('--think', type=float, default=DEFAULT_THINK_S, help="mean think time between steps (0 for none)")
+    load.add_argument('--seed', type=int, default=0)
+    load.add_argument('--url', help="test a running server instead of starting one")
+    load.add_argument('--pid', type=int, help="process id of the server given with --url, for its peak RSS")
+    load.add_argument('--app', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py'))
+    load.add_argument('--cwd', default='.', help="working directory of the started server (data and model files)")
+    load.add_argument('--port', type=int, default=DEFAULT_PORT)
+    load.add_argument('--server-log', default='load_test_server.log')
+    load.add_argument('--json', default='load_test_results.json')
+    diff = commands.add_parser('compare', help="compare two JSON reports")
+    diff.add_argument('baseline')
+    diff.add_argument('current')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        run(args)
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        for users, name, before, after, ratio in compare(baseline, current):
+            print(f"{int(users):>6} users {name:<52} {before:10.2f} -> {after:10.2f}  x{ratio:.2f}")
+
+
+if __name__ == '__main__':
+    main()
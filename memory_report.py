@@ -0,0 +1,91 @@
+"""Memory report for the flight data: bytes per column and per resident structure.
+
+Loads everything the app pages would (the frame and row index only when the
+data is served from memory) and compares the frame with a plain
+``pd.read_csv`` load of the same file, which is what the app used to hold.
+
+    python memory_report.py [--json memory_report.json] [--no-baseline]
+"""
+import argparse
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+
+import data_store
+import flight_store
+
+
+def nbytes(obj):
+    """Approximate memory held by ``obj``, following dicts, lists and tuples."""
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        usage = obj.memory_usage(deep=True)
+        return int(usage.sum()) if isinstance(obj, pd.DataFrame) else int(usage)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(nbytes(key) + nbytes(value) for key, value in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(nbytes(item) for item in obj)
+    return sys.getsizeof(obj)
+
+
+def column_report(frame):
+    """``{column: {'dtype', 'bytes'}}`` for every column of ``frame``."""
+    usage = frame.memory_usage(deep=True, index=False)
+    return {col: {'dtype': str(frame[col].dtype), 'bytes': int(usage[col])} for col in frame.columns}
+
+
+def structure_report(store):
+    return {name: nbytes(value) for name, value in store.resident_structures().items()}
+
+
+def load_all(store):
+    store.refresh()
+    store.cube()
+    store.duration_counts()
+    store.price_sketches()
+    if not store.out_of_core:
+        store.index()
+
+
+def _mb(n_bytes):
+    return f"{n_bytes / 2**20:10.2f} MB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report memory per column and per structure")
+    parser.add_argument('--csv', default=data_store.CSV_PATH)
+    parser.add_argument('--json', help="also write the report to this file")
+    parser.add_argument('--no-baseline', action='store_true', help="skip loading the CSV with plain pandas for comparison")
+    args = parser.parse_args()
+
+    store = flight_store.FlightStore(args.csv)
+    load_all(store)
+    report = {'out_of_core': store.out_of_core, 'structures': structure_report(store)}
+    if 'flight frame' in store.resident_structures():
+        report['columns'] = column_report(store.frame())
+    if not args.no_baseline:
+        report['baseline_columns'] = column_report(pd.read_csv(args.csv))
+
+    if 'columns' in report:
+        print("Flight frame columns")
+        for col, info in report['columns'].items():
+            baseline = report.get('baseline_columns', {}).get(col)
+            before = f"  (plain CSV load: {baseline['dtype']}, {_mb(baseline['bytes']).strip()})" if baseline else ''
+            print(f"  {col:<16} {info['dtype']:<10} {_mb(info['bytes'])}{before}")
+    print(f"Resident structures ({'out of core' if report['out_of_core'] else 'in memory'})")
+    for name, n_bytes in report['structures'].items():
+        print(f"  {name:<16} {_mb(n_bytes)}")
+    print(f"  {'total':<16} {_mb(sum(report['structures'].values()))}")
+    if 'baseline_columns' in report:
+        print(f"Plain CSV frame    {_mb(sum(info['bytes'] for info in report['baseline_columns'].values()))}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
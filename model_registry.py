@@ -0,0 +1,290 @@
+"""Versioned model bundles with hot reload, warmup and rollback.
+
+The registry is the ``models/`` directory train.py writes to: one
+``models/<version>/`` bundle per training run with FPP_model.pkl,
+FPP_encoders.pkl and metrics.json. ``models/active.json`` names the bundle
+to serve and remembers the ones served before it, so ``rollback`` can go
+back; without it the newest bundle is served, and without any bundle the
+legacy FPP_model.pkl next to the app. The legacy version is a hash of
+FPP_model.pkl and its FPP_encoders.pkl, so replacing either one is picked
+up like a new bundle.
+
+A ModelRegistry holds the model currently served as one immutable
+ActiveModel (version, model, encoders). Its watcher thread polls the
+registry, loads a new version in the background, warms it up with
+representative predictions and only then replaces the ActiveModel in a
+single assignment: a request that took the old one finishes with it, and
+no request ever sees a model without its encoders. A version that fails
+to load or warm up is skipped and the current one keeps serving.
+
+    python model_registry.py list
+    python model_registry.py activate 20250101-120000-1a2b3c4d
+    python model_registry.py rollback
+"""
+import argparse
+import collections
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import data_store
+import encoders as feature_encoders
+import prediction
+
+MODELS_DIR = 'models'
+ACTIVE_FILE = 'active.json'
+METRICS_FILE = 'metrics.json'
+LEGACY_PREFIX = 'local-'
+MAX_HISTORY = 20
+POLL_SECONDS = float(os.environ.get('FPP_MODEL_POLL_S', 10))
+WARMUP_DURATIONS = [90, 180, 600]
+WARMUP_DAYS_LEFT = [1, 7, 30, 49]
+
+ActiveModel = collections.namedtuple('ActiveModel', 'version model encoders model_path loaded_at warmup_ms')
+
+
+def bundle_model_path(version, models_dir=MODELS_DIR):
+    return os.path.join(models_dir, version, prediction.MODEL_FILE)
+
+
+def list_versions(models_dir=MODELS_DIR):
+    """Complete bundles in the registry, oldest first."""
+    if not os.path.isdir(models_dir):
+        return []
+    return sorted(name for name in os.listdir(models_dir)
+                  if '.tmp-' not in name and os.path.isfile(bundle_model_path(name, models_dir)))
+
+
+def read_active(models_dir=MODELS_DIR):
+    """``{'version', 'history'}`` from active.json, or None if no version was activated."""
+    try:
+        with open(os.path.join(models_dir, ACTIVE_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_active(models_dir, version, history):
+    path = os.path.join(models_dir, ACTIVE_FILE)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        json.dump({'version': version, 'history': history[-MAX_HISTORY:]}, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def desired_version(models_dir=MODELS_DIR):
+    """The bundle that should be served: the activated one, else the newest, else None (legacy model)."""
+    active = read_active(models_dir)
+    if active and os.path.isfile(bundle_model_path(active['version'], models_dir)):
+        return active['version']
+    versions = list_versions(models_dir)
+    return versions[-1] if versions else None
+
+
+def serving_model_path(models_dir=MODELS_DIR, legacy_model_path=prediction.MODEL_FILE):
+    """Model file of the version that should be served."""
+    version = desired_version(models_dir)
+    return bundle_model_path(version, models_dir) if version is not None else legacy_model_path
+
+
+def activate(version, models_dir=MODELS_DIR):
+    """Point the registry at ``version``; running processes pick it up on their next poll."""
+    if version not in list_versions(models_dir):
+        raise ValueError(f"No model bundle {version!r} in {models_dir}")
+    active = read_active(models_dir) or {'version': None, 'history': []}
+    current = active['version'] or desired_version(models_dir)
+    history = active['history'] + ([current] if current and current != version else [])
+    _write_active(models_dir, version, history)
+
+
+def rollback(models_dir=MODELS_DIR):
+    """Re-activate the previously active version (or the bundle before the current one); returns it."""
+    active = read_active(models_dir) or {'version': desired_version(models_dir), 'history': []}
+    history = [version for version in active['history'] if version in list_versions(models_dir)]
+    if history:
+        version = history.pop()
+    else:
+        versions = list_versions(models_dir)
+        older = [v for v in versions if active['version'] and v < active['version']]
+        if not older:
+            raise ValueError("No earlier model version to roll back to")
+        version = older[-1]
+    _write_active(models_dir, version, history)
+    return version
+
+
+def bundle_metrics(version, models_dir=MODELS_DIR):
+    try:
+        with open(os.path.join(models_dir, version, METRICS_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def warmup_itineraries(encoders):
+    """Representative itineraries covering every airline, route, time slot, stop count and class."""
+    vocab = {col: feature_encoders.vocabulary(encoders, col) for col in prediction.CATEGORICAL_FEATURES}
+    n_rows = max(len(values) for values in vocab.values()) * len(WARMUP_DURATIONS) * len(WARMUP_DAYS_LEFT)
+    rows = np.arange(n_rows)
+    itineraries = pd.DataFrame({col: np.asarray(values, dtype=object)[rows % len(values)]
+                                for col, values in vocab.items()})
+    # Shift arrivals by one so no row departs and arrives at the same city.
+    itineraries['to'] = np.asarray(vocab['to'], dtype=object)[(rows + 1) % len(vocab['to'])]
+    itineraries['duration'] = np.resize(WARMUP_DURATIONS, n_rows)
+    itineraries['days_left'] = np.repeat(WARMUP_DAYS_LEFT, -(-n_rows // len(WARMUP_DAYS_LEFT)))[:n_rows]
+    return itineraries
+
+
+def warmup(model, encoders):
+    """Price the warmup itineraries in a batch and one by one; returns the elapsed milliseconds.
+
+    Raises ValueError if the model cannot price them or predicts non-finite prices.
+    """
+    start = time.perf_counter()
+    features, errors = prediction.encode_batch(encoders, warmup_itineraries(encoders))
+    features = features[(errors == '').to_numpy()]
+    if not len(features):
+        raise ValueError("None of the warmup itineraries can be encoded")
+    prices = model.predict(features)
+    for row in features[:len(WARMUP_DAYS_LEFT)]:
+        prices = np.append(prices, model.predict(row[None, :]))
+    if not np.isfinite(prices).all():
+        raise ValueError("Model predicts non-finite prices for the warmup itineraries")
+    return (time.perf_counter() - start) * 1000.0
+
+
+class ModelRegistry:
+    def __init__(self, models_dir=MODELS_DIR, legacy_model_path=prediction.MODEL_FILE, backend=None,
+                 vocabularies=None):
+        self.models_dir = models_dir
+        self.legacy_model_path = legacy_model_path
+        self.backend = backend
+        # Called for the category vocabularies when a model comes without its encoders file.
+        self._vocabularies = vocabularies
+        self._active = None
+        self._legacy_stat = None
+        self._failed = {}
+        self._loading = None
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._stop = threading.Event()
+
+    def current(self):
+        """The ActiveModel to serve, loading the desired version first if nothing is loaded yet."""
+        active = self._active
+        if active is None:
+            with self._lock:
+                if self._active is None:
+                    self._active = self._load(*self._desired())
+                active = self._active
+        return active
+
+    def _desired(self):
+        version = desired_version(self.models_dir)
+        if version is not None:
+            return version, bundle_model_path(version, self.models_dir)
+        if not os.path.exists(self.legacy_model_path):
+            raise FileNotFoundError(f"Model file {self.legacy_model_path} not found in path: {os.getcwd()}")
+        return self._legacy_version(), self.legacy_model_path
+
+    def _legacy_version(self):
+        """``local-<model hash>[-<encoders hash>]``, rehashed only when either file's mtime or size changes."""
+        paths = [self.legacy_model_path, feature_encoders.encoder_path(self.legacy_model_path)]
+        stats = tuple((os.stat(path).st_mtime_ns, os.stat(path).st_size) if os.path.exists(path) else None
+                      for path in paths)
+        if self._legacy_stat is None or self._legacy_stat[0] != stats:
+            hashes = [data_store.file_sha256(path)[:8] for path, stat in zip(paths, stats) if stat is not None]
+            self._legacy_stat = (stats, LEGACY_PREFIX + '-'.join(hashes))
+        return self._legacy_stat[1]
+
+    def _load(self, version, model_path):
+        model = prediction.load_predictor(model_path, self.backend)
+        encoder_file = feature_encoders.encoder_path(model_path)
+        if os.path.exists(encoder_file) or self._vocabularies is None:
+            encoders = feature_encoders.load_encoders(encoder_file)
+        else:
+            encoders = feature_encoders.load_or_fit_encoders(self._vocabularies(), encoder_file)
+            if model_path == self.legacy_model_path:
+                # The encoders file just written is part of the legacy version.
+                version = self._legacy_version()
+        warmup_ms = warmup(model, encoders)
+        return ActiveModel(version, model, encoders, model_path, time.time(), warmup_ms)
+
+    def poll(self):
+        """Load, warm up and swap in the desired version if it changed; returns True if a swap happened."""
+        active = self._active
+        if active is None:
+            # The first version is loaded by current().
+            return False
+        version, model_path = self._desired()
+        if active.version == version or version in self._failed:
+            return False
+        self._loading = version
+        try:
+            loaded = self._load(version, model_path)
+        except Exception as e:
+            self._failed[version] = str(e)
+            return False
+        finally:
+            self._loading = None
+        with self._lock:
+            self._active = loaded
+        return True
+
+    def _watch(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.poll()
+            except Exception:
+                # A half-written bundle or a missing file is retried on the next poll.
+                pass
+
+    def start_watcher(self, interval=POLL_SECONDS):
+        if self._watcher is None:
+            self._watcher = threading.Thread(target=self._watch, args=(interval,), name='model-watcher', daemon=True)
+            self._watcher.start()
+        return self
+
+    def stop_watcher(self):
+        self._stop.set()
+
+    def status(self):
+        active = self._active
+        return {
+            'active': active.version if active else None,
+            'loaded_at': active.loaded_at if active else None,
+            'warmup_ms': active.warmup_ms if active else None,
+            'loading': self._loading,
+            'failed': dict(self._failed),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the versioned model bundles")
+    parser.add_argument('--models-dir', default=MODELS_DIR)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list', help="list the bundles and mark the active one")
+    activate_parser = subparsers.add_parser('activate', help="serve the given bundle")
+    activate_parser.add_argument('version')
+    subparsers.add_parser('rollback', help="go back to the previously active bundle")
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        active = desired_version(args.models_dir)
+        for version in list_versions(args.models_dir):
+            holdout = (bundle_metrics(version, args.models_dir) or {}).get('holdout', {})
+            rmse = f"RMSE {holdout['rmse']:,.2f}" if 'rmse' in holdout else ''
+            print(f"{'*' if version == active else ' '} {version}  {rmse}")
+    elif args.command == 'activate':
+        activate(args.version, args.models_dir)
+        print(f"Activated {args.version}")
+    else:
+        print(f"Rolled back to {rollback(args.models_dir)}")
+
+
+if __name__ == '__main__':
+    main()
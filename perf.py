@@ -0,0 +1,139 @@
+"""Lightweight timing spans for the app and the prediction service.
+
+``with perf.span('analytics: Busiest Routes'):`` times a block when
+instrumentation is enabled (FPP_PERF=1 or ``set_enabled(True)``). Each span
+name keeps a count, a total and a latency histogram for the process, and
+the spans of the current script run are collected per thread so a page can
+show what its last rerun spent; ``sub_run`` collects a part of the page
+that reruns on its own (a Streamlit fragment) separately. When disabled, ``span`` returns a shared
+no-op context manager and records nothing.
+
+``metrics_text`` renders the histograms in Prometheus text format;
+``write_metrics`` saves them atomically for a file-based scraper.
+"""
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_FILE = os.environ.get('FPP_PERF_FILE', 'perf_metrics.prom')
+
+_enabled = os.environ.get('FPP_PERF') == '1'
+_NOOP = nullcontext()
+_lock = threading.Lock()
+_stats = {}
+_local = threading.local()
+
+
+def enabled():
+    return _enabled
+
+
+def set_enabled(flag):
+    global _enabled
+    _enabled = bool(flag)
+
+
+class _Span:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def span(name):
+    """Context manager timing the block as ``name`` (a no-op when instrumentation is off)."""
+    return _Span(name) if _enabled else _NOOP
+
+
+def record(name, seconds):
+    with _lock:
+        stats = _stats.get(name)
+        if stats is None:
+            stats = _stats[name] = {'count': 0, 'sum': 0.0, 'buckets': [0] * (len(BUCKETS) + 1)}
+        stats['count'] += 1
+        stats['sum'] += seconds
+        stats['buckets'][bisect.bisect_left(BUCKETS, seconds)] += 1
+    run = getattr(_local, 'run', None)
+    if run is not None:
+        run.append((name, seconds))
+
+
+def start_run():
+    """Start collecting this thread's spans (one script run) afresh."""
+    _local.run = []
+
+
+def run_spans():
+    """``[(name, seconds)]`` recorded by this thread since ``start_run``, in completion order."""
+    return list(getattr(_local, 'run', None) or [])
+
+
+def end_run():
+    """Stop collecting this thread's spans; returns those of the run."""
+    spans = run_spans()
+    _local.run = None
+    return spans
+
+
+@contextmanager
+def sub_run():
+    """Collect the spans recorded in the block as a run of their own.
+
+    Yields the list they are collected in. They also count towards an
+    enclosing run that was started and not yet ended.
+    """
+    outer = getattr(_local, 'run', None)
+    spans = _local.run = []
+    try:
+        yield spans
+    finally:
+        _local.run = outer
+        if outer is not None:
+            outer.extend(spans)
+
+
+def snapshot():
+    """``{name: {'count', 'sum', 'buckets'}}`` for every span recorded in this process."""
+    with _lock:
+        return {name: dict(stats, buckets=list(stats['buckets'])) for name, stats in _stats.items()}
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def metrics_text(prefix='fpp_span'):
+    lines = [f"# HELP {prefix}_seconds Time spent in instrumented sections.", f"# TYPE {prefix}_seconds histogram"]
+    for name, stats in sorted(snapshot().items()):
+        label = _label(name)
+        cumulative = 0
+        for bound, count in zip(BUCKETS + (float('inf'),), stats['buckets']):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f'{prefix}_seconds_bucket{{span="{label}",le="{le}"}} {cumulative}')
+        lines.append(f'{prefix}_seconds_sum{{span="{label}"}} {stats["sum"]}')
+        lines.append(f'{prefix}_seconds_count{{span="{label}"}} {stats["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def write_metrics(path=METRICS_FILE):
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        f.write(metrics_text())
+    os.replace(tmp_path, path)
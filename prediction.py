@@ -0,0 +1,158 @@
+"""Model loading and batch prediction outside the Streamlit script.
+
+    from prediction import load_model_file, predict_batch
+    priced = predict_batch(load_model_file(), load_encoders(), itineraries_df)
+
+or from the command line:
+
+    python prediction.py itineraries.csv priced.csv
+"""
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+
+import encoders as feature_encoders
+
+MODEL_FILE = 'FPP_model.pkl'
+MODEL_BACKENDS = ['sklearn', 'compiled']
+DEFAULT_CHUNK_SIZE = 50_000
+MIN_DURATION_MINUTES = 30
+
+# Columns a batch must provide; duration is in minutes, like on the Predict page.
+BATCH_INPUT_COLUMNS = ['airline', 'From', 'to', 'departure_time', 'arrival_time',
+                       'stops', 'Class', 'days_left', 'duration']
+CATEGORICAL_FEATURES = ['airline', 'From', 'to', 'departure_time', 'arrival_time', 'stops', 'Class']
+
+
+def load_model_file(path=MODEL_FILE):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Model file {path} not found in path: {os.getcwd()}")
+    return joblib.load(path)
+
+
+def load_predictor(path=MODEL_FILE, backend=None):
+    """Load the model for prediction with the given backend.
+
+    ``sklearn`` returns the pickled estimator; ``compiled`` returns its flat
+    NumPy evaluator (see compiled_model.py), exporting it first if needed.
+    The default comes from the FPP_MODEL_BACKEND environment variable.
+    """
+    backend = backend or os.environ.get('FPP_MODEL_BACKEND', 'sklearn')
+    if backend == 'sklearn':
+        return load_model_file(path)
+    if backend == 'compiled':
+        import compiled_model
+
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Model file {path} not found in path: {os.getcwd()}")
+        return compiled_model.load_or_export(path)
+    raise ValueError(f"Unknown model backend {backend!r}; expected one of {MODEL_BACKENDS}")
+
+
+def encode_itinerary(encoders, itinerary):
+    """Encode one itinerary dict into a feature row, raising ValueError if it cannot be priced."""
+    missing_columns = [col for col in BATCH_INPUT_COLUMNS if col not in itinerary]
+    if missing_columns:
+        raise ValueError(f"Missing fields: {missing_columns}")
+    try:
+        days_left = float(itinerary['days_left'])
+        duration = float(itinerary['duration'])
+    except (TypeError, ValueError):
+        raise ValueError("days_left and duration must be numbers") from None
+    if days_left < 1:
+        raise ValueError("days_left must be at least 1")
+    if duration < MIN_DURATION_MINUTES:
+        raise ValueError(f"duration must be at least {MIN_DURATION_MINUTES} minutes")
+    if itinerary['From'] == itinerary['to']:
+        raise ValueError("departure and arrival cities are the same")
+    return feature_encoders.encode_features(
+        encoders, duration, days_left, itinerary['airline'], itinerary['departure_time'],
+        itinerary['From'], itinerary['arrival_time'], itinerary['to'], itinerary['Class'],
+        itinerary['stops'])[0].astype(np.float64)
+
+
+def encode_batch(encoders, itineraries):
+    """Encode a frame of itineraries into the model's feature matrix.
+
+    Returns ``(features, errors)`` where ``errors`` is a string Series that is
+    empty for rows that can be priced and describes every problem otherwise.
+    """
+    missing_columns = [col for col in BATCH_INPUT_COLUMNS if col not in itineraries.columns]
+    if missing_columns:
+        raise ValueError(f"Missing columns in batch: {missing_columns}")
+
+    n_rows = len(itineraries)
+    errors = np.full(n_rows, '', dtype=object)
+    features = np.empty((n_rows, len(feature_encoders.FEATURE_ORDER)), dtype=np.float64)
+
+    for col in CATEGORICAL_FEATURES:
+        codes = feature_encoders.encode_column(encoders, col, itineraries[col])
+        missing = itineraries[col].isna().to_numpy()
+        errors[missing] += f"missing {col}; "
+        bad = (codes < 0) & ~missing
+        if bad.any():
+            values = itineraries[col].astype(str).to_numpy()[bad]
+            errors[bad] += f"unknown {col} '" + values + "'; "
+        features[:, feature_encoders.FEATURE_ORDER.index(col)] = codes
+
+    for col in ['days_left', 'duration']:
+        missing = itineraries[col].isna().to_numpy()
+        values = pd.to_numeric(itineraries[col], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+        errors[missing] += f"missing {col}; "
+        errors[np.isnan(values) & ~missing] += f"{col} is not a number; "
+        features[:, feature_encoders.FEATURE_ORDER.index(col)] = values
+
+    days_left = features[:, feature_encoders.FEATURE_ORDER.index('days_left')]
+    duration = features[:, feature_encoders.FEATURE_ORDER.index('duration')]
+    errors[days_left < 1] += "days_left must be at least 1; "
+    errors[duration < MIN_DURATION_MINUTES] += f"duration must be at least {MIN_DURATION_MINUTES} minutes; "
+    same_city = (itineraries['From'].astype(str) == itineraries['to'].astype(str)).to_numpy()
+    errors[same_city] += "departure and arrival cities are the same; "
+
+    return features, pd.Series(errors, index=itineraries.index).str.rstrip('; ')
+
+
+def predict_matrix(model, features, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Run ``model.predict`` over ``features`` in chunks of at most ``chunk_size`` rows."""
+    predictions = np.empty(len(features), dtype=np.float64)
+    for start in range(0, len(features), chunk_size):
+        stop = start + chunk_size
+        predictions[start:stop] = model.predict(features[start:stop])
+    return predictions
+
+
+def predict_batch(model, encoders, itineraries, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Price a frame of itineraries.
+
+    Returns a copy of ``itineraries`` with ``predicted_price`` (NaN for rows
+    that could not be priced) and ``error`` columns.
+    """
+    features, errors = encode_batch(encoders, itineraries)
+    valid = (errors == '').to_numpy()
+
+    result = itineraries.copy()
+    result['predicted_price'] = np.nan
+    if valid.any():
+        result.loc[valid, 'predicted_price'] = predict_matrix(model, features[valid], chunk_size)
+    result['error'] = errors
+    return result
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Price a CSV of itineraries with FPP_model.pkl")
+    parser.add_argument('input_csv')
+    parser.add_argument('output_csv')
+    parser.add_argument('--model', default=MODEL_FILE)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    model = load_model_file(args.model)
+    encoders = feature_encoders.load_encoders(feature_encoders.encoder_path(args.model))
+    priced = predict_batch(model, encoders, pd.read_csv(args.input_csv), args.chunk_size)
+    priced.to_csv(args.output_csv, index=False)
+    n_failed = int((priced['error'] != '').sum())
+    print(f"Priced {len(priced) - n_failed} of {len(priced)} itineraries; {n_failed} rows reported errors.")
@@ -0,0 +1,102 @@
+"""Bounded in-process cache in front of ``model.predict``.
+
+Entries are keyed on the model version and the encoded nine-feature
+tuple, evicted least recently used once ``max_size`` is reached and expire
+after ``ttl_seconds``. A prediction is only ever read back for the model
+version it was computed with, so requests served by different versions
+(e.g. around a hot swap) share the cache without clearing it for each
+other; entries of a retired version age out through LRU and TTL.
+Hit, miss, eviction and expiry counters are exported in Prometheus text
+format by ``metrics_text()``.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_MAX_SIZE = 10_000
+DEFAULT_TTL_SECONDS = 3600.0
+
+
+class PredictionCache:
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, ttl_seconds=DEFAULT_TTL_SECONDS, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def key(features, version=None):
+        """Cache key of one encoded row for the model ``version`` that predicts it."""
+        return (version, tuple(float(x) for x in features))
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > self._clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, self._clock() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def predict(self, model, features, version=None):
+        """Predict a 2-D feature array with ``model`` (of ``version``), evaluating it only for rows not in the cache."""
+        keys = [self.key(row, version) for row in features]
+        predictions = np.empty(len(keys), dtype=np.float64)
+        missing = []
+        for i, key in enumerate(keys):
+            value = self.get(key)
+            if value is None:
+                missing.append(i)
+            else:
+                predictions[i] = value
+        if missing:
+            predictions[missing] = model.predict(np.asarray(features)[missing])
+            for i in missing:
+                self.put(keys[i], float(predictions[i]))
+        return predictions
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def metrics_text(self, prefix='fpp_prediction_cache'):
+        stats = self.stats()
+        lines = []
+        for name in ['hits', 'misses', 'evictions', 'expirations']:
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {stats[name]}")
+        for name in ['size', 'max_size', 'hit_rate']:
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {stats[name]}")
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,225 @@
+"""Mergeable quantile sketches of ``price`` per route, airline and class.
+
+A KLLSketch keeps a bounded sample of the prices it has seen in levels:
+an item on level h stands for 2**h prices. When a level grows past its
+capacity and the sketch as a whole is over budget, that level is sorted
+and every other item (starting at a random offset seeded from the number
+of prices seen) is promoted to the next level. The sketch holds at most
+about 3k items however many prices are added, and quantiles and ranks
+are within about 1.7/k of exact (exact while nothing has been
+compacted). Two sketches merge by concatenating their levels and
+compacting, which makes them suitable for one-pass builds, ingested
+deltas and roll-ups alike.
+
+``build_sketches`` keeps one sketch per SKETCH_KEYS group, packed into a
+single items array so the saved collection can be memory-mapped. Route,
+airline or class percentiles are then a merge of the matching groups,
+whose cost depends on the number of groups rather than on the number of
+fare rows.
+"""
+import numpy as np
+import pandas as pd
+
+import filter_index
+
+SKETCH_KEYS = ['From', 'to', 'airline', 'Class']
+DEFAULT_K = 200
+MIN_CAPACITY = 8
+SKETCH_FORMAT_VERSION = 1
+BANDS = [0.1, 0.5, 0.9]
+
+
+def _capacity(k, height, level):
+    return max(MIN_CAPACITY, int(np.ceil(k * (2 / 3) ** (height - level - 1))))
+
+
+def _coin(n, level):
+    """0 or 1, drawn from a generator seeded with the sketch's count and the level.
+
+    SeedSequence hashes the seed well, so the offsets of successive
+    compactions are independent while builds stay reproducible.
+    """
+    return int(np.random.default_rng((n, level)).integers(2))
+
+
+def _compress(levels, k, n):
+    """Compact levels in place until the sketch fits its total capacity.
+
+    Only the lowest over-capacity level is compacted at a time, and only
+    while the items exceed the summed capacities, so the sketch uses its
+    whole budget before throwing information away.
+    """
+    while True:
+        capacities = [_capacity(k, len(levels), level) for level in range(len(levels))]
+        if sum(len(items) for items in levels) <= sum(capacities):
+            return levels
+        level = next(level for level, items in enumerate(levels) if len(items) > capacities[level])
+        if level + 1 == len(levels):
+            levels.append(np.empty(0))
+        items = np.sort(levels[level])
+        # An odd item out stays behind so the promoted pairs keep the total weight.
+        kept, pairs = items[:len(items) % 2], items[len(items) % 2:]
+        offset = _coin(n, level)
+        levels[level + 1] = np.concatenate([levels[level + 1], pairs[offset::2]])
+        levels[level] = kept
+
+
+class KLLSketch:
+    def __init__(self, k=DEFAULT_K, levels=None, n=0):
+        self.k = k
+        self.levels = list(levels) if levels is not None else [np.empty(0)]
+        self.n = n
+
+    def update(self, values):
+        """Add ``values`` (NaNs are skipped); returns the sketch."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if len(values):
+            self.levels[0] = np.concatenate([self.levels[0], values])
+            self.n += len(values)
+            _compress(self.levels, self.k, self.n)
+        return self
+
+    def merge(self, other):
+        """A new sketch covering the prices of both."""
+        return merge_all([self, other], self.k)
+
+    def _weighted(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2 ** level, dtype=np.int64)
+                                  for level, items in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        return items[order], np.cumsum(weights[order])
+
+    def quantiles(self, qs):
+        """Prices at the quantiles ``qs`` (fractions in [0, 1]); NaN for an empty sketch."""
+        qs = np.asarray(qs, dtype=np.float64)
+        if not self.n:
+            return np.full(qs.shape, np.nan)
+        items, cumulative = self._weighted()
+        positions = np.searchsorted(cumulative, np.maximum(qs * self.n, 1), side='left')
+        return items[np.minimum(positions, len(items) - 1)]
+
+    def rank(self, value):
+        """Fraction of the prices below ``value``, counting those equal to it half; NaN for an empty sketch."""
+        if not self.n:
+            return np.nan
+        items, cumulative = self._weighted()
+        below = np.searchsorted(items, value, side='left')
+        through = np.searchsorted(items, value, side='right')
+        weight_below = cumulative[below - 1] if below else 0
+        weight_through = cumulative[through - 1] if through else 0
+        return (weight_below + weight_through) / 2 / self.n
+
+    def size(self):
+        """Number of items retained."""
+        return sum(len(items) for items in self.levels)
+
+
+def merge_all(sketches, k=DEFAULT_K):
+    """One sketch covering every sketch in ``sketches``."""
+    height = max((len(sketch.levels) for sketch in sketches), default=1)
+    levels = [np.concatenate([sketch.levels[level] for sketch in sketches if level < len(sketch.levels)] or [np.empty(0)])
+              for level in range(height)]
+    n = sum(sketch.n for sketch in sketches)
+    return KLLSketch(k, _compress(levels, k, n), n)
+
+
+def _group_sketches(df, k):
+    """SKETCH_KEYS of each group in ``df`` and a sketch of its prices."""
+    prices = df['price'].to_numpy(dtype=np.float64)
+    grouped = df[SKETCH_KEYS].groupby(SKETCH_KEYS, observed=True)
+    keys = grouped.size().reset_index()[SKETCH_KEYS]
+    for col in SKETCH_KEYS:
+        keys[col] = keys[col].astype(str)
+    group_ids = grouped.ngroup().to_numpy()
+    order = np.argsort(group_ids, kind='stable')
+    bounds = np.searchsorted(group_ids[order], np.arange(len(keys) + 1))
+    sketches = [KLLSketch(k).update(prices[order[start:end]]) for start, end in zip(bounds[:-1], bounds[1:])]
+    return keys, sketches
+
+
+def pack(keys, sketches, k=DEFAULT_K, index=None):
+    """The collection for ``keys`` and their ``sketches``, with all items in one array."""
+    height = max((len(sketch.levels) for sketch in sketches), default=1)
+    level_sizes = np.zeros((len(sketches), height), dtype=np.int64)
+    for row, sketch in enumerate(sketches):
+        level_sizes[row, :len(sketch.levels)] = [len(items) for items in sketch.levels]
+    items = [items for sketch in sketches for items in sketch.levels]
+    return {
+        'format': SKETCH_FORMAT_VERSION,
+        'k': k,
+        'keys': keys.reset_index(drop=True),
+        'index': index if index is not None else filter_index.build_index(keys, SKETCH_KEYS),
+        'n': np.array([sketch.n for sketch in sketches], dtype=np.int64),
+        'level_sizes': level_sizes,
+        'starts': np.concatenate([[0], np.cumsum(level_sizes.sum(axis=1))]),
+        'items': np.concatenate(items) if items else np.empty(0),
+    }
+
+
+def sketch_at(sketches, row):
+    """The sketch of one group; its levels are views on the collection's items."""
+    bounds = sketches['starts'][row] + np.concatenate([[0], np.cumsum(sketches['level_sizes'][row])])
+    levels = [sketches['items'][lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:])]
+    while len(levels) > 1 and not len(levels[-1]):
+        levels.pop()
+    return KLLSketch(sketches['k'], levels, int(sketches['n'][row]))
+
+
+def build_sketches(df, k=DEFAULT_K):
+    """Sketches of ``price`` per SKETCH_KEYS group of ``df``, built in one pass."""
+    keys, sketches = _group_sketches(df, k)
+    return pack(keys, sketches, k)
+
+
+def merge_delta(sketches, df):
+    """A new collection that also covers the fare rows in ``df``; ``sketches`` itself is left unchanged."""
+    k = sketches['k']
+    keys = sketches['keys']
+    current = [sketch_at(sketches, row) for row in range(len(keys))]
+    delta_keys, delta_sketches = _group_sketches(df, k)
+    positions = {key: pos for pos, key in enumerate(zip(*(keys[col].tolist() for col in SKETCH_KEYS)))}
+    new_rows = []
+    for row, key in enumerate(zip(*(delta_keys[col].tolist() for col in SKETCH_KEYS))):
+        pos = positions.get(key)
+        if pos is None:
+            new_rows.append(row)
+        else:
+            current[pos] = current[pos].merge(delta_sketches[row])
+    index = sketches['index']
+    if new_rows:
+        new_keys = delta_keys.iloc[new_rows].reset_index(drop=True)
+        index = filter_index.extend_index(index, new_keys)
+        keys = pd.concat([keys, new_keys], ignore_index=True)
+        current += [delta_sketches[row] for row in new_rows]
+    return pack(keys, current, k, index)
+
+
+def select(sketches, filters=None):
+    """One sketch for the groups matching every ``column: value`` in ``filters``."""
+    rows = filter_index.select_rows(sketches['index'], filters)
+    rows = range(len(sketches['keys'])) if rows is None else rows
+    return merge_all([sketch_at(sketches, row) for row in rows], sketches['k'])
+
+
+def percentile(sketches, price, filters=None):
+    """Percentile (0-100) of ``price`` among the fares matching ``filters``; NaN if there are none."""
+    return 100.0 * select(sketches, filters).rank(price)
+
+
+def bands(sketches, by, filters=None, qs=BANDS):
+    """Price quantiles per ``by`` group of the (filtered) sketches.
+
+    One row per group with the ``by`` columns, ``count`` and a ``p<percent>``
+    column per quantile (``p10``, ``p50``, ``p90`` by default).
+    """
+    rows = filter_index.select_rows(sketches['index'], filters)
+    keys = sketches['keys'] if rows is None else sketches['keys'].take(rows)
+    out = []
+    for group, group_keys in keys.groupby(by, sort=True):
+        merged = merge_all([sketch_at(sketches, row) for row in group_keys.index], sketches['k'])
+        values = merged.quantiles(qs)
+        group = group if isinstance(group, tuple) else (group,)
+        out.append(dict(zip(by, group), count=merged.n, **{f"p{round(q * 100)}": value for q, value in zip(qs, values)}))
+    return pd.DataFrame(out, columns=list(by) + ['count'] + [f"p{round(q * 100)}" for q in qs])
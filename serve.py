@@ -0,0 +1,284 @@
+"""Headless HTTP prediction service with request micro-batching.
+
+Runs without Streamlit and reuses the model/encoder loading and encoding in
+prediction.py. The model is served from the model registry (see
+model_registry.py): new versions are loaded, warmed up and swapped in while
+the server keeps answering, and every response names the model version
+that priced it. The model is loaded and warmed up in the background after
+the server starts listening; /ready answers 503 until it is, so a load
+balancer only routes to warm instances. Single-itinerary requests that arrive within
+``max_wait_ms`` of each other are coalesced into one ``model.predict``
+call of at most ``max_batch_size`` rows; repeated itineraries are answered
+from a PredictionCache and its counters are served at /metrics, together
+with the perf span histograms (encode, cache lookup, batched predict) when
+FPP_PERF=1.
+
+    python serve.py serve --port 8600 --max-batch-size 64 --max-wait-ms 5 --cache-size 10000
+    curl -X POST localhost:8600/predict -d '{"airline": "Vistara", "From": "Delhi", ...}'
+    python serve.py loadtest --url http://127.0.0.1:8600 --concurrency 32 --requests 5000
+"""
+import argparse
+import json
+import queue
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+import encoders as feature_encoders
+import model_registry
+import perf
+import prediction
+import prediction_cache
+import warmup
+
+DEFAULT_MAX_BATCH_SIZE = 64
+DEFAULT_MAX_WAIT_MS = 5.0
+REQUEST_TIMEOUT_S = 10.0
+
+
+class MicroBatcher:
+    """Collects feature rows from many threads and predicts them in batches.
+
+    Each row is predicted by the model it was submitted with, so rows
+    encoded for an old model are not priced by one swapped in meanwhile.
+    """
+
+    def __init__(self, model=None, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.batches = 0
+        self.rows = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, features, model=None):
+        """Queue one feature row; the returned Future resolves to its predicted price."""
+        future = Future()
+        self._queue.put((features, future, model or self.model))
+        return future
+
+    def predict(self, features, timeout=REQUEST_TIMEOUT_S, model=None):
+        return self.submit(features, model).result(timeout)
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'rows': self.rows,
+            'mean_batch_size': self.rows / self.batches if self.batches else 0.0,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+        }
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            by_model = {}
+            for item in self._collect():
+                by_model.setdefault(id(item[2]), []).append(item)
+            for batch in by_model.values():
+                try:
+                    predictions = batch[0][2].predict(np.vstack([features for features, _, _ in batch]))
+                except Exception as e:
+                    for _, future, _ in batch:
+                        future.set_exception(e)
+                    continue
+                self.batches += 1
+                self.rows += len(batch)
+                for (_, future, _), price in zip(batch, predictions):
+                    future.set_result(float(price))
+
+
+class PredictionServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def load_registry(model_path=prediction.MODEL_FILE, backend=None, models_dir=model_registry.MODELS_DIR):
+    def vocabularies():
+        import data_store
+        return data_store.vocabularies(data_store.ensure_cache())
+
+    return model_registry.ModelRegistry(models_dir, model_path, backend, vocabularies)
+
+
+def make_handler(batcher, registry, cache=None, warming=None):
+    class PredictionHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/health':
+                self._send_json(200, {'status': 'ok'})
+            elif self.path == '/ready':
+                status = warming.status() if warming is not None else {'ready': True}
+                self._send_json(200 if status['ready'] else 503, status)
+            elif self.path == '/stats':
+                self._send_json(200, {'batching': batcher.stats(), 'cache': cache.stats() if cache is not None else None,
+                                      'model': registry.status()})
+            elif self.path == '/metrics':
+                body = ((cache.metrics_text() if cache is not None else '')
+                        + (perf.metrics_text() if perf.enabled() else '')).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            else:
+                self._send_json(404, {'error': 'not found'})
+
+        def do_POST(self):
+            if self.path != '/predict':
+                self._send_json(404, {'error': 'not found'})
+                return
+            if warming is not None and not warming.ready():
+                self._send_json(503, {'error': 'warming up'})
+                return
+            active = registry.current()
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                itinerary = json.loads(self.rfile.read(length))
+                with perf.span('serve: encode'):
+                    features = prediction.encode_itinerary(active.encoders, itinerary)
+            except (ValueError, TypeError) as e:
+                self._send_json(400, {'error': str(e)})
+                return
+            try:
+                with perf.span('serve: cache lookup'):
+                    key = cache.key(features, active.version) if cache is not None else None
+                    price = cache.get(key) if cache is not None else None
+                if price is None:
+                    with perf.span('serve: predict'):
+                        price = batcher.predict(features, model=active.model)
+                    if cache is not None:
+                        cache.put(key, price)
+                self._send_json(200, {'predicted_price': price, 'model_version': active.version})
+            except Exception as e:
+                self._send_json(500, {'error': str(e)})
+
+        def log_message(self, format, *args):
+            pass
+
+    return PredictionHandler
+
+
+def serve(host, port, model_path, max_batch_size, max_wait_ms,
+          cache_size=prediction_cache.DEFAULT_MAX_SIZE, cache_ttl=prediction_cache.DEFAULT_TTL_SECONDS, backend=None):
+    registry = load_registry(model_path, backend)
+    warming = warmup.Warmup([('model', registry.current, True)]).start()
+    registry.start_watcher()
+    batcher = MicroBatcher(max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    cache = None
+    if cache_size > 0:
+        cache = prediction_cache.PredictionCache(cache_size, cache_ttl)
+    server = PredictionServer((host, port), make_handler(batcher, registry, cache, warming))
+    print(f"Serving predictions on http://{host}:{port} (max batch {max_batch_size}, max wait {max_wait_ms} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def random_itinerary(vocab, rng):
+    From = rng.choice(vocab['From'])
+    # Destinations come from the 'to' vocabulary, which need not match 'From'.
+    to = rng.choice([city for city in vocab['to'] if city != From] or vocab['to'])
+    return {
+        'airline': rng.choice(vocab['airline']), 'From': From, 'to': to,
+        'departure_time': rng.choice(vocab['departure_time']), 'arrival_time': rng.choice(vocab['arrival_time']),
+        'stops': rng.choice(vocab['stops']), 'Class': rng.choice(vocab['Class']),
+        'days_left': rng.randint(1, 49), 'duration': rng.randint(60, 1800),
+    }
+
+
+def load_test(url, model_path, concurrency, n_requests, seed=0):
+    """Fire ``n_requests`` /predict calls from ``concurrency`` threads and report latency and throughput."""
+    encoders = feature_encoders.load_encoders(feature_encoders.encoder_path(model_registry.serving_model_path(
+        legacy_model_path=model_path)))
+    vocab = {col: feature_encoders.vocabulary(encoders, col) for col in prediction.CATEGORICAL_FEATURES}
+    rng = random.Random(seed)
+    bodies = [json.dumps(random_itinerary(vocab, rng)).encode() for _ in range(n_requests)]
+
+    def call(body):
+        request = urllib.request.Request(f"{url}/predict", data=body, headers={'Content-Type': 'application/json'})
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT_S) as response:
+                response.read()
+            ok = True
+        except (urllib.error.URLError, OSError):
+            ok = False
+        return time.perf_counter() - start, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(call, bodies))
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array([latency for latency, _ in results]) * 1000.0
+    n_failed = sum(1 for _, ok in results if not ok)
+    print(f"{n_requests} requests, concurrency {concurrency}, {n_failed} failed")
+    print(f"throughput: {n_requests / elapsed:,.0f} req/s")
+    for q in (50, 95, 99):
+        print(f"p{q} latency: {np.percentile(latencies_ms, q):.2f} ms")
+    try:
+        with urllib.request.urlopen(f"{url}/stats", timeout=REQUEST_TIMEOUT_S) as response:
+            print(f"server stats: {json.loads(response.read())}")
+    except (urllib.error.URLError, OSError):
+        pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Flight price prediction service")
+    parser.add_argument('--model', default=prediction.MODEL_FILE)
+    parser.add_argument('--backend', choices=prediction.MODEL_BACKENDS, default=None,
+                        help="model evaluator (default: FPP_MODEL_BACKEND or sklearn)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help="run the HTTP prediction server")
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8600)
+    serve_parser.add_argument('--max-batch-size', type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    serve_parser.add_argument('--max-wait-ms', type=float, default=DEFAULT_MAX_WAIT_MS)
+    serve_parser.add_argument('--cache-size', type=int, default=prediction_cache.DEFAULT_MAX_SIZE,
+                              help="maximum cached predictions (0 disables the cache)")
+    serve_parser.add_argument('--cache-ttl', type=float, default=prediction_cache.DEFAULT_TTL_SECONDS,
+                              help="seconds a cached prediction stays valid")
+
+    load_parser = subparsers.add_parser('loadtest', help="drive a running server with random itineraries")
+    load_parser.add_argument('--url', default='http://127.0.0.1:8600')
+    load_parser.add_argument('--concurrency', type=int, default=32)
+    load_parser.add_argument('--requests', type=int, default=2000)
+
+    args = parser.parse_args()
+    if args.command == 'serve':
+        serve(args.host, args.port, args.model, args.max_batch_size, args.max_wait_ms,
+              args.cache_size, args.cache_ttl, args.backend)
+    else:
+        load_test(args.url, args.model, args.concurrency, args.requests)
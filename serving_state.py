@@ -0,0 +1,48 @@
+"""Process-wide serving resources of the Streamlit app.
+
+The flight store, the model registry and the warmup that loads them live
+here instead of in ``st.cache_resource`` functions of app.py. Streamlit
+only runs the script when a browser session connects, but a plain module
+can be used before that: app_server.py starts the warmup when the process
+starts, and the pages later get the very same objects from here.
+"""
+import threading
+
+CSV_PATH = 'cleaned_flight_data.csv'
+MODEL_PATH = 'FPP_model.pkl'
+
+_lock = threading.RLock()
+_resources = {}
+
+
+def _shared(name, create):
+    with _lock:
+        if name not in _resources:
+            _resources[name] = create()
+        return _resources[name]
+
+
+def get_flight_store():
+    """Flight data shared by all sessions; follows the CSV and newly ingested fares."""
+    def create():
+        import flight_store
+        return flight_store.FlightStore(CSV_PATH)
+    return _shared('flight_store', create)
+
+
+def get_model_registry():
+    """Model registry serving the active bundle, with its watcher for new versions running."""
+    def create():
+        import model_registry
+        registry = model_registry.ModelRegistry(legacy_model_path=MODEL_PATH,
+                                                vocabularies=lambda: get_flight_store().vocabularies())
+        return registry.start_watcher()
+    return _shared('model_registry', create)
+
+
+def start_warmup():
+    """The process's warmup of the data, aggregates, model and booking curves, started on first call."""
+    def create():
+        import warmup
+        return warmup.Warmup(warmup.serving_steps(get_flight_store(), get_model_registry())).start()
+    return _shared('warmup', create)
@@ -0,0 +1,119 @@
+"""Startup profile: how long each import and each data/model load takes.
+
+Every import is timed in a fresh interpreter so shared dependencies are not
+hidden by earlier imports; the loads are then timed in order in this
+process, through the same FlightStore and model paths the app uses. The
+profile is read-only: it never writes the data cache, the saved aggregates
+or the model artifacts the app serves from.
+
+    python startup_profile.py [--json startup_profile.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+IMPORTS = [
+    ('streamlit', "import streamlit"),
+    ('numpy', "import numpy"),
+    ('pandas', "import pandas"),
+    ('joblib', "import joblib"),
+    ('sklearn.ensemble', "import sklearn.ensemble"),
+    ('plotly.express', "import plotly.express"),
+    ('data_store', "import data_store"),
+    ('aggregates', "import aggregates"),
+    ('prediction', "import prediction"),
+    ('booking_curves', "import booking_curves"),
+]
+
+
+def time_import(statement):
+    code = f"import time; t = time.perf_counter(); {statement}; print(time.perf_counter() - t)"
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)) or '.')
+    if result.returncode != 0:
+        return None
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def time_loads(model_path, csv_path=None, cache_dir=None):
+    """Time the loads the app pages trigger, read-only: nothing in the cache or next to the model is written.
+
+    Structures that are not saved yet (or a stale cache) are timed as in-memory
+    builds, the cache itself in a temporary directory.
+    """
+    import compiled_model
+    import data_store
+    import encoders as feature_encoders
+    import flight_store
+    import model_registry
+    import prediction
+
+    csv_path = csv_path or data_store.CSV_PATH
+    cache_dir = cache_dir or data_store.CACHE_DIR
+    timings = []
+
+    def timed(name, func):
+        start = time.perf_counter()
+        value = func()
+        timings.append((name, time.perf_counter() - start))
+        return value
+
+    with tempfile.TemporaryDirectory(prefix='fpp_profile_') as tmp_dir:
+        if data_store.fresh_meta(csv_path, cache_dir, update_source=False) is None:
+            cache_dir = os.path.join(tmp_dir, 'flight_cache')
+            timed('dataset cache build (temporary copy)', lambda: data_store.build_cache(csv_path, cache_dir))
+        store = flight_store.FlightStore(csv_path, cache_dir, read_only=True)
+        timed('flight data (cache check)', store.refresh)
+        if not store.out_of_core:
+            timed('flight frame (memory-mapped)', store.frame)
+        timed('price cube', store.cube)
+        timed('duration counts', store.duration_counts)
+        timed('price sketches', store.price_sketches)
+        if not store.out_of_core:
+            timed('row index', store.index)
+
+        model_path = model_registry.serving_model_path(legacy_model_path=model_path)
+        encoder_file = feature_encoders.encoder_path(model_path)
+        if os.path.exists(encoder_file):
+            timed('feature encoders', lambda: feature_encoders.load_encoders(encoder_file))
+        else:
+            timed('feature encoders (fitted, not saved)', lambda: feature_encoders.fit_encoders(store.vocabularies()))
+        if os.path.exists(model_path):
+            timed('model (sklearn pickle)', lambda: prediction.load_predictor(model_path, 'sklearn'))
+            compiled_dir = compiled_model.compiled_path(model_path)
+            if os.path.isdir(compiled_dir):
+                try:
+                    timed('model (compiled arrays)', lambda: compiled_model.CompiledTreeModel.load(compiled_dir, mmap_mode='r'))
+                except (OSError, ValueError):
+                    pass
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Break down app startup into import and load time")
+    parser.add_argument('--model', default='FPP_model.pkl')
+    parser.add_argument('--json', help="also write the report to this file")
+    args = parser.parse_args()
+
+    imports = [(name, time_import(statement)) for name, statement in IMPORTS]
+    loads = time_loads(args.model)
+
+    print("Imports (fresh interpreter each)")
+    for name, seconds in imports:
+        print(f"  {name:<32} {'failed' if seconds is None else f'{seconds * 1000:8.1f} ms'}")
+    print("Loads (in page order, this process)")
+    for name, seconds in loads:
+        print(f"  {name:<32} {seconds * 1000:8.1f} ms")
+
+    if args.json:
+        report = {'imports_s': dict(imports), 'loads_s': dict(loads)}
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+import aggregates
+
+CITIES = ['Delhi', 'Mumbai', 'Chennai']
+TIMES = ['Morning', 'Evening']
+CATEGORICAL = ['From', 'to', 'airline', 'departure_time', 'stops', 'Class']
+
+
+def _fares(rng, n_rows, airlines, days_left, categories=None):
+    fares = pd.DataFrame({
+        'From': rng.choice(CITIES, n_rows),
+        'to': rng.choice(CITIES, n_rows),
+        'airline': rng.choice(airlines, n_rows),
+        'departure_time': rng.choice(TIMES, n_rows),
+        'stops': rng.choice(['Zero', 'One'], n_rows),
+        'Class': rng.choice(['Economy', 'Business'], n_rows),
+        'days_left': rng.choice(days_left, n_rows),
+        'price': rng.uniform(2_000, 30_000, n_rows).round(),
+    })
+    # Category vocabularies only grow, as in the columnar cache.
+    for col in CATEGORICAL:
+        fares[col] = pd.Categorical(fares[col], categories=(categories or {}).get(col))
+    return fares
+
+
+def _sorted_cells(cube):
+    cells = cube['cells'].copy()
+    for col in CATEGORICAL:
+        cells[col] = cells[col].astype(str)
+    order = cells.sort_values(aggregates.CUBE_KEYS).index.to_numpy()
+    return cells.loc[order].reset_index(drop=True), np.asarray(cube['hist'])[order]
+
+
+def _assert_same_cube(actual, expected):
+    actual_cells, actual_hist = _sorted_cells(actual)
+    expected_cells, expected_hist = _sorted_cells(expected)
+    pd.testing.assert_frame_equal(actual_cells[aggregates.CUBE_KEYS], expected_cells[aggregates.CUBE_KEYS])
+    np.testing.assert_allclose(actual_cells[aggregates.STAT_COLUMNS].to_numpy(dtype=np.float64),
+                               expected_cells[aggregates.STAT_COLUMNS].to_numpy(dtype=np.float64))
+    np.testing.assert_array_equal(actual_hist, expected_hist)
+
+
+def _base_and_delta(seed=0):
+    rng = np.random.default_rng(seed)
+    base = _fares(rng, 3_000, ['Vistara', 'Indigo'], np.arange(1, 30))
+    # The delta brings a new airline and a days_left value the base never had.
+    categories = {col: sorted(set(base[col].cat.categories) | {'Akasa'}) if col == 'airline' else base[col].cat.categories
+                  for col in CATEGORICAL}
+    delta = _fares(rng, 800, ['Vistara', 'Akasa'], [5, 12, 45], categories)
+    return base, delta
+
+
+def test_merge_delta_equals_full_rebuild():
+    base, delta = _base_and_delta()
+    cube = aggregates.build_price_cube(base)
+    merged = aggregates.merge_delta(cube, delta)
+    rebuilt = aggregates.build_price_cube(pd.concat([base, delta], ignore_index=True), edges=cube['bin_edges'])
+    _assert_same_cube(merged, rebuilt)
+    assert 'Akasa' in aggregates.key_values(merged, 'airline')
+    assert 45 in aggregates.key_values(merged, 'days_left')
+
+
+def test_merge_delta_leaves_the_original_cube_unchanged():
+    base, delta = _base_and_delta(1)
+    cube = aggregates.build_price_cube(base)
+    before = _sorted_cells(cube)
+    aggregates.merge_delta(cube, delta)
+    _assert_same_cube(cube, aggregates.build_price_cube(base))
+    assert len(cube['cells']) == len(before[0])
+
+
+def test_merged_cube_rollups_and_filters_match_the_rows():
+    base, delta = _base_and_delta(2)
+    merged = aggregates.merge_delta(aggregates.build_price_cube(base), delta)
+    fares = pd.concat([base, delta], ignore_index=True)
+    for filters in [None, {'airline': 'Akasa'}, {'days_left': 45}, {'From': 'Delhi', 'airline': 'Vistara'}]:
+        rows = fares
+        for col, value in (filters or {}).items():
+            rows = rows[rows[col] == value]
+        totals = aggregates.totals(merged, filters)
+        assert totals['count'] == len(rows)
+        np.testing.assert_allclose(totals['sum'], rows['price'].sum())
+        assert totals['min'] == rows['price'].min() and totals['max'] == rows['price'].max()
+    by_airline = aggregates.rollup(merged, ['airline'])
+    by_airline = by_airline.set_index(by_airline['airline'].astype(str))['mean'].sort_index()
+    expected = fares.groupby(fares['airline'].astype(str))['price'].mean().sort_index()
+    assert by_airline.index.tolist() == expected.index.tolist()
+    np.testing.assert_allclose(by_airline.to_numpy(), expected.to_numpy())
@@ -0,0 +1,53 @@
+import joblib
+import numpy as np
+import pytest
+from sklearn.ensemble import ExtraTreesRegressor, GradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import LinearRegression
+from sklearn.tree import DecisionTreeRegressor
+
+import compiled_model
+
+ESTIMATORS = {
+    'random forest': lambda: RandomForestRegressor(n_estimators=20, max_depth=12, random_state=0),
+    'extra trees': lambda: ExtraTreesRegressor(n_estimators=20, random_state=0),
+    'gradient boosting': lambda: GradientBoostingRegressor(n_estimators=50, max_depth=4, random_state=0),
+    'decision tree': lambda: DecisionTreeRegressor(random_state=0),
+}
+
+
+def _data(seed, n_rows=2_000):
+    """Integer-coded features like the encoded itineraries, and a price that depends on them."""
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([rng.integers(60, 1800, n_rows), rng.integers(1, 50, n_rows)]
+                        + [rng.integers(0, 8, n_rows) for _ in range(7)]).astype(np.float64)
+    y = 3_000 + 2.5 * X[:, 0] - 90 * X[:, 1] + 4_000 * X[:, 7] + rng.normal(0, 500, n_rows)
+    return X, y
+
+
+@pytest.mark.parametrize('name', list(ESTIMATORS))
+def test_compiled_predictions_match_sklearn(name):
+    X, y = _data(0)
+    model = ESTIMATORS[name]().fit(X, y)
+    compiled = compiled_model.compile_model(model)
+    X_new, _ = _data(1)
+    for rows in [X, X_new, compiled_model.check_rows(compiled, X.shape[1]), X_new[:1]]:
+        np.testing.assert_allclose(compiled.predict(rows), model.predict(rows), rtol=1e-9, atol=1e-6)
+
+
+def test_export_round_trip_and_reexport_on_change(tmp_path):
+    X, y = _data(2)
+    model_path = str(tmp_path / 'FPP_model.pkl')
+    joblib.dump(RandomForestRegressor(n_estimators=10, random_state=0).fit(X, y), model_path)
+    loaded = compiled_model.load_or_export(model_path)
+    np.testing.assert_allclose(loaded.predict(X), joblib.load(model_path).predict(X), rtol=1e-9, atol=1e-6)
+    # A new model file is detected by its hash and exported again.
+    joblib.dump(GradientBoostingRegressor(n_estimators=20, random_state=0).fit(X, y), model_path)
+    reloaded = compiled_model.load_or_export(model_path)
+    assert reloaded.source_sha256 != loaded.source_sha256
+    np.testing.assert_allclose(reloaded.predict(X), joblib.load(model_path).predict(X), rtol=1e-9, atol=1e-6)
+
+
+def test_unsupported_models_are_rejected():
+    X, y = _data(3, 100)
+    with pytest.raises(TypeError):
+        compiled_model.compile_model(LinearRegression().fit(X, y))
@@ -0,0 +1,94 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_store
+import ingest
+import train
+
+
+def _write_fares(path, n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    pd.DataFrame({
+        'airline': rng.choice(['Vistara', 'Indigo'], n_rows),
+        'From': rng.choice(['Delhi', 'Mumbai'], n_rows),
+        'to': rng.choice(['Chennai', 'Kolkata'], n_rows),
+        'departure_time': 'Morning',
+        'arrival_time': 'Evening',
+        'stops': rng.choice(['Zero', 'One'], n_rows),
+        'Class': rng.choice(['Economy', 'Business'], n_rows),
+        'days_left': rng.integers(1, 50, n_rows),
+        'time_taken': rng.uniform(1, 20, n_rows).round(2),
+        'price': rng.integers(2_000, 30_000, n_rows),
+    }).to_csv(path, index=False)
+    return str(path)
+
+
+def test_cache_records_its_source_and_is_reused(tmp_path):
+    csv_path = _write_fares(tmp_path / 'fares.csv', 50)
+    cache_dir = str(tmp_path / 'cache')
+    meta = data_store.ensure_cache(csv_path, cache_dir)
+    assert meta['source']['path'] == os.path.abspath(csv_path)
+    assert data_store.ensure_cache(csv_path, cache_dir) == meta
+    assert len(data_store.read_cache(cache_dir, meta)) == 50
+
+
+def test_cache_is_rebuilt_when_its_csv_changes(tmp_path):
+    csv_path = _write_fares(tmp_path / 'fares.csv', 50)
+    cache_dir = str(tmp_path / 'cache')
+    before = data_store.ensure_cache(csv_path, cache_dir)
+    _write_fares(csv_path, 80, seed=1)
+    after = data_store.ensure_cache(csv_path, cache_dir)
+    assert after['rows'] == 80 and after['source']['sha256'] != before['source']['sha256']
+
+
+def test_cache_of_another_csv_is_never_rebuilt(tmp_path):
+    serving_csv = _write_fares(tmp_path / 'fares.csv', 50)
+    other_csv = _write_fares(tmp_path / 'other.csv', 80, seed=1)
+    cache_dir = str(tmp_path / 'cache')
+    meta = data_store.ensure_cache(serving_csv, cache_dir)
+    data_store.append_delta(pd.read_csv(other_csv).head(5), cache_dir)
+    with pytest.raises(ValueError, match='separate cache directory'):
+        data_store.ensure_cache(other_csv, cache_dir)
+    kept = data_store.read_meta(cache_dir)
+    assert kept['source'] == meta['source'] and len(kept['deltas']) == 1
+    assert data_store.fresh_meta(other_csv, cache_dir) is None
+
+
+def test_training_uses_a_cache_of_its_own():
+    serving = os.path.abspath(data_store.CACHE_DIR)
+    assert os.path.abspath(train.training_cache_dir('fares.csv')) != serving
+    assert train.training_cache_dir('fares.csv') == train.training_cache_dir(os.path.abspath('fares.csv'))
+    assert train.training_cache_dir('fares.csv') != train.training_cache_dir('other.csv')
+
+
+def test_append_waits_for_a_rebuild_in_progress(tmp_path):
+    csv_path = _write_fares(tmp_path / 'fares.csv', 50)
+    cache_dir = str(tmp_path / 'cache')
+    data_store.ensure_cache(csv_path, cache_dir)
+    batch = pd.read_csv(csv_path).head(5)
+    done = threading.Event()
+    worker = threading.Thread(target=lambda: (data_store.append_delta(batch, cache_dir), done.set()))
+    with data_store.build_lock(cache_dir):
+        worker.start()
+        assert not done.wait(0.3)
+        assert data_store.read_meta(cache_dir)['deltas'] == []
+    worker.join(5)
+    assert done.is_set() and len(data_store.read_meta(cache_dir)['deltas']) == 1
+
+
+def test_ingest_reports_deltas_a_rebuild_discarded(tmp_path):
+    csv_path = _write_fares(tmp_path / 'fares.csv', 50)
+    cache_dir = str(tmp_path / 'cache')
+    batch = pd.read_csv(csv_path).head(5)
+    meta, discarded = ingest.ingest_batch(batch, csv_path, cache_dir)
+    assert discarded == [] and len(meta['deltas']) == 1
+    meta, discarded = ingest.ingest_batch(batch, csv_path, cache_dir)
+    assert discarded == [] and len(meta['deltas']) == 2
+    _write_fares(csv_path, 60, seed=1)
+    meta, discarded = ingest.ingest_batch(batch, csv_path, cache_dir)
+    assert [delta['rows'] for delta in discarded] == [5, 5]
+    assert len(meta['deltas']) == 1 and meta['rows'] == 65
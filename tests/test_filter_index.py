@@ -0,0 +1,71 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import filter_index
+
+COLUMNS = ['From', 'to', 'airline', 'stops']
+
+
+def _frame(rng, n_rows, airlines=('Vistara', 'Indigo', 'SpiceJet')):
+    cities = ['Delhi', 'Mumbai', 'Chennai', 'Kolkata']
+    frame = pd.DataFrame({
+        'From': pd.Categorical(rng.choice(cities, n_rows)),
+        'to': rng.choice(cities, n_rows),
+        'airline': pd.Categorical(rng.choice(list(airlines), n_rows)),
+        'stops': rng.choice(['Zero', 'One', 'Two or more'], n_rows),
+    })
+    # Missing values are never matched by a filter.
+    frame.loc[rng.random(n_rows) < 0.05, 'to'] = None
+    return frame
+
+
+def _mask_rows(frame, filters):
+    mask = np.ones(len(frame), dtype=bool)
+    for col, value in filters.items():
+        mask &= (frame[col] == value).to_numpy()
+    return np.flatnonzero(mask)
+
+
+def _filter_combinations(frame):
+    values = {col: frame[col].dropna().unique().tolist() + ['Nowhere'] for col in COLUMNS}
+    for n_columns in range(1, 4):
+        for cols in itertools.combinations(COLUMNS, n_columns):
+            for combo in itertools.product(*(values[col][:3] for col in cols)):
+                yield dict(zip(cols, combo))
+
+
+def test_select_rows_matches_boolean_masks():
+    frame = _frame(np.random.default_rng(0), 2_000)
+    index = filter_index.build_index(frame, COLUMNS)
+    for filters in _filter_combinations(frame):
+        np.testing.assert_array_equal(filter_index.select_rows(index, filters), _mask_rows(frame, filters))
+
+
+def test_unfiltered_selection_is_every_row():
+    frame = _frame(np.random.default_rng(1), 100)
+    index = filter_index.build_index(frame, COLUMNS)
+    assert filter_index.select_rows(index, None) is None
+    assert filter_index.take(frame, filter_index.select_rows(index, {})) is frame
+
+
+@pytest.mark.parametrize('n_batches', [1, 3])
+def test_extended_index_matches_masks_on_appended_frame(n_batches):
+    rng = np.random.default_rng(2)
+    frame = _frame(rng, 1_000)
+    index = filter_index.build_index(frame, COLUMNS)
+    for _ in range(n_batches):
+        # New values (an airline and a city) appear only in the appended rows.
+        batch = _frame(rng, 300, airlines=('Vistara', 'Akasa'))
+        batch['From'] = batch['From'].astype(object)
+        batch.loc[:20, 'From'] = 'Pune'
+        previous = index
+        index = filter_index.extend_index(index, batch)
+        frame = pd.concat([frame.astype(object), batch.astype(object)], ignore_index=True)
+        # The original index is left as it was.
+        assert previous['n_rows'] == len(frame) - len(batch)
+    assert index['n_rows'] == len(frame)
+    for filters in list(_filter_combinations(frame)) + [{'airline': 'Akasa'}, {'From': 'Pune', 'airline': 'Akasa'}]:
+        np.testing.assert_array_equal(filter_index.select_rows(index, filters), _mask_rows(frame, filters))
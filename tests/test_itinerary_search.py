@@ -0,0 +1,101 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import aggregates
+import itinerary_search
+
+CITIES = ['Delhi', 'Mumbai', 'Chennai', 'Kolkata', 'Hyderabad']
+
+
+def _fares(seed=0, n_rows=400):
+    """Fares on a random subset of routes, so some city pairs only connect via stops."""
+    rng = np.random.default_rng(seed)
+    routes = [pair for pair in itertools.permutations(CITIES, 2) if rng.random() < 0.55]
+    picks = rng.integers(len(routes), size=n_rows)
+    return pd.DataFrame({
+        'From': [routes[i][0] for i in picks],
+        'to': [routes[i][1] for i in picks],
+        'airline': rng.choice(['Vistara', 'Indigo', 'SpiceJet'], n_rows),
+        'departure_time': 'Morning',
+        'stops': 'Zero',
+        'Class': rng.choice(['Economy', 'Business'], n_rows),
+        'days_left': rng.integers(1, 50, n_rows),
+        'price': rng.integers(1_500, 20_000, n_rows).astype(float),
+    })
+
+
+def _brute_force(fares, origin, destination, days_left, budget=None, Class=None):
+    """Total fare of every direct, one- and two-stop route, from the fare rows themselves."""
+    fares = fares[itinerary_search.band_of(fares['days_left'].to_numpy()) == itinerary_search.band_of(days_left)]
+    if Class is not None:
+        fares = fares[fares['Class'] == Class]
+    cheapest = fares.groupby(['From', 'to'])['price'].min().to_dict()
+    others = [city for city in CITIES if city not in (origin, destination)]
+    totals = []
+    for stops in range(itinerary_search.MAX_CONNECTIONS + 1):
+        for middle in itertools.permutations(others, stops):
+            cities = (origin,) + middle + (destination,)
+            legs = list(zip(cities[:-1], cities[1:]))
+            if all(leg in cheapest for leg in legs):
+                total = sum(cheapest[leg] for leg in legs)
+                if budget is None or total <= budget:
+                    totals.append((total, stops, ' → '.join(cities)))
+    return sorted(totals)
+
+
+def _queries():
+    for origin, destination in itertools.permutations(CITIES, 2):
+        for days_left in [2, 10, 40]:
+            for Class in [None, 'Economy', 'Business']:
+                yield origin, destination, days_left, Class
+
+
+@pytest.mark.parametrize('budget', [None, 9_000, 20_000])
+def test_cheapest_itineraries_match_brute_force(budget):
+    fares = _fares()
+    edges = itinerary_search.build_edges(aggregates.build_price_cube(fares))
+    for origin, destination, days_left, Class in _queries():
+        expected = _brute_force(fares, origin, destination, days_left, budget, Class)
+        found = itinerary_search.cheapest_itineraries(edges, origin, destination, days_left, budget, Class, top_k=5)
+        assert [it['total_price'] for it in found] == pytest.approx([total for total, _, _ in expected[:5]])
+        for it in found:
+            assert it['total_price'] == pytest.approx(sum(leg['price'] for leg in it['legs']))
+            assert budget is None or it['total_price'] <= budget
+            assert Class is None or all(leg['Class'] == Class for leg in it['legs'])
+
+
+def test_one_per_connections_is_cheapest_for_each_number_of_stops():
+    fares = _fares(1)
+    edges = itinerary_search.build_edges(aggregates.build_price_cube(fares))
+    for origin, destination, days_left, Class in _queries():
+        for budget in [None, 12_000]:
+            expected = {}
+            for total, stops, _ in _brute_force(fares, origin, destination, days_left, budget, Class):
+                expected.setdefault(stops, total)
+            found = itinerary_search.cheapest_itineraries(edges, origin, destination, days_left, budget, Class,
+                                                          top_k=itinerary_search.MAX_CONNECTIONS + 1,
+                                                          one_per_connections=True)
+            assert {it['connections']: it['total_price'] for it in found} == pytest.approx(expected)
+
+
+def test_predicted_fares_only_fill_edges_without_an_observed_fare():
+    fares = _fares(2)
+    cube = aggregates.build_price_cube(fares)
+    observed = itinerary_search.build_edges(cube)['table']
+    # A cheap prediction for every route, class and day: it must not undercut any observed edge.
+    grid = pd.MultiIndex.from_product([CITIES, CITIES, ['Indigo'], ['Economy', 'Business'], range(1, 50)],
+                                      names=['From', 'to', 'airline', 'Class', 'days_left']).to_frame(index=False)
+    grid = grid[grid['From'] != grid['to']]
+    curves = {'table': grid.assign(predicted_price=1.0, observed=True)}
+    table = itinerary_search.build_edges(cube, curves)['table']
+    merged = table.merge(observed, on=itinerary_search.EDGE_KEYS, how='left', suffixes=('', '_observed'))
+    filled = merged['price_observed'].isna()
+    assert (merged.loc[~filled, 'source'] == 'observed').all()
+    assert (merged.loc[~filled, 'price'] == merged.loc[~filled, 'price_observed']).all()
+    assert (merged.loc[filled, 'source'] == 'predicted').all() and filled.any()
+    assert not table.duplicated(itinerary_search.EDGE_KEYS).any()
+    assert len(table) == len(grid.assign(band=itinerary_search.band_of(grid['days_left'].to_numpy()))
+                                 .drop_duplicates(itinerary_search.EDGE_KEYS))
@@ -0,0 +1,103 @@
+import os
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.tree import DecisionTreeRegressor
+
+import encoders as feature_encoders
+import model_registry
+import prediction
+import train
+
+VOCABULARIES = {
+    'airline': ['Indigo', 'Vistara'],
+    'From': ['Delhi', 'Mumbai'],
+    'to': ['Delhi', 'Mumbai'],
+    'departure_time': ['Evening', 'Morning'],
+    'arrival_time': ['Evening', 'Night'],
+}
+
+
+def _model(price):
+    """A tree that predicts ``price`` for every itinerary."""
+    features = np.random.default_rng(0).integers(0, 5, size=(20, len(feature_encoders.FEATURE_ORDER)))
+    return DecisionTreeRegressor(max_depth=1).fit(features, np.full(20, float(price)))
+
+
+def _bundle(models_dir, version, price):
+    train.write_bundle(_model(price), feature_encoders.fit_encoders(VOCABULARIES), {'version': version},
+                       version, str(models_dir))
+    return version
+
+
+def _price(active):
+    features = feature_encoders.encode_features(active.encoders, 120, 10, 'Vistara', 'Morning', 'Delhi',
+                                                'Night', 'Mumbai', 'Economy', 'Zero')
+    return float(active.model.predict(features)[0])
+
+
+@pytest.fixture
+def registry(tmp_path):
+    models_dir = tmp_path / 'models'
+    _bundle(models_dir, '20260101-000000-aaaaaaaa', 1000)
+    return model_registry.ModelRegistry(str(models_dir), legacy_model_path=str(tmp_path / prediction.MODEL_FILE))
+
+
+def test_poll_swaps_in_a_newer_bundle(registry):
+    first = registry.current()
+    assert first.version == '20260101-000000-aaaaaaaa' and _price(first) == 1000
+    assert not registry.poll()
+    _bundle(registry.models_dir, '20260102-000000-bbbbbbbb', 2000)
+    assert registry.poll()
+    assert registry.current().version == '20260102-000000-bbbbbbbb' and _price(registry.current()) == 2000
+    # The old ActiveModel is untouched for requests still holding it.
+    assert _price(first) == 1000
+
+
+def test_activate_and_rollback_change_the_served_version(registry):
+    registry.current()
+    _bundle(registry.models_dir, '20260102-000000-bbbbbbbb', 2000)
+    _bundle(registry.models_dir, '20260103-000000-cccccccc', 3000)
+    model_registry.activate('20260101-000000-aaaaaaaa', registry.models_dir)
+    registry.poll()
+    assert registry.current().version == '20260101-000000-aaaaaaaa'
+    model_registry.activate('20260103-000000-cccccccc', registry.models_dir)
+    assert registry.poll() and _price(registry.current()) == 3000
+    assert model_registry.rollback(registry.models_dir) == '20260101-000000-aaaaaaaa'
+    assert registry.poll() and registry.current().version == '20260101-000000-aaaaaaaa'
+    with pytest.raises(ValueError):
+        model_registry.activate('20990101-000000-missing', registry.models_dir)
+
+
+def test_a_corrupt_bundle_keeps_the_previous_model_serving(registry):
+    registry.current()
+    bad = os.path.join(registry.models_dir, '20260102-000000-bbbbbbbb')
+    os.makedirs(bad)
+    with open(os.path.join(bad, prediction.MODEL_FILE), 'wb') as f:
+        f.write(b'not a pickle')
+    joblib.dump(feature_encoders.fit_encoders(VOCABULARIES), os.path.join(bad, feature_encoders.ENCODER_FILE))
+    assert not registry.poll()
+    assert registry.current().version == '20260101-000000-aaaaaaaa' and _price(registry.current()) == 1000
+    assert '20260102-000000-bbbbbbbb' in registry.status()['failed']
+    # A failed version is not retried on every poll, but a fixed newer one is picked up.
+    assert not registry.poll()
+    _bundle(registry.models_dir, '20260103-000000-cccccccc', 3000)
+    assert registry.poll() and registry.current().version == '20260103-000000-cccccccc'
+
+
+def test_legacy_version_follows_the_encoders_file(tmp_path):
+    model_path = str(tmp_path / prediction.MODEL_FILE)
+    joblib.dump(_model(1000), model_path)
+    registry = model_registry.ModelRegistry(str(tmp_path / 'models'), legacy_model_path=model_path,
+                                            vocabularies=lambda: VOCABULARIES)
+    first = registry.current()
+    # The encoders were fitted and saved on load; that is already part of the version.
+    assert os.path.exists(feature_encoders.encoder_path(model_path))
+    assert not registry.poll()
+    vocabularies = dict(VOCABULARIES, airline=['Akasa', 'Indigo', 'Vistara'])
+    feature_encoders.save_encoders(feature_encoders.fit_encoders(vocabularies), feature_encoders.encoder_path(model_path))
+    assert registry.poll()
+    second = registry.current()
+    assert second.version != first.version and second.version.startswith(model_registry.LEGACY_PREFIX)
+    assert 'Akasa' in second.encoders['mappings']['airline']
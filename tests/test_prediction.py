@@ -0,0 +1,78 @@
+import subprocess
+import sys
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.tree import DecisionTreeRegressor
+
+import encoders as feature_encoders
+import prediction
+
+VOCABULARIES = {
+    'airline': ['Indigo', 'Vistara'],
+    'From': ['Delhi', 'Mumbai'],
+    'to': ['Delhi', 'Mumbai'],
+    'departure_time': ['Evening', 'Morning'],
+    'arrival_time': ['Evening', 'Night'],
+}
+GOOD = {'airline': 'Vistara', 'From': 'Delhi', 'to': 'Mumbai', 'departure_time': 'Morning',
+        'arrival_time': 'Night', 'stops': 'Zero', 'Class': 'Economy', 'days_left': 10, 'duration': 130}
+
+
+class DaysLeftModel:
+    """Prices a row at 100 times its days_left, so each priced row can be traced back."""
+
+    def predict(self, features):
+        return 100.0 * features[:, feature_encoders.FEATURE_ORDER.index('days_left')]
+
+
+def _batch():
+    rows = [
+        dict(GOOD),
+        dict(GOOD, airline='Akasa'),
+        dict(GOOD, days_left='soon'),
+        dict(GOOD, days_left=20),
+        dict(GOOD, arrival_time=None),
+        dict(GOOD, to='Delhi', duration=10),
+        dict(GOOD, days_left=30, Class='Business'),
+    ]
+    return pd.DataFrame(rows)
+
+
+def test_bad_rows_are_reported_while_good_rows_are_priced():
+    priced = prediction.predict_batch(DaysLeftModel(), feature_encoders.fit_encoders(VOCABULARIES), _batch())
+    assert priced['predicted_price'].iloc[[0, 3, 6]].tolist() == [1000.0, 2000.0, 3000.0]
+    assert priced['predicted_price'].iloc[[1, 2, 4, 5]].isna().all()
+    assert priced['error'].tolist() == [
+        '',
+        "unknown airline 'Akasa'",
+        'days_left is not a number',
+        '',
+        'missing arrival_time',
+        'duration must be at least 30 minutes; departure and arrival cities are the same',
+        '',
+    ]
+
+
+def test_a_missing_column_rejects_the_batch_by_name():
+    with pytest.raises(ValueError, match=r"Missing columns in batch: \['duration'\]"):
+        prediction.predict_batch(DaysLeftModel(), feature_encoders.fit_encoders(VOCABULARIES),
+                                 _batch().drop(columns='duration'))
+
+
+def test_cli_writes_empty_prices_and_errors_for_bad_rows(tmp_path):
+    features = np.random.default_rng(0).integers(0, 50, size=(50, len(feature_encoders.FEATURE_ORDER)))
+    model_path = str(tmp_path / prediction.MODEL_FILE)
+    joblib.dump(DecisionTreeRegressor(random_state=0).fit(features, features[:, 1] * 100.0), model_path)
+    feature_encoders.save_encoders(feature_encoders.fit_encoders(VOCABULARIES), feature_encoders.encoder_path(model_path))
+    _batch().to_csv(tmp_path / 'in.csv', index=False)
+    result = subprocess.run([sys.executable, prediction.__file__, str(tmp_path / 'in.csv'), str(tmp_path / 'out.csv'),
+                             '--model', model_path], capture_output=True, text=True, check=True)
+    assert 'Priced 3 of 7 itineraries; 4 rows reported errors.' in result.stdout
+    priced = pd.read_csv(tmp_path / 'out.csv', keep_default_na=False)
+    assert (priced['predicted_price'].iloc[[1, 2, 4, 5]] == '').all()
+    assert all(priced['predicted_price'].iloc[[0, 3, 6]] != '')
+    assert priced['error'].iloc[1] == "unknown airline 'Akasa'"
+    assert priced['error'].iloc[4] == 'missing arrival_time'
@@ -0,0 +1,85 @@
+import numpy as np
+
+import prediction_cache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class CountingModel:
+    def __init__(self):
+        self.rows = 0
+
+    def predict(self, features):
+        self.rows += len(features)
+        return np.asarray(features, dtype=np.float64).sum(axis=1)
+
+
+def _metrics(cache):
+    return dict(line.split() for line in cache.metrics_text().splitlines() if not line.startswith('#'))
+
+
+def test_least_recently_used_key_is_evicted():
+    cache = prediction_cache.PredictionCache(max_size=2, clock=FakeClock())
+    a, b, c = (cache.key([x], 'v1') for x in (1, 2, 3))
+    cache.put(a, 1.0)
+    cache.put(b, 2.0)
+    assert cache.get(a) == 1.0  # a is now more recently used than b
+    cache.put(c, 3.0)
+    assert cache.get(b) is None
+    assert cache.get(a) == 1.0 and cache.get(c) == 3.0
+    assert len(cache) == 2 and cache.evictions == 1
+
+
+def test_entries_expire_after_the_ttl():
+    clock = FakeClock()
+    cache = prediction_cache.PredictionCache(ttl_seconds=10, clock=clock)
+    key = cache.key([1, 2], 'v1')
+    cache.put(key, 5.0)
+    clock.now = 9.9
+    assert cache.get(key) == 5.0
+    clock.now = 10.0
+    assert cache.get(key) is None
+    assert len(cache) == 0 and cache.expirations == 1
+
+
+def test_versions_do_not_share_entries():
+    cache = prediction_cache.PredictionCache(clock=FakeClock())
+    cache.put(cache.key([1, 2], 'v1'), 5.0)
+    assert cache.get(cache.key([1, 2], 'v2')) is None
+    assert cache.get(cache.key([1.0, 2.0], 'v1')) == 5.0
+
+
+def test_predict_only_evaluates_missing_rows():
+    cache = prediction_cache.PredictionCache(clock=FakeClock())
+    model = CountingModel()
+    np.testing.assert_array_equal(cache.predict(model, [[1, 2], [3, 4]], 'v1'), [3, 7])
+    np.testing.assert_array_equal(cache.predict(model, [[1, 2], [5, 6]], 'v1'), [3, 11])
+    assert model.rows == 3
+
+
+def test_counters_in_metrics_text():
+    clock = FakeClock()
+    cache = prediction_cache.PredictionCache(max_size=2, ttl_seconds=10, clock=clock)
+    a, b, c = (cache.key([x], 'v1') for x in (1, 2, 3))
+    cache.get(a)  # miss
+    cache.put(a, 1.0)
+    cache.get(a)  # hit
+    cache.put(b, 2.0)
+    cache.put(c, 3.0)  # evicts a
+    clock.now = 11
+    cache.get(b)  # expired: counted as expiration and miss
+    metrics = _metrics(cache)
+    assert metrics['fpp_prediction_cache_hits_total'] == '1'
+    assert metrics['fpp_prediction_cache_misses_total'] == '2'
+    assert metrics['fpp_prediction_cache_evictions_total'] == '1'
+    assert metrics['fpp_prediction_cache_expirations_total'] == '1'
+    assert metrics['fpp_prediction_cache_size'] == '1'
+    assert metrics['fpp_prediction_cache_max_size'] == '2'
+    assert float(metrics['fpp_prediction_cache_hit_rate']) == 1 / 3
+    assert '# TYPE fpp_prediction_cache_hits_total counter' in cache.metrics_text()
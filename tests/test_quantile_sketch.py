@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import quantile_sketch
+
+QS = np.linspace(0.01, 0.99, 99)
+
+
+def _exact_rank(sorted_values, value):
+    below = np.searchsorted(sorted_values, value, side='left')
+    through = np.searchsorted(sorted_values, value, side='right')
+    return (below + through) / 2 / len(sorted_values)
+
+
+def _rank_errors(sketch, values):
+    values = np.sort(values)
+    probes = np.quantile(values, QS)
+    rank_error = max(abs(sketch.rank(v) - _exact_rank(values, v)) for v in probes)
+    # A quantile estimate is off by how far q lies outside the estimate's range of true ranks.
+    estimates = sketch.quantiles(QS)
+    low = np.searchsorted(values, estimates, side='left') / len(values)
+    high = np.searchsorted(values, estimates, side='right') / len(values)
+    quantile_error = np.maximum(np.maximum(low - QS, QS - high), 0).max()
+    return rank_error, quantile_error
+
+
+def _prices(seed, n_rows):
+    return np.random.default_rng(seed).lognormal(9, 0.6, n_rows).round()
+
+
+def test_exact_below_capacity():
+    prices = _prices(0, 150)
+    sketch = quantile_sketch.KLLSketch(k=200).update(prices)
+    assert sketch.size() == len(prices)
+    ordered = np.sort(prices)
+    for value in prices[:20]:
+        assert sketch.rank(value) == pytest.approx(_exact_rank(ordered, value))
+    positions = np.maximum(np.ceil(QS * len(prices)).astype(int), 1) - 1
+    np.testing.assert_array_equal(sketch.quantiles(QS), ordered[positions])
+
+
+def test_empty_sketch():
+    sketch = quantile_sketch.KLLSketch()
+    assert np.isnan(sketch.rank(1.0))
+    assert np.isnan(sketch.quantiles([0.5])).all()
+
+
+@pytest.mark.parametrize('k', [50, 200])
+@pytest.mark.parametrize('n_chunks', [1, 97])
+def test_error_within_bound_on_a_large_sample(k, n_chunks):
+    prices = _prices(k + n_chunks, 200_000)
+    sketch = quantile_sketch.KLLSketch(k)
+    for chunk in np.array_split(prices, n_chunks):
+        sketch.update(chunk)
+    rank_error, quantile_error = _rank_errors(sketch, prices)
+    assert sketch.n == len(prices)
+    assert rank_error <= 1.7 / k
+    assert quantile_error <= 1.7 / k
+    height = len(sketch.levels)
+    assert sketch.size() <= sum(quantile_sketch._capacity(k, height, level) for level in range(height))
+
+
+def test_builds_are_reproducible():
+    prices = _prices(3, 50_000)
+    first = quantile_sketch.KLLSketch().update(prices)
+    second = quantile_sketch.KLLSketch().update(prices)
+    for a, b in zip(first.levels, second.levels):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_merge_all_agrees_with_a_sketch_of_the_combined_data():
+    parts = [_prices(seed, size) for seed, size in enumerate([40_000, 500, 75_000, 3, 20_000])]
+    combined = np.concatenate(parts)
+    merged = quantile_sketch.merge_all([quantile_sketch.KLLSketch().update(part) for part in parts])
+    direct = quantile_sketch.KLLSketch().update(combined)
+    assert merged.n == direct.n == len(combined)
+    k = quantile_sketch.DEFAULT_K
+    assert _rank_errors(merged, combined)[0] <= 1.7 / k
+    for value in np.quantile(combined, [0.1, 0.5, 0.9]):
+        assert abs(merged.rank(value) - direct.rank(value)) <= 2 * 1.7 / k
+
+
+def _fares(seed, n_rows, airlines):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'From': rng.choice(['Delhi', 'Mumbai'], n_rows),
+        'to': rng.choice(['Chennai', 'Kolkata'], n_rows),
+        'airline': rng.choice(airlines, n_rows),
+        'Class': rng.choice(['Economy', 'Business'], n_rows),
+        'price': _prices(seed, n_rows),
+    })
+
+
+def test_merge_delta_agrees_with_a_build_of_the_combined_rows():
+    base = _fares(0, 60_000, ['Vistara', 'Indigo'])
+    delta = _fares(1, 20_000, ['Vistara', 'Akasa'])
+    fares = pd.concat([base, delta], ignore_index=True)
+    k = quantile_sketch.DEFAULT_K
+    merged = quantile_sketch.merge_delta(quantile_sketch.build_sketches(base), delta)
+    rebuilt = quantile_sketch.build_sketches(fares)
+    assert merged['n'].sum() == rebuilt['n'].sum() == len(fares)
+    for filters in [None, {'airline': 'Akasa'}, {'airline': 'Vistara', 'Class': 'Business'}, {'From': 'Delhi'}]:
+        rows = fares
+        for col, value in (filters or {}).items():
+            rows = rows[rows[col] == value]
+        from_merge = quantile_sketch.select(merged, filters)
+        from_build = quantile_sketch.select(rebuilt, filters)
+        assert from_merge.n == from_build.n == len(rows)
+        assert _rank_errors(from_merge, rows['price'].to_numpy())[0] <= 1.7 / k
+        for value in np.quantile(rows['price'], [0.1, 0.5, 0.9]):
+            assert abs(from_merge.rank(value) - from_build.rank(value)) <= 2 * 1.7 / k
+    bands = quantile_sketch.bands(merged, ['airline'])
+    assert bands['airline'].tolist() == ['Akasa', 'Indigo', 'Vistara']
+    assert bands['count'].tolist() == fares.groupby('airline')['price'].size().sort_index().tolist()
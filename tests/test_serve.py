@@ -0,0 +1,75 @@
+import threading
+
+import numpy as np
+
+import serve
+
+
+class RecordingModel:
+    """Stub model that records the rows of every predict call and prices each as ``offset`` + its first feature."""
+
+    def __init__(self, offset=0.0):
+        self.offset = offset
+        self.batches = []
+        self._lock = threading.Lock()
+
+    def predict(self, features):
+        with self._lock:
+            self.batches.append(features[:, 0].tolist())
+        return features[:, 0] + self.offset
+
+
+def _row(value):
+    return np.full((1, 9), float(value))
+
+
+def test_concurrent_submits_share_one_predict_call():
+    model = RecordingModel()
+    batcher = serve.MicroBatcher(model, max_batch_size=64, max_wait_ms=300)
+    barrier = threading.Barrier(6)
+    results = {}
+
+    def request(i):
+        barrier.wait()
+        results[i] = batcher.predict(_row(i))
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert results == {i: float(i) for i in range(6)}
+    assert len(model.batches) == 1 and sorted(model.batches[0]) == list(range(6))
+    assert batcher.stats()['batches'] == 1 and batcher.stats()['rows'] == 6
+
+
+def test_batches_are_capped_at_max_batch_size():
+    model = RecordingModel()
+    batcher = serve.MicroBatcher(model, max_batch_size=8, max_wait_ms=300)
+    futures = [batcher.submit(_row(i)) for i in range(20)]
+    assert [future.result(5) for future in futures] == [float(i) for i in range(20)]
+    assert [len(batch) for batch in model.batches] == [8, 8, 4]
+    assert [value for batch in model.batches for value in batch] == list(range(20))
+
+
+def test_rows_are_only_priced_by_the_model_they_were_submitted_with():
+    old, new = RecordingModel(offset=1000), RecordingModel(offset=2000)
+    batcher = serve.MicroBatcher(old, max_batch_size=64, max_wait_ms=300)
+    futures = [(i, batcher.submit(_row(i), model=new if i % 2 else None)) for i in range(10)]
+    for i, future in futures:
+        assert future.result(5) == i + (2000 if i % 2 else 1000)
+    assert sorted(value for batch in old.batches for value in batch) == [0, 2, 4, 6, 8]
+    assert sorted(value for batch in new.batches for value in batch) == [1, 3, 5, 7, 9]
+
+
+def test_a_failing_model_fails_only_its_own_rows():
+    class Broken:
+        def predict(self, features):
+            raise ValueError("broken model")
+
+    good = RecordingModel()
+    batcher = serve.MicroBatcher(good, max_batch_size=64, max_wait_ms=300)
+    ok = batcher.submit(_row(1))
+    failed = batcher.submit(_row(2), model=Broken())
+    assert ok.result(5) == 1.0
+    assert isinstance(failed.exception(5), ValueError)
@@ -0,0 +1,257 @@
+"""Reproducible training of the price model and its encoders.
+
+Features are built from the flight data with the same encoders and
+encode_batch the app uses, so the model sees exactly the FEATURE_ORDER
+columns it is served with. Hyperparameters are chosen by K-fold
+cross-validation over a seeded random sample of PARAM_GRID; every
+(candidate, fold) fit runs as its own task in a process pool across all
+cores, and no new candidates are started once ``--time-budget`` is spent.
+The best candidate is refitted on the training split, scored on the
+held-out split and written as one bundle:
+
+    models/<version>/FPP_model.pkl
+    models/<version>/FPP_encoders.pkl
+    models/<version>/metrics.json
+
+    python train.py [--candidates 12] [--folds 5] [--time-budget 3600] [--activate] [--install]
+
+``--activate`` makes the new bundle the one served by running app and
+service processes (see model_registry.py); ``--install`` also copies the
+model and encoders to FPP_model.pkl / FPP_encoders.pkl.
+
+Training reads the CSV through a data cache of its own (``--cache-dir``,
+by default one per CSV path next to the serving cache), so it never
+rebuilds the cache the app and the prediction service are serving from.
+"""
+import argparse
+import datetime
+import hashlib
+import itertools
+import json
+import os
+import random
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+import sklearn
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.model_selection import KFold, train_test_split
+
+import data_store
+import encoders as feature_encoders
+import model_registry
+import prediction
+
+MODELS_DIR = model_registry.MODELS_DIR
+METRICS_FILE = model_registry.METRICS_FILE
+DEFAULT_SEED = 42
+TEST_SIZE = 0.2
+
+PARAM_GRID = {
+    'n_estimators': [100, 200, 300],
+    'max_depth': [None, 20, 30],
+    'min_samples_leaf': [1, 2, 4],
+    'max_features': [1.0, 0.7, 'sqrt'],
+}
+
+_features = None
+_target = None
+
+
+def training_cache_dir(csv_path):
+    """A data cache directory for ``csv_path`` alone, next to the serving cache but never the same."""
+    digest = hashlib.sha256(os.path.abspath(csv_path).encode()).hexdigest()[:12]
+    return f"{data_store.CACHE_DIR.rstrip(os.sep)}.train-{digest}"
+
+
+def build_training_data(df, encoders):
+    """``(features, prices, n_dropped)`` for the rows the encoders can encode."""
+    itineraries = df.assign(duration=feature_encoders.duration_minutes(df['time_taken']).to_numpy())
+    features, errors = prediction.encode_batch(encoders, itineraries)
+    valid = ((errors == '') & df['price'].notna()).to_numpy()
+    return features[valid], df['price'].to_numpy(dtype=np.float64)[valid], int((~valid).sum())
+
+
+def candidate_params(n_candidates, seed=DEFAULT_SEED):
+    """A seeded random sample of the PARAM_GRID combinations."""
+    grid = [dict(zip(PARAM_GRID, values)) for values in itertools.product(*PARAM_GRID.values())]
+    return random.Random(seed).sample(grid, min(n_candidates, len(grid)))
+
+
+def make_model(params, seed=DEFAULT_SEED, n_jobs=1):
+    return RandomForestRegressor(random_state=seed, n_jobs=n_jobs, **params)
+
+
+def regression_metrics(y_true, y_pred):
+    errors = y_pred - y_true
+    total = ((y_true - y_true.mean()) ** 2).sum()
+    return {
+        'rmse': float(np.sqrt(np.mean(errors ** 2))),
+        'mae': float(np.mean(np.abs(errors))),
+        'r2': float(1 - (errors ** 2).sum() / total) if total else 0.0,
+    }
+
+
+def _init_worker(features, target):
+    global _features, _target
+    _features, _target = features, target
+
+
+def _fit_fold(task):
+    candidate, fold, params, train_rows, test_rows, seed = task
+    start = time.perf_counter()
+    model = make_model(params, seed).fit(_features[train_rows], _target[train_rows])
+    metrics = regression_metrics(_target[test_rows], model.predict(_features[test_rows]))
+    return candidate, fold, metrics, time.perf_counter() - start
+
+
+def cross_validate(features, target, candidates, n_folds=5, seed=DEFAULT_SEED, workers=None, time_budget=None):
+    """Mean fold metrics per candidate, fitting (candidate, fold) pairs in parallel processes.
+
+    Candidates are submitted one at a time as workers free up; once
+    ``time_budget`` seconds have passed, no further candidates are started.
+    """
+    folds = list(KFold(n_splits=n_folds, shuffle=True, random_state=seed).split(features))
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    fold_results = {i: [] for i in range(len(candidates))}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(features, target)) as pool:
+        pending = []
+        for i, params in enumerate(candidates):
+            if time_budget is not None and time.perf_counter() - start > time_budget:
+                break
+            pending += [pool.submit(_fit_fold, (i, fold, params, train_rows, test_rows, seed))
+                        for fold, (train_rows, test_rows) in enumerate(folds)]
+            # Keep roughly one candidate's folds queued per worker so the budget check stays meaningful.
+            while len(pending) > workers + n_folds:
+                candidate, fold, metrics, seconds = pending.pop(0).result()
+                fold_results[candidate].append(dict(metrics, fold=fold, fit_seconds=seconds))
+        for future in pending:
+            candidate, fold, metrics, seconds = future.result()
+            fold_results[candidate].append(dict(metrics, fold=fold, fit_seconds=seconds))
+
+    results = []
+    for i, folds_done in fold_results.items():
+        if len(folds_done) == n_folds:
+            results.append({
+                'params': candidates[i],
+                'rmse': float(np.mean([f['rmse'] for f in folds_done])),
+                'rmse_std': float(np.std([f['rmse'] for f in folds_done])),
+                'mae': float(np.mean([f['mae'] for f in folds_done])),
+                'r2': float(np.mean([f['r2'] for f in folds_done])),
+                'fit_seconds': float(sum(f['fit_seconds'] for f in folds_done)),
+            })
+    return sorted(results, key=lambda result: result['rmse'])
+
+
+def bundle_version(data_sha256, now=None):
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    return f"{now:%Y%m%d-%H%M%S}-{data_sha256[:8]}"
+
+
+def write_bundle(model, encoders, metrics, version, models_dir=MODELS_DIR):
+    """Write the model, encoders and metrics to ``models_dir/version`` atomically; returns the directory."""
+    bundle_dir = os.path.join(models_dir, version)
+    tmp_dir = f"{bundle_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    model_path = os.path.join(tmp_dir, prediction.MODEL_FILE)
+    joblib.dump(model, model_path)
+    feature_encoders.save_encoders(encoders, feature_encoders.encoder_path(model_path))
+    with open(os.path.join(tmp_dir, METRICS_FILE), 'w') as f:
+        json.dump(metrics, f, indent=2)
+    os.replace(tmp_dir, bundle_dir)
+    return bundle_dir
+
+
+def install_bundle(bundle_dir, model_path=prediction.MODEL_FILE):
+    """Copy a bundle's model and encoders to the paths the app loads from."""
+    for src, dst in [(os.path.join(bundle_dir, prediction.MODEL_FILE), model_path),
+                     (os.path.join(bundle_dir, feature_encoders.ENCODER_FILE), feature_encoders.encoder_path(model_path))]:
+        tmp_path = f"{dst}.tmp-{os.getpid()}"
+        shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dst)
+
+
+def train(csv_path=data_store.CSV_PATH, n_candidates=12, n_folds=5, seed=DEFAULT_SEED, workers=None,
+          time_budget=None, max_rows=None, models_dir=MODELS_DIR, cache_dir=None):
+    """Run the full pipeline; returns ``(bundle_dir, metrics)``."""
+    started = time.perf_counter()
+    cache_dir = cache_dir or training_cache_dir(csv_path)
+    meta = data_store.ensure_cache(csv_path, cache_dir)
+    df = data_store.read_cache(cache_dir, meta)
+    if max_rows and len(df) > max_rows:
+        df = df.sample(max_rows, random_state=seed)
+    encoders = feature_encoders.fit_encoders(data_store.vocabularies(meta))
+    features, target, n_dropped = build_training_data(df, encoders)
+    X_train, X_test, y_train, y_test = train_test_split(features, target, test_size=TEST_SIZE, random_state=seed)
+
+    search_start = time.perf_counter()
+    candidates = candidate_params(n_candidates, seed)
+    cv_results = cross_validate(X_train, y_train, candidates, n_folds, seed, workers, time_budget)
+    if not cv_results:
+        raise RuntimeError("No hyperparameter candidate finished within the time budget")
+    search_seconds = time.perf_counter() - search_start
+
+    best = cv_results[0]
+    fit_start = time.perf_counter()
+    model = make_model(best['params'], seed, n_jobs=workers or -1).fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - fit_start
+    model.n_jobs = 1
+
+    metrics = {
+        'data': {'csv': csv_path, 'sha256': meta['source']['sha256'], 'dataset_version': data_store.dataset_version(meta),
+                 'rows': len(df), 'dropped_rows': n_dropped, 'train_rows': len(y_train), 'test_rows': len(y_test)},
+        'feature_order': list(feature_encoders.FEATURE_ORDER),
+        'seed': seed,
+        'folds': n_folds,
+        'best_params': best['params'],
+        'cv': cv_results,
+        'candidates_evaluated': len(cv_results),
+        'candidates_planned': len(candidates),
+        'holdout': regression_metrics(y_test, model.predict(X_test)),
+        'timings_s': {'search': search_seconds, 'final_fit': fit_seconds, 'total': time.perf_counter() - started},
+        'versions': {'sklearn': sklearn.__version__, 'numpy': np.__version__},
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+    }
+    version = bundle_version(meta['source']['sha256'])
+    metrics['version'] = version
+    return write_bundle(model, encoders, metrics, version, models_dir), metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the price model and write a versioned bundle")
+    parser.add_argument('--csv', default=data_store.CSV_PATH)
+    parser.add_argument('--candidates', type=int, default=12, help="hyperparameter combinations to try")
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--workers', type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument('--time-budget', type=float, default=None,
+                        help="seconds after which no new candidates are started")
+    parser.add_argument('--max-rows', type=int, default=None, help="train on a seeded sample of this many rows")
+    parser.add_argument('--models-dir', default=MODELS_DIR)
+    parser.add_argument('--cache-dir', default=None,
+                        help="data cache for the CSV (default: one per CSV path, separate from the app's)")
+    parser.add_argument('--activate', action='store_true', help="serve the new bundle from running processes")
+    parser.add_argument('--install', action='store_true', help=f"also copy the model to {prediction.MODEL_FILE}")
+    args = parser.parse_args()
+
+    bundle_dir, metrics = train(args.csv, args.candidates, args.folds, args.seed, args.workers,
+                                args.time_budget, args.max_rows, args.models_dir, args.cache_dir)
+    holdout = metrics['holdout']
+    print(f"Best of {metrics['candidates_evaluated']}/{metrics['candidates_planned']} candidates: {metrics['best_params']}")
+    print(f"Hold-out RMSE {holdout['rmse']:,.2f}  MAE {holdout['mae']:,.2f}  R2 {holdout['r2']:.4f}")
+    print(f"Wrote {bundle_dir} in {metrics['timings_s']['total']:.1f} s")
+    if args.activate:
+        model_registry.activate(metrics['version'], args.models_dir)
+        print(f"Activated {metrics['version']}")
+    if args.install:
+        install_bundle(bundle_dir)
+        print(f"Installed as {prediction.MODEL_FILE}")
+
+
+if __name__ == '__main__':
+    main()
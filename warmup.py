@@ -0,0 +1,175 @@
+"""Background warmup of the data, aggregates and model at process start.
+
+A Warmup runs named steps in a small thread pool and tracks each one as
+pending, running, done or failed. It is ready once every required step is
+done; optional steps (the booking curves) only report their failures.
+Progress can be read in-process with ``status()`` and, if a status file
+is configured (FPP_WARMUP_FILE), is written there atomically after every
+step so a load balancer's readiness probe can check it:
+
+    python warmup.py                                  # warm the shared caches, exit 0 when ready
+    python warmup.py --check warmup_status.json       # exit 0 if that process is ready
+
+The app's own warmup is started when the process starts by app_server.py
+(see serving_state.py). The steps only call the same FlightStore /
+ModelRegistry methods the pages use, so a page that needs a structure
+that is still being built waits for that build instead of starting a
+second one.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import perf
+
+STATUS_FILE = os.environ.get('FPP_WARMUP_FILE')
+DEFAULT_WORKERS = 4
+
+
+class Warmup:
+    def __init__(self, steps, status_path=STATUS_FILE, workers=DEFAULT_WORKERS):
+        """``steps`` is a list of ``(name, func, required)``."""
+        self.steps = list(steps)
+        self.status_path = status_path
+        self.workers = workers
+        self.started_at = None
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+        self._steps = {name: {'state': 'pending', 'required': required, 'seconds': None, 'error': None}
+                       for name, _, required in self.steps}
+
+    def start(self):
+        self.started_at = time.time()
+        self._write()
+        if not self.steps:
+            self._finished.set()
+            return self
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='warmup')
+        for name, func, _ in self.steps:
+            pool.submit(self._run, name, func)
+        pool.shutdown(wait=False)
+        return self
+
+    def _run(self, name, func):
+        with self._lock:
+            self._steps[name]['state'] = 'running'
+        start = time.perf_counter()
+        try:
+            with perf.span(f'warmup: {name}'):
+                func()
+            state, error = 'done', None
+        except Exception as e:
+            state, error = 'failed', str(e) or type(e).__name__
+        with self._lock:
+            self._steps[name].update(state=state, seconds=time.perf_counter() - start, error=error)
+            if all(step['state'] in ('done', 'failed') for step in self._steps.values()):
+                self._finished.set()
+        self._write()
+
+    def ready(self):
+        with self._lock:
+            return all(step['state'] == 'done' for step in self._steps.values() if step['required'])
+
+    def finished(self):
+        return self._finished.is_set()
+
+    def wait(self, timeout=None):
+        """Block until every step has finished; returns ``ready()``."""
+        self._finished.wait(timeout)
+        return self.ready()
+
+    def status(self):
+        with self._lock:
+            steps = {name: dict(step) for name, step in self._steps.items()}
+        done = sum(step['state'] == 'done' for step in steps.values())
+        return {
+            'ready': all(step['state'] == 'done' for step in steps.values() if step['required']),
+            'finished': all(step['state'] in ('done', 'failed') for step in steps.values()),
+            'done': done,
+            'total': len(steps),
+            'progress': done / len(steps) if steps else 1.0,
+            'elapsed_s': time.time() - self.started_at if self.started_at else 0.0,
+            'pid': os.getpid(),
+            'steps': steps,
+        }
+
+    def _write(self):
+        if self.status_path:
+            tmp_path = f"{self.status_path}.tmp-{os.getpid()}-{threading.get_ident()}"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.status(), f, indent=2)
+            os.replace(tmp_path, self.status_path)
+
+
+def serving_steps(store, registry):
+    """Steps loading the flight data and its derived structures, the model and the booking curves."""
+    def row_index():
+        if not store.out_of_core:
+            store.index()
+
+    def curves():
+        import booking_curves
+
+        active = registry.current()
+        booking_curves.load_or_build_curves(active.model, active.encoders, store, active.model_path)
+
+    return [
+        ('flight data', store.refresh, True),
+        ('price cube', store.cube, True),
+        ('duration counts', store.duration_counts, True),
+        ('price sketches', store.price_sketches, True),
+        ('row index', row_index, True),
+        ('model', registry.current, True),
+        ('booking curves', curves, False),
+    ]
+
+
+def read_status(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm the shared data and model caches, or check a process's warmup")
+    parser.add_argument('--status-file', default=STATUS_FILE or 'warmup_status.json')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--check', metavar='STATUS_FILE', help="exit 0 if the warmup in this status file is ready")
+    args = parser.parse_args()
+
+    if args.check:
+        status = read_status(args.check)
+        ready = bool(status and status['ready'])
+        print(f"{'ready' if ready else 'not ready'}"
+              + (f" ({status['done']}/{status['total']} steps)" if status else f" (no status in {args.check})"))
+        sys.exit(0 if ready else 1)
+
+    import flight_store
+    import model_registry
+
+    store, registry = flight_store.FlightStore(), model_registry.ModelRegistry()
+    warmup = Warmup(serving_steps(store, registry), args.status_file, args.workers).start()
+    reported = set()
+    while True:
+        finished = warmup.finished()
+        for name, step in warmup.status()['steps'].items():
+            if step['state'] in ('done', 'failed') and name not in reported:
+                reported.add(name)
+                detail = f"{step['seconds']:.2f} s" if step['state'] == 'done' else f"failed: {step['error']}"
+                print(f"  {name:<20} {detail}")
+        if finished:
+            break
+        warmup.wait(0.5)
+    ready = warmup.ready()
+    print(f"{'Ready' if ready else 'Not ready'} after {warmup.status()['elapsed_s']:.1f} s")
+    sys.exit(0 if ready else 1)
+
+
+if __name__ == '__main__':
+    main()